@@ -1,23 +1,43 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.auth import get_user_model
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.exceptions import PermissionDenied
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Q
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
 from django.utils.html import format_html
 
-from dentman.app.models import Attachment, AttachmentEntity, Metrics
-from dentman.app.forms import AttachmentAdminForm
+from dentman.app.models import Attachment, AttachmentEntity, Metrics, PatientImport
+from dentman.app.forms import AttachmentAdminForm, PatientImportForm
+from dentman.app.patient_import import file_format_of, import_patients
+from dentman.archives import attachments_zip_response
+from dentman.search import PeopleSearchMixin
 
 User = get_user_model()
 
+
+@admin.action(description="Download attachments as ZIP", permissions=["download_attachments"])
+def download_attachments(modeladmin, request, queryset):
+    """Admin's action streaming ZIP archive with files attached to selected objects (one directory per object)"""
+    entities = AttachmentEntity.objects.for_objects(queryset)
+    return attachments_zip_response(entities, f"{queryset.model._meta.model_name}-attachments.zip", folders=True,
+                                    asynchronous=isinstance(request, ASGIRequest))
+
+
 @admin.register(User)
-class UserAdmin(BaseUserAdmin):
+class UserAdmin(PeopleSearchMixin, BaseUserAdmin):
     model = User
 
-    list_display = ('username', 'email', 'first_name', 'last_name', 'phone_number', 'is_active', 'is_patient', 'is_worker', 'is_dentist')
+    list_display = ('avatar', 'username', 'email', 'first_name', 'last_name', 'phone_number', 'is_active', 'is_patient', 'is_worker', 'is_dentist')
     search_fields = ('username', 'email', 'first_name', 'last_name', 'phone_number')
     list_filter = ('is_active', 'is_patient', 'is_worker', 'is_dentist')
     ordering = ('-id', )
     list_per_page = 30
     readonly_fields = BaseUserAdmin.readonly_fields + ('eid', )
+    actions = [download_attachments]
+    import_errors_shown = 50
 
     fieldsets = BaseUserAdmin.fieldsets + (
         ("Additional information", {
@@ -25,6 +45,44 @@ class UserAdmin(BaseUserAdmin):
         }),
     )
 
+    def avatar(self, obj: User) -> str:
+        # small variant of the photo, so the list doesn't load full size photos
+        if obj.profile_photo:
+            return format_html('<img src="{}?size=64&format=webp" width="32" height="32" style="object-fit: cover">',
+                               obj.profile_photo.url)
+        return "-"
+
+    avatar.short_description = "Photo"
+
+    def has_download_attachments_permission(self, request) -> bool:
+        # the same permission as of `dentman.app.views.download_attachments`
+        return request.user.has_perm("app.view_attachment")
+
+    def get_urls(self):
+        return [
+            path("import/", self.admin_site.admin_view(self.import_patients_view), name="app_user_import"),
+        ] + super().get_urls()
+
+    def import_patients_view(self, request):
+        """View to upload file with patients (see `dentman.app.patient_import`), rejected rows are shown in messages"""
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        form = PatientImportForm(request.POST or None, request.FILES or None)
+        if request.method == "POST" and form.is_valid():
+            uploaded = form.cleaned_data["file"]
+            report = import_patients(uploaded.file, file_format_of(uploaded.name), uploaded.name,
+                                     restart=form.cleaned_data["restart"])
+            self.message_user(request, f"{report.created} patients imported, {len(report.errors)} rows rejected",
+                              messages.SUCCESS if not report.errors else messages.WARNING)
+            for number, row_messages in report.errors[:self.import_errors_shown]:
+                errors = "; ".join(f"{field_name}: {' '.join(texts)}" for field_name, texts in row_messages.items())
+                self.message_user(request, f"Row {number}: {errors}", messages.ERROR)
+            return redirect("admin:app_user_changelist")
+
+        context = {**self.admin_site.each_context(request), "opts": self.opts, "form": form,
+                   "title": "Import patients"}
+        return TemplateResponse(request, "admin/app/user/import_patients.html", context)
+
 @admin.register(Attachment)
 class AttachmentAdmin(admin.ModelAdmin):
     form = AttachmentAdminForm
@@ -52,7 +110,33 @@ class AttachmentAdmin(admin.ModelAdmin):
 
 @admin.register(AttachmentEntity)
 class AttachmentEntityAdmin(admin.ModelAdmin):
-    pass
+    actions = ["download_objects_attachments"]
+    list_select_related = ("attachment", )
+
+    def get_queryset(self, request):
+        # objects of generic relation are loaded with one query per content type instead of one per row
+        return super().get_queryset(request).prefetch_related("content_object")
+
+    def has_download_attachments_permission(self, request) -> bool:
+        return request.user.has_perm("app.view_attachment")
+
+    @admin.action(description="Download all attachments of the same objects as ZIP", permissions=["download_attachments"])
+    def download_objects_attachments(self, request, queryset):
+        objects = Q()
+        for content_type_id, object_id in queryset.values_list("content_type_id", "object_id").distinct():
+            objects |= Q(content_type_id=content_type_id, object_id=object_id)
+        return attachments_zip_response(AttachmentEntity.objects.filter(objects), "attachments.zip", folders=True,
+                                        asynchronous=isinstance(request, ASGIRequest))
+
+@admin.register(PatientImport)
+class PatientImportAdmin(admin.ModelAdmin):
+    list_display = ('source_name', 'started_at', 'finished_at', 'rows_done', 'created', 'failed', )
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
 @admin.register(Metrics)
 class MetricsAdmin(admin.ModelAdmin):
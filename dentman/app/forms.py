@@ -9,3 +9,10 @@ class AttachmentAdminForm(forms.ModelForm):
         widgets = {
             'file': forms.FileInput(attrs={'accept': '.pdf, .jpg, .png, .mp4'}),
         }
+
+
+class PatientImportForm(forms.Form):
+    file = forms.FileField(label="File", help_text="CSV file with header or JSON Lines file (.jsonl)",
+                           widget=forms.FileInput(attrs={'accept': '.csv, .jsonl, .ndjson'}))
+    restart = forms.BooleanField(label="Restart", required=False,
+                                 help_text="Import the file from the beginning, even if it has been imported before")
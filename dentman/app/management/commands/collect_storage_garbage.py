@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from dentman.storage_gc import collect_garbage
+
+
+class Command(BaseCommand):
+    help = ("Find files in storage which aren't used by any attachment, contract scan, post or profile photo "
+            "(e.g. stuck in temp directories) and optionally delete them")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--delete", action="store_true", help="Delete found files (by default they're only listed)")
+        parser.add_argument("--grace-hours", type=float, default=24,
+                            help="Files modified within this number of hours are never touched")
+        parser.add_argument("--batch-size", type=int, default=1000,
+                            help="How many files are checked against database with one query")
+        parser.add_argument("--workers", type=int, default=1, help="How many directories are scanned in parallel")
+
+    def handle(self, *args, **options):
+        def on_orphan(path, size):
+            if options["verbosity"] >= 2:
+                self.stdout.write(f"{path} ({filesizeformat(size)})")
+
+        report = collect_garbage(delete=options["delete"], grace=timedelta(hours=options["grace_hours"]),
+                                 batch_size=options["batch_size"], workers=options["workers"], on_orphan=on_orphan)
+
+        verb = "deleted" if options["delete"] else "found"
+        self.stdout.write(self.style.SUCCESS(
+            f"{report.orphans} orphaned files ({filesizeformat(report.size)}) {verb}"
+        ))
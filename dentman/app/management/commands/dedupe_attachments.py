@@ -0,0 +1,97 @@
+import hashlib
+import os
+import shutil
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Case, Count, Value, When
+
+from dentman.app.models import Attachment, StoredBlob, content_addressed_storage
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 of file read in chunks"""
+    with open(path, "rb") as file:
+        return hashlib.file_digest(file, "sha256").hexdigest()
+
+
+class Command(BaseCommand):
+    help = ("Move attachments' files into content-addressed storage, so every distinct content is kept once, and "
+            "recount references of stored blobs")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="How many files are moved in one transaction")
+        parser.add_argument("--dry-run", action="store_true", help="Only count files that would be deduplicated")
+
+    def handle(self, *args, **options):
+        if not settings.CONTENT_ADDRESSED_ATTACHMENTS:
+            # new uploads would be stored as regular files again and removing an attachment would delete shared blob
+            raise CommandError("Content-addressed attachments are disabled, set CONTENT_ADDRESSED_ATTACHMENTS first")
+        storage = content_addressed_storage
+        names = list(
+            Attachment.objects.exclude(file="").exclude(file__startswith=f"{storage.blobs_dir}/")
+            .order_by("file").values_list("file", flat=True).distinct()
+        )
+
+        moved, duplicates, missing = 0, 0, 0
+        for i in range(0, len(names), options["batch_size"]):
+            renames = {}
+            for name in names[i:i + options["batch_size"]]:
+                path = storage.path(name)
+                if not os.path.isfile(path):
+                    missing += 1
+                    continue
+                blob_name = storage.blob_name(file_digest(path), name)
+                if storage.exists(blob_name) or blob_name in renames.values():
+                    duplicates += 1
+                else:
+                    moved += 1
+                renames[name] = blob_name
+            if options["dry_run"] or not renames:
+                continue
+
+            # blobs are created next to original files first, so rows never point to not existing files
+            for name, blob_name in renames.items():
+                if not storage.exists(blob_name):
+                    os.makedirs(os.path.dirname(storage.path(blob_name)), exist_ok=True)
+                    try:
+                        os.link(storage.path(name), storage.path(blob_name))
+                    except OSError:
+                        shutil.copyfile(storage.path(name), storage.path(blob_name))
+            with transaction.atomic():
+                Attachment.objects.filter(file__in=renames.keys()).update(file=Case(
+                    *[When(file=name, then=Value(blob_name)) for name, blob_name in renames.items()]
+                ))
+            for name in renames:
+                os.remove(storage.path(name))
+
+        if not options["dry_run"]:
+            self.recount_references()
+        verb = "would be" if options["dry_run"] else "were"
+        self.stdout.write(self.style.SUCCESS(
+            f"{moved} files {verb} moved into blobs, {duplicates} duplicates {verb} removed, {missing} files are missing"
+        ))
+
+    def recount_references(self):
+        """Set references of blobs to the number of attachments using them (one grouped query)"""
+        storage = content_addressed_storage
+        counts = dict(
+            Attachment.objects.filter(file__startswith=f"{storage.blobs_dir}/").values_list("file")
+            .annotate(count=Count("pk")).order_by()
+        )
+        blobs = {blob.name: blob for blob in StoredBlob.objects.filter(name__in=counts.keys())}
+
+        new_blobs = []
+        for name, count in counts.items():
+            if name in blobs:
+                blobs[name].references = count
+            elif storage.exists(name):
+                digest = os.path.splitext(os.path.basename(name))[0]
+                new_blobs.append(StoredBlob(name=name, digest=digest, size=storage.size(name), references=count))
+        with transaction.atomic():
+            StoredBlob.objects.bulk_update(blobs.values(), ["references"], batch_size=1000)
+            StoredBlob.objects.bulk_create(new_blobs, batch_size=1000)
+            StoredBlob.objects.filter(references__gt=0).exclude(name__in=Attachment.objects.values("file")).update(
+                references=0
+            )
@@ -0,0 +1,51 @@
+import csv
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dentman.app.patient_import import FORMATS, file_format_of, import_patients
+
+
+class Command(BaseCommand):
+    help = ("Import patients from CSV or JSON Lines file in batches. Interrupted import of the same file continues "
+            "after the last committed batch")
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Path of CSV (with header) or JSON Lines file")
+        parser.add_argument("--format", choices=FORMATS, default=None,
+                            help="Format of file (by default guessed from its extension)")
+        parser.add_argument("--batch-size", type=int, default=1000, help="How many rows are inserted at once")
+        parser.add_argument("--restart", action="store_true",
+                            help="Process the file from the beginning, even if it has been (partially) imported")
+        parser.add_argument("--photos-dir", default=None,
+                            help="Directory with photos which 'profile_photo' column points to")
+        parser.add_argument("--errors", default=None, help="Path of CSV file to write rejected rows with errors to")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if not os.path.isfile(path):
+            raise CommandError(f"File {path} doesn't exist")
+        if options["batch_size"] < 1:
+            raise CommandError("Batch size has to be positive")
+
+        with open(path, "rb") as file:
+            report = import_patients(file, options["format"] or file_format_of(path), os.path.basename(path),
+                                     batch_size=options["batch_size"], restart=options["restart"],
+                                     photos_dir=options["photos_dir"])
+
+        if options["errors"]:
+            with open(options["errors"], "w", newline="") as errors_file:
+                writer = csv.writer(errors_file)
+                writer.writerow(["row", "field", "message"])
+                for number, messages in report.errors:
+                    for field_name, field_messages in messages.items():
+                        writer.writerows([number, field_name, message] for message in field_messages)
+        if options["verbosity"] >= 2:
+            for number, messages in report.errors:
+                self.stdout.write(f"Row {number}: {messages}")
+
+        if report.resumed_from:
+            self.stdout.write(f"Resumed after row {report.resumed_from}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{report.created} patients imported, {len(report.errors)} rows rejected"
+        ))
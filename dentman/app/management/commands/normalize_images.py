@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from dentman.images import normalize_stored_images
+
+
+class Command(BaseCommand):
+    help = ("Downscale, strip metadata of and re-encode profile photos and posts' main photos already kept in storage "
+            "(the same normalization as for new uploads)")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=None,
+                            help="How many processes encode images (by default number of CPUs)")
+
+    def handle(self, *args, **options):
+        def on_image(path, new_path):
+            if options["verbosity"] >= 2:
+                self.stdout.write(f"{path} -> {new_path}")
+
+        report = normalize_stored_images(workers=options["workers"], on_image=on_image)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{report.normalized} of {report.images} images normalized, {filesizeformat(report.saved)} saved"
+        ))
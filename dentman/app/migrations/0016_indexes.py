@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0015_alter_attachment_file'),
+        ('contenttypes', '0002_remove_content_type_name'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attachmententity',
+            index=models.Index(fields=['content_type', 'object_id'], name='app_attachent_ct_obj_idx'),
+        ),
+    ]
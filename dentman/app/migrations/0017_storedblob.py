@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:12
+
+import dentman.app.models
+import dentman.utils
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0016_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Name')),
+                ('digest', models.CharField(db_index=True, max_length=64, verbose_name='SHA-256 digest')),
+                ('size', models.PositiveBigIntegerField(verbose_name='Size')),
+                ('references', models.PositiveIntegerField(default=0, verbose_name='References')),
+            ],
+            options={
+                'verbose_name': 'stored blob',
+                'verbose_name_plural': 'stored blobs',
+            },
+        ),
+        migrations.AlterField(
+            model_name='attachment',
+            name='file',
+            field=models.FileField(storage=dentman.app.models.get_attachment_storage, upload_to=dentman.utils.get_upload_path_with_class, validators=[django.core.validators.FileExtensionValidator(['pdf', 'jpg', 'png', 'mp4'])], verbose_name='File'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0017_storedblob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='attachmententity',
+            name='object_id',
+            field=models.PositiveBigIntegerField(verbose_name='Object ID'),
+        ),
+    ]
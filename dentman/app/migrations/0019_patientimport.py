@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:52
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0018_attachmententity_object_id_bigint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_name', models.CharField(max_length=255, verbose_name='Source file')),
+                ('digest', models.CharField(max_length=64, unique=True, verbose_name='SHA-256 digest')),
+                ('rows_done', models.PositiveIntegerField(default=0, verbose_name='Rows done')),
+                ('created', models.PositiveIntegerField(default=0, verbose_name='Created')),
+                ('failed', models.PositiveIntegerField(default=0, verbose_name='Failed')),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Started at')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Finished at')),
+            ],
+            options={
+                'verbose_name': "patients' import",
+                'verbose_name_plural': "patients' imports",
+                'ordering': ['-started_at'],
+            },
+        ),
+    ]
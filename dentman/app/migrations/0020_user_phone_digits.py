@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:56
+
+import re
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def normalize_phone_number(number):
+    """Frozen copy of `dentman.phones.normalize_phone_number` as it was when this migration was written"""
+    number = (number or '').strip()
+    digits = re.sub(r'\D', '', number)
+    if number.startswith('+'):
+        pass
+    elif digits.startswith('00'):
+        digits = digits[2:]
+    else:
+        digits = digits.removeprefix('0')
+        if digits and len(digits) <= 10:
+            digits = getattr(settings, 'PHONE_DEFAULT_COUNTRY_CODE', '48') + digits
+    if not digits or len(digits) > 15:
+        return None
+    return digits
+
+
+def fill_phone_digits(apps, schema_editor):
+    """Normalize existing phone numbers in batches (one UPDATE per batch) like `User.set_computed_fields` does"""
+    User = apps.get_model('app', 'User')
+    users = User.objects.exclude(phone_number__isnull=True).exclude(phone_number='').only('pk', 'phone_number')
+    batch = []
+    for user in users.iterator(chunk_size=2000):
+        user.phone_digits = normalize_phone_number(user.phone_number)
+        batch.append(user)
+        if len(batch) == 2000:
+            User.objects.bulk_update(batch, ['phone_digits'])
+            batch = []
+    User.objects.bulk_update(batch, ['phone_digits'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0019_patientimport'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='phone_digits',
+            field=models.CharField(blank=True, editable=False, max_length=15, null=True, verbose_name='Normalized phone number'),
+        ),
+        migrations.RunPython(fill_phone_digits, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['phone_digits'], name='app_user_phone_digits_idx'),
+        ),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:02
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+# frozen copies of `dentman.search` as it was when this migration was written
+SEARCH_DOCUMENT_FIELDS = ('username', 'first_name', 'last_name', 'email', 'phone_number')
+POSTGRESQL_STATEMENTS = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS app_user_search_trgm_idx ON app_user USING gin (search_document gin_trgm_ops)',
+    "CREATE INDEX IF NOT EXISTS app_user_search_fts_idx ON app_user USING gin (to_tsvector('simple', search_document))",
+]
+SQLITE_STATEMENTS = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS app_user_search USING fts5(
+        search_document, content='app_user', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS app_user_search_insert AFTER INSERT ON app_user BEGIN
+        INSERT INTO app_user_search(rowid, search_document) VALUES (new.id, new.search_document);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS app_user_search_delete AFTER DELETE ON app_user BEGIN
+        INSERT INTO app_user_search(app_user_search, rowid, search_document)
+        VALUES ('delete', old.id, old.search_document);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS app_user_search_update AFTER UPDATE OF search_document ON app_user BEGIN
+        INSERT INTO app_user_search(app_user_search, rowid, search_document)
+        VALUES ('delete', old.id, old.search_document);
+        INSERT INTO app_user_search(rowid, search_document) VALUES (new.id, new.search_document);
+    END""",
+    "INSERT INTO app_user_search(app_user_search) VALUES ('rebuild')",
+]
+
+
+def normalize_search_text(text):
+    text = (text or '').lower().replace('ł', 'l')
+    return ''.join(char for char in unicodedata.normalize('NFKD', text) if not unicodedata.combining(char))
+
+
+def build_search_document(user):
+    values = [getattr(user, field_name) for field_name in SEARCH_DOCUMENT_FIELDS]
+    values += [re.sub(r'\D', '', user.phone_number or ''), user.phone_digits]
+    return ' '.join(normalize_search_text(value) for value in values if value)
+
+
+def fill_search_documents(apps, schema_editor):
+    """Build search documents of existing users in batches (one UPDATE per batch) like `User.set_computed_fields`"""
+    User = apps.get_model('app', 'User')
+    batch = []
+    for user in User.objects.only('pk', 'phone_digits', *SEARCH_DOCUMENT_FIELDS).iterator(chunk_size=2000):
+        user.search_document = build_search_document(user)
+        batch.append(user)
+        if len(batch) == 2000:
+            User.objects.bulk_update(batch, ['search_document'])
+            batch = []
+    User.objects.bulk_update(batch, ['search_document'])
+
+
+def install_index(apps, schema_editor):
+    """Create database-specific indexes of search documents (see `dentman.search`)"""
+    statements = {'postgresql': POSTGRESQL_STATEMENTS, 'sqlite': SQLITE_STATEMENTS}
+    for statement in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def uninstall_index(apps, schema_editor):
+    statements = {
+        'postgresql': ['DROP INDEX IF EXISTS app_user_search_trgm_idx', 'DROP INDEX IF EXISTS app_user_search_fts_idx'],
+        'sqlite': ['DROP TRIGGER IF EXISTS app_user_search_delete', 'DROP TRIGGER IF EXISTS app_user_search_insert',
+                   'DROP TRIGGER IF EXISTS app_user_search_update', 'DROP TABLE IF EXISTS app_user_search'],
+    }
+    for statement in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0020_user_phone_digits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='Search document'),
+        ),
+        migrations.RunPython(fill_search_documents, migrations.RunPython.noop),
+        migrations.RunPython(install_index, uninstall_index),
+    ]
@@ -1,4 +1,6 @@
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models.fields.files import FieldFile
 from django.conf import settings
 
 class CreatedUpdatedMixin(models.Model):
@@ -14,9 +16,125 @@ class CreatedUpdatedMixin(models.Model):
         abstract = True
 
 class FullCleanMixin(models.Model):
+    """
+    This mixin validates every record (`full_clean`) before it's saved. For records tracking their changes
+    (`DirtyFieldsMixin`) uniqueness is checked only for changed fields (and fields unique together with them), so saving
+    unchanged record doesn't query database for every unique field
+    """
     class Meta:
         abstract = True
 
+    def _unique_sets(self) -> list[set[str]]:
+        """Sets of fields validated together by `validate_unique` (unique together, constraints and unique_for_date)"""
+        unique_sets = []
+        for model in (type(self), *self._meta.all_parents):
+            unique_sets += [set(fields) for fields in model._meta.unique_together]
+            unique_sets += [set(constraint.fields) for constraint in model._meta.total_unique_constraints]
+        for field in self._meta.concrete_fields:
+            for date_field in (field.unique_for_date, field.unique_for_month, field.unique_for_year):
+                if date_field:
+                    unique_sets.append({field.name, date_field})
+        return unique_sets
+
     def save(self, *args, **kwargs):
-        self.full_clean()
+        if isinstance(self, DirtyFieldsMixin) and not self._state.adding:
+            changed_attnames = self.get_changed_fields()
+            changed = {field.name for field in self._meta.concrete_fields if field.attname in changed_attnames}
+            for fields in self._unique_sets():
+                if not changed.isdisjoint(fields): # unchanged field has to be checked with changed one
+                    changed |= fields
+            unchanged = [field.name for field in self._meta.concrete_fields if field.name not in changed]
+            errors = {}
+            try:
+                self.full_clean(validate_unique=False)
+            except ValidationError as error:
+                errors = error.update_error_dict(errors)
+            try:
+                self.validate_unique(exclude=unchanged)
+            except ValidationError as error:
+                errors = error.update_error_dict(errors)
+            if errors:
+                raise ValidationError(errors)
+        else:
+            self.full_clean()
         super().save(*args, **kwargs)
+
+
+class DirtyFieldsMixin(models.Model):
+    """
+    This mixin remembers values of concrete fields as they were loaded from (or last saved to) database, so `save()` and
+    signals can check what has changed without querying the database again. Values are remembered in `from_db`, after
+    `save()` (only saved fields) and after `refresh_from_db()`. Files are compared by their names. Values of fields
+    deferred while loading are read from database on demand
+    """
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # names and values of loaded fields only (files are loaded as their names)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def _current_value(self, field: models.Field):
+        value = getattr(self, field.attname)
+        return value.name if isinstance(value, FieldFile) else value
+
+    def _remember(self, fields) -> None:
+        loaded_values = self.__dict__.setdefault("_loaded_values", {})
+        for field in fields:
+            loaded_values[field.attname] = self._current_value(field)
+
+    def get_loaded_value(self, field_name: str):
+        """Value of field (attribute name, e.g. `worker_id`) as it is in database; None for not saved record"""
+        loaded_values = self.__dict__.setdefault("_loaded_values", {})
+        if field_name not in loaded_values:
+            if self._state.adding or self.pk is None:
+                return None
+            # deferred field or record created without loading it
+            manager = type(self)._base_manager.using(self._state.db)
+            loaded_values[field_name] = manager.filter(pk=self.pk).values_list(field_name, flat=True).first()
+        return loaded_values[field_name]
+
+    def get_changed_fields(self) -> set[str]:
+        """Attribute names of loaded fields whose values differ from database (all fields for not saved record)"""
+        deferred = self.get_deferred_fields()
+        return {
+            field.attname for field in self._meta.concrete_fields
+            if field.attname not in deferred and self.has_changed(field.attname)
+        }
+
+    def has_changed(self, field_name: str) -> bool:
+        """If value of field (attribute name) differs from database"""
+        if self._state.adding:
+            return True
+        field = self._meta.get_field(field_name)
+        return self._current_value(field) != self.get_loaded_value(field.attname)
+
+    def get_loaded_file(self, field_name: str) -> FieldFile:
+        """File of file field as it is in database (e.g. to delete it after new one was uploaded)"""
+        field = self._meta.get_field(field_name)
+        return field.attr_class(self, field, self.get_loaded_value(field.attname))
+
+    def mark_unchanged(self, *field_names: str) -> None:
+        """Remember current values of fields as saved ones (after they were written with queryset `update()`)"""
+        self._remember(self._meta.get_field(name) for name in field_names)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get("update_fields")
+        deferred = self.get_deferred_fields()
+        self._remember(
+            field for field in self._meta.concrete_fields
+            if field.attname not in deferred and (update_fields is None or field.name in update_fields
+                                                  or field.attname in update_fields)
+        )
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        # only reloaded fields are remembered, other ones may still have unsaved changes
+        if fields is None:
+            deferred = self.get_deferred_fields()
+            fields = [field.attname for field in self._meta.concrete_fields if field.attname not in deferred]
+        self._remember(self._meta.get_field(name) for name in fields)
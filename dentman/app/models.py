@@ -1,21 +1,26 @@
 import os
 import uuid
 import re
+from collections import defaultdict
+from typing import Iterable
 
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.core.validators import FileExtensionValidator, ValidationError
 from django.db import models
 from django.contrib.auth.models import AbstractUser
-from django.apps import apps
 from django.conf import settings
+from django.utils import timezone
 
-from dentman.storage import CustomFileSystemStorage
+from dentman.storage import CustomFileSystemStorage, ContentAddressedStorage
+from dentman.phones import normalize_phone_number
+from dentman.search import build_search_document, SEARCH_DOCUMENT_FIELDS
 from dentman.utils import get_upload_path_with_class, delete_old_file, get_upload_path
-from dentman.app.mixins import CreatedUpdatedMixin, FullCleanMixin
+from dentman.app.mixins import CreatedUpdatedMixin, FullCleanMixin, DirtyFieldsMixin
 
 storage_user = CustomFileSystemStorage(location=settings.STORAGE_ROOT / 'users-prof-photo', base_url=f"/app/profile-photos")
 storage = CustomFileSystemStorage()
+content_addressed_storage = ContentAddressedStorage()
 file_extension_validator = FileExtensionValidator(['pdf', 'jpg', 'png', 'mp4'])
 phone_number_regex = r"^\+?[1-9]\d{0,2}[\d\s\-()]{4,14}$"
 
@@ -34,7 +39,15 @@ def get_profile_photo_upload_path(instance: models.Model, filename: str) -> str:
     return f"{d}/{filename}"
 
 
-class User(AbstractUser, CreatedUpdatedMixin, FullCleanMixin):
+def get_attachment_storage():
+    """
+    Storage of attachments' files: content-addressed (every distinct file stored once) if
+    `settings.CONTENT_ADDRESSED_ATTACHMENTS` is set, otherwise every upload is stored as a new file
+    """
+    return content_addressed_storage if settings.CONTENT_ADDRESSED_ATTACHMENTS else storage
+
+
+class User(AbstractUser, CreatedUpdatedMixin, FullCleanMixin, DirtyFieldsMixin):
     """
     User model class. It overrides AbstractUser and has additional fields:
     1) eid - additional unique id for field (isn't primary key)
@@ -45,9 +58,17 @@ class User(AbstractUser, CreatedUpdatedMixin, FullCleanMixin):
     6) is_dentist - Boolean for dentist status
     7) is_dev - Boolean for dev status
     8) additional_info - TextField with additional information about user
+    9) phone_digits - phone number normalized to E.164 digits (see `dentman.phones.normalize_phone_number`)
+    10) search_document - text by which user is found in admins (see `dentman.search`)
     """
     eid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     phone_number = models.CharField("Phone number", max_length=16, blank=True, null=True)
+    phone_digits = models.CharField(
+        "Normalized phone number", max_length=15, blank=True, null=True, editable=False
+    ) # phone number as country code and digits only, used to identify callers (see `dentman.app.phones`)
+    search_document = models.TextField(
+        "Search document", blank=True, default="", editable=False
+    ) # names, e-mail and phone number in searched form, indexed by `dentman.search`
     profile_photo = models.ImageField("Profile photo", upload_to=get_profile_photo_upload_path, storage=storage_user, blank=True, null=True)
     is_patient = models.BooleanField("Is patient", default=True)
     is_worker = models.BooleanField("Is worker", default=False)
@@ -55,13 +76,32 @@ class User(AbstractUser, CreatedUpdatedMixin, FullCleanMixin):
     is_dev = models.BooleanField("Is developer", default=False)
     additional_info = models.TextField("Additional information", blank=True, null=True)
 
+    # fields computed in `set_computed_fields` and fields they are computed from
+    COMPUTED_FIELDS = {
+        "phone_digits": ("phone_number", ),
+        "search_document": SEARCH_DOCUMENT_FIELDS,
+    }
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=["phone_digits"], name="app_user_phone_digits_idx"),
+        ]
+
     def save(self, *args, **kwargs):
-        if self.pk:
-            actual_photo = User.objects.get(pk=self.pk).profile_photo
-            if self.profile_photo != actual_photo: # if new profile photo has been uploaded delete old one and upload a new one
-                delete_old_file(actual_photo)
+        if self.pk and self.has_changed("profile_photo"): # if new profile photo has been uploaded delete old one and upload a new one
+            delete_old_file(self.get_loaded_file("profile_photo"))
+        self.set_computed_fields()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None: # computed fields are saved together with fields they are computed from
+            kwargs["update_fields"] = {*update_fields, *(name for name, sources in self.COMPUTED_FIELDS.items()
+                                                         if not set(sources).isdisjoint(update_fields))}
         super().save(*args, **kwargs)
 
+    def set_computed_fields(self):
+        """Set fields computed from other ones (also used by `dentman.bulk.validated_bulk_create`)"""
+        self.phone_digits = normalize_phone_number(self.phone_number)
+        self.search_document = build_search_document(self)
+
     def clean(self):
         super().clean()
 
@@ -79,7 +119,7 @@ class Attachment(CreatedUpdatedMixin, FullCleanMixin):
     2) is_active - Boolean for active status
     3) additional_info - TextField with additional information about attachment
     """
-    file = models.FileField("File", upload_to=get_upload_path_with_class, storage=storage, blank=False, null=False,
+    file = models.FileField("File", upload_to=get_upload_path_with_class, storage=get_attachment_storage, blank=False, null=False,
                             validators=[file_extension_validator])
     is_active = models.BooleanField("Is active", default=True)
     additional_info = models.TextField("Additional information", blank=True, null=True)
@@ -92,32 +132,110 @@ class Attachment(CreatedUpdatedMixin, FullCleanMixin):
         return f"Attachment {os.path.basename(self.file.name)}"
 
 
+class StoredBlob(models.Model):
+    """
+    File kept by `ContentAddressedStorage` with number of references to it. Fields:
+    1) name - name of file in storage (built from the hash of its content)
+    2) digest - SHA-256 hash of file's content
+    3) size - size of file in bytes
+    4) references - how many saved files point to this blob; blob is removed when it drops to 0
+    """
+    name = models.CharField("Name", max_length=255, unique=True)
+    digest = models.CharField("SHA-256 digest", max_length=64, db_index=True)
+    size = models.PositiveBigIntegerField("Size")
+    references = models.PositiveIntegerField("References", default=0)
+
+    class Meta:
+        verbose_name = "stored blob"
+        verbose_name_plural = "stored blobs"
+
+    def __str__(self):
+        return f"{self.name} ({self.references} references)"
+
+
+class PatientImport(models.Model):
+    """
+    Progress of import of patients from file (see `dentman.app.patient_import`), used to resume interrupted import.
+    Fields:
+    1) source_name - name of imported file
+    2) digest - SHA-256 hash of file's content (import of the same file continues where it has stopped)
+    3) rows_done - how many rows of file have been processed (their batches are committed)
+    4) created - how many patients have been created
+    5) failed - how many rows have been rejected
+    6) started_at - when import has started
+    7) finished_at - when all rows have been processed (empty while import isn't finished)
+    """
+    source_name = models.CharField("Source file", max_length=255)
+    digest = models.CharField("SHA-256 digest", max_length=64, unique=True)
+    rows_done = models.PositiveIntegerField("Rows done", default=0)
+    created = models.PositiveIntegerField("Created", default=0)
+    failed = models.PositiveIntegerField("Failed", default=0)
+    started_at = models.DateTimeField("Started at", default=timezone.now)
+    finished_at = models.DateTimeField("Finished at", blank=True, null=True)
+
+    class Meta:
+        verbose_name = "patients' import"
+        verbose_name_plural = "patients' imports"
+        ordering = ["-started_at"]
+
+    def __str__(self):
+        return f"Import of {self.source_name}: {self.created} created, {self.failed} failed"
+
+
+class AttachmentEntityQuerySet(models.QuerySet):
+    def for_objects(self, objects: models.QuerySet) -> "AttachmentEntityQuerySet":
+        """Entities of objects of the given queryset (one query with subquery, uses (content_type, object_id) index)"""
+        content_type = ContentType.objects.get_for_model(objects.model)
+        return self.filter(content_type=content_type, object_id__in=objects.values("pk"))
+
+    def attachments_by_object(self, objects: Iterable[models.Model]) -> dict[models.Model, list["Attachment"]]:
+        """
+        Attachments of the given objects (queryset or list of instances, also of different models, e.g. visits and
+        workers) grouped by object. Every object is in the result, without attachments with empty list. Costs one query
+        per content type (content types are cached).
+        """
+        objects = list(objects)
+        by_content_type = defaultdict(dict)
+        for obj in objects:
+            by_content_type[ContentType.objects.get_for_model(obj)][obj.pk] = obj
+
+        grouped = {obj: [] for obj in objects}
+        for content_type, by_pk in by_content_type.items():
+            entities = self.filter(content_type=content_type, object_id__in=list(by_pk)).select_related("attachment")
+            for entity in entities.order_by("pk"):
+                grouped[by_pk[entity.object_id]].append(entity.attachment)
+        return grouped
+
+
 class AttachmentEntity(CreatedUpdatedMixin, FullCleanMixin):
     """
     ManyToMany model between attachments and another models. Fields are:
     1) attachment - Attachment model foreign key
     2) content_type - ContentType model foreign key
-    3) object_id - PositiveIntegerField with id of object that this attachment belongs to
+    3) object_id - PositiveBigIntegerField with id of object that this attachment belongs to
     4) content_object - GenericForeignKey with object that this attachment belongs to
     """
     attachment = models.ForeignKey(Attachment, on_delete=models.CASCADE, verbose_name="Attachment", null=False, blank=False)
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, verbose_name="Content type", null=False, blank=False)
-    object_id = models.PositiveIntegerField(verbose_name="Object ID", null=False, blank=False)
+    object_id = models.PositiveBigIntegerField(verbose_name="Object ID", null=False, blank=False)
     content_object = GenericForeignKey("content_type", "object_id")
 
+    objects = AttachmentEntityQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Attachment's entity"
         verbose_name_plural = "Attachments' entities"
+        indexes = [
+            models.Index(fields=["content_type", "object_id"], name="app_attachent_ct_obj_idx"),
+        ]
 
     def __str__(self):
         attachment_filename = os.path.basename(self.attachment.file.name)
-        attachment_id = self.attachment.pk
-        attachment_info = f"Attachment {attachment_filename} (ID: {attachment_id})"
+        attachment_info = f"Attachment {attachment_filename} (ID: {self.attachment_id})"
 
         if self.object_id:
-            model_class = apps.get_model(self.content_type.app_label, self.content_type.model)
-            model_verbose_name = model_class._meta.verbose_name
-
+            # content types are cached, so only content object has to be loaded (or prefetched, like in admin)
+            model_verbose_name = ContentType.objects.get_for_id(self.content_type_id).name
             object_representation = f"{model_verbose_name}: {self.content_object} (ID: {self.object_id})"
 
             return f"{attachment_info} for {object_representation}"
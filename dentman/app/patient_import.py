@@ -0,0 +1,178 @@
+"""
+Import of patients from CSV or JSON Lines file - used when clinic is migrated onto dentman.
+
+Creating patients one by one costs `full_clean`, password hashing and signals per row, so the file is read as stream
+and processed in batches:
+1) phone numbers of the whole batch are checked with one compiled `phone_number_regex` before objects are built
+2) patients get unusable passwords (they set their own ones with password reset) instead of hashed ones
+3) rows are validated and inserted with `validated_bulk_create` (see `dentman.bulk`), which also sets fields computed
+on save (normalized phone number used to identify callers); rejected rows are reported with their errors by row number
+4) progress is stored in `PatientImport` in the same transaction as the batch, so import of the same file (recognized
+by hash of its content) which has been interrupted continues after the last committed batch
+
+Columns (CSV header or keys of JSON objects): username (required), first_name, last_name, email, phone_number,
+additional_info and profile_photo (path of photo relative to `photos_dir`, ignored if it isn't given). Other columns
+are ignored.
+"""
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from itertools import batched, islice
+from typing import IO, Iterator
+
+from django.conf import settings
+from django.core.exceptions import NON_FIELD_ERRORS, SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils import timezone
+from django.utils._os import safe_join
+
+from dentman.app.models import User, PatientImport, phone_number_regex, get_profile_photo_upload_path
+from dentman.bulk import validated_bulk_create
+from dentman.images import normalize_image
+
+FORMATS = ("csv", "jsonl")
+TEXT_COLUMNS = ("username", "first_name", "last_name", "email")
+NULLABLE_COLUMNS = ("phone_number", "additional_info")
+PHONE_RE = re.compile(phone_number_regex)
+
+
+@dataclass
+class ImportReport:
+    """Result of `import_patients`: its checkpoint, patients created by this run and errors of rejected rows"""
+    checkpoint: PatientImport
+    resumed_from: int = 0
+    created: int = 0
+    errors: list[tuple[int, dict[str, list[str]]]] = field(default_factory=list)
+
+
+def file_format_of(name: str) -> str:
+    """Format of file guessed from its extension ('.jsonl' and '.ndjson' are JSON Lines, everything else CSV)"""
+    return "jsonl" if os.path.splitext(name)[1].lower() in (".jsonl", ".ndjson") else "csv"
+
+
+def read_rows(file: IO[bytes], file_format: str) -> Iterator[dict | None]:
+    """
+    Function to read rows of binary file one by one (the file is never loaded whole). Yields dict per row, or None for
+    line of JSON Lines file which isn't JSON object.
+    """
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="" if file_format == "csv" else None)
+    try:
+        if file_format == "csv":
+            yield from csv.DictReader(text)
+            return
+        for line in text:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield row if isinstance(row, dict) else None
+    finally:
+        text.detach() # closing of wrapper mustn't close caller's file
+
+
+def invalid_phones(rows: list[dict]) -> list[bool]:
+    """Function to check phone numbers of the whole batch with one compiled regex, True for invalid ones"""
+    phones = [str(row.get("phone_number") or "").strip() for row in rows]
+    return [bool(phone) and PHONE_RE.match(phone) is None for phone in phones]
+
+
+def build_patient(row: dict) -> User:
+    """Function to build (not save) patient from row with unusable password"""
+    values = {column: str(row.get(column) or "").strip() for column in TEXT_COLUMNS}
+    values.update({column: str(row.get(column) or "").strip() or None for column in NULLABLE_COLUMNS})
+    user = User(is_patient=True, **values)
+    user.set_unusable_password()
+    return user
+
+
+def store_photos(users_with_photos: list[tuple[User, str]]) -> None:
+    """
+    Function to store photos of inserted patients (normalized like uploaded ones) in their directories and save their
+    names with one query
+    """
+    storage = User._meta.get_field("profile_photo").storage
+    saved = []
+    for user, path in users_with_photos:
+        if user.pk is None:
+            continue # row has been rejected
+        result = normalize_image(path, settings.IMAGE_UPLOAD_MAX_SIZE, settings.IMAGE_UPLOAD_FORMAT,
+                                 settings.IMAGE_UPLOAD_QUALITY)
+        name, extension = os.path.splitext(os.path.basename(path))
+        if result is None:
+            with open(path, "rb") as photo:
+                content = photo.read()
+        else:
+            content, extension = result
+        user.profile_photo = storage.save(get_profile_photo_upload_path(user, name + extension),
+                                          ContentFile(content))
+        saved.append(user)
+    if saved:
+        User.objects.bulk_update(saved, ["profile_photo"])
+
+
+def import_patients(file: IO[bytes], file_format: str, source_name: str, batch_size: int = 1000,
+                    restart: bool = False, photos_dir: str | None = None) -> ImportReport:
+    """
+    Function to import patients from binary file of given format ('csv' or 'jsonl') in batches of `batch_size` rows.
+    Rows already processed by previous run of the same file are skipped, unless `restart` is set. Returns created
+    patients and errors (message dicts) of rejected rows by their numbers (counted from 1, CSV header excluded) - only
+    of rows processed by this run.
+    """
+    digest = hashlib.file_digest(file, "sha256").hexdigest()
+    file.seek(0)
+    checkpoint, _ = PatientImport.objects.get_or_create(digest=digest, defaults={"source_name": source_name})
+    if restart:
+        checkpoint.rows_done = checkpoint.created = checkpoint.failed = 0
+        checkpoint.started_at, checkpoint.finished_at = timezone.now(), None
+        checkpoint.save()
+    report = ImportReport(checkpoint=checkpoint, resumed_from=checkpoint.rows_done)
+
+    rows = islice(enumerate(read_rows(file, file_format), 1), checkpoint.rows_done, None)
+    for batch in batched(rows, batch_size):
+        errors = []
+        numbers, patients, photos = [], [], []
+        parsed = [(number, row) for number, row in batch if row is not None]
+        errors += [(number, {NON_FIELD_ERRORS: ["Row isn't a JSON object"]}) for number, row in batch if row is None]
+        for (number, row), invalid_phone in zip(parsed, invalid_phones([row for _, row in parsed])):
+            if invalid_phone:
+                errors.append((number, {"phone_number": ["Invalid phone number format"]}))
+                continue
+            patient = build_patient(row)
+            photo = str(row.get("profile_photo") or "").strip()
+            if photo and photos_dir:
+                try:
+                    path = safe_join(photos_dir, photo)
+                except SuspiciousFileOperation:
+                    path = None # photo outside of photos' directory
+                if path is None or not os.path.isfile(path):
+                    errors.append((number, {"profile_photo": [f"Photo {photo} doesn't exist"]}))
+                    continue
+                photos.append((patient, path))
+            numbers.append(number)
+            patients.append(patient)
+
+        def on_batch(created, batch_errors):
+            store_photos(photos)
+            errors.extend((numbers[position], messages) for position, messages in batch_errors.items())
+            checkpoint.rows_done = batch[-1][0]
+            checkpoint.created += len(created)
+            checkpoint.failed += len(errors)
+            checkpoint.save(update_fields=["rows_done", "created", "failed"])
+
+        result = validated_bulk_create(User, patients, batch_size=len(batch), on_batch=on_batch)
+        if not patients:
+            with transaction.atomic():
+                on_batch([], {})
+        report.created += result.created
+        report.errors += sorted(errors, key=lambda error: error[0])
+
+    checkpoint.finished_at = timezone.now()
+    checkpoint.save(update_fields=["finished_at"])
+    return report
@@ -0,0 +1,23 @@
+"""
+Identification of callers by phone number.
+
+Phone numbers are typed in many formats ("+48 600-100-200", "600100200"), so users are looked up by `User.phone_digits`
+- the number normalized to E.164 digits (see `dentman.phones.normalize_phone_number`) whenever user is saved, kept in an
+index. Incoming number is normalized the same way, so whatever format the telephone exchange passes, the lookup is one
+indexed equality query.
+"""
+from django.db.models import QuerySet
+
+from dentman.app.models import User
+from dentman.phones import normalize_phone_number
+
+
+def find_users_by_phone(number: str) -> QuerySet:
+    """
+    Function to resolve phone number in any format to active users with this number (patients first). Returns empty
+    queryset (without query) for number without digits.
+    """
+    digits = normalize_phone_number(number)
+    if digits is None:
+        return User.objects.none()
+    return User.objects.filter(phone_digits=digits, is_active=True).order_by("-is_patient", "pk")
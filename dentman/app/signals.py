@@ -1,24 +1,24 @@
 import os
 
-from django.db.models.signals import pre_delete, post_save
+from django.db import connections
+from django.db.models.signals import pre_delete, pre_save, post_save, post_migrate
 from django.dispatch import receiver
 
 from dentman.app.models import User, Attachment, get_profile_photo_upload_path
-from dentman.utils import get_upload_path, delete_old_file
+from dentman.search import install_search_index
+from dentman.utils import get_upload_path, delete_old_file, relocate_file, normalize_uploaded_image
+
+@receiver(pre_save, sender=User)
+def normalize_profile_photo(sender, instance, **kwargs):
+    """Signal's function to downscale newly uploaded profile photo and strip its metadata before it's stored"""
+    normalize_uploaded_image(instance, 'profile_photo')
 
 @receiver(post_save, sender=User)
 def move_profile_photo(sender, instance, created, **kwargs):
     """Signal's function for user's profile photo to move from temporary folder into dedicated directory"""
     if instance.profile_photo and 'temp' in instance.profile_photo.name:
-        old_name = instance.profile_photo.name
-        filename = os.path.basename(old_name)
-        new_name = get_profile_photo_upload_path(instance, filename)
-        if old_name != new_name:
-            file = instance.profile_photo.storage.open(old_name)
-            instance.profile_photo.storage.save(new_name, file)
-            instance.profile_photo.storage.delete(old_name)
-            instance.profile_photo.name = new_name
-            instance.save(update_fields=['profile_photo'])
+        filename = os.path.basename(instance.profile_photo.name)
+        relocate_file(instance, 'profile_photo', get_profile_photo_upload_path(instance, filename))
 
 @receiver(pre_delete, sender=User)
 def delete_profile_photo(sender, instance, **kwargs):
@@ -29,17 +29,26 @@ def delete_profile_photo(sender, instance, **kwargs):
 def move_file(sender, instance, created, **kwargs):
     """Signal's function to move attachment file from temporary folder into dedicated directory"""
     if instance.file and 'temp' in instance.file.name:
-        old_name = instance.file.name
-        filename = os.path.basename(old_name)
-        new_name = get_upload_path(instance, filename, True)
-        if old_name != new_name:
-            file = instance.file.storage.open(old_name)
-            instance.file.storage.save(new_name, file)
-            instance.file.storage.delete(old_name)
-            instance.file.name = new_name
-            instance.save(update_fields=['file'])
+        filename = os.path.basename(instance.file.name)
+        relocate_file(instance, 'file', get_upload_path(instance, filename, True))
 
 @receiver(pre_delete, sender=Attachment)
 def delete_file(sender, instance, **kwargs):
     """Signal's function to delete attachment file when attachment is going to be deleted"""
-    delete_old_file(instance.file)
\ No newline at end of file
+    delete_old_file(instance.file)
+
+@receiver(post_migrate)
+def reinstall_search_index(sender, using, **kwargs):
+    """
+    Signal's function to install indexes of users' search documents again if they are missing, e.g. SQLite's triggers
+    dropped when users' table has been rebuilt by migration
+    """
+    if sender.name != "dentman.app":
+        return
+    connection = connections[using]
+    if "app_user" not in connection.introspection.table_names():
+        return
+    with connection.cursor() as cursor:
+        columns = {column.name for column in connection.introspection.get_table_description(cursor, "app_user")}
+    if "search_document" in columns: # migrations may have been run only up to earlier state
+        install_search_index(connection)
@@ -0,0 +1,142 @@
+import io
+import os
+import zipfile
+import pytest
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.contrib.contenttypes.models import ContentType
+from django.core.files.base import ContentFile
+from django.urls import reverse
+
+from dentman.app.models import Attachment, AttachmentEntity
+from dentman.archives import zip_stream
+from dentman.storage import CustomFileSystemStorage
+
+User = get_user_model()
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    storage = CustomFileSystemStorage(location=tmp_path)
+    monkeypatch.setattr(Attachment._meta.get_field("file"), "storage", storage)
+    return storage
+
+
+@pytest.fixture
+def patient(storage):
+    """Fixture to create patient with attached PDF scan, JPEG photo and another file named as the scan"""
+    patient = User.objects.create_user(username="patient", password="password123")
+    for name, content in [("scan.pdf", b"scan " * 1000), ("photo.jpg", b"jpeg bytes"), ("scan.pdf", b"second scan")]:
+        attach(storage, patient, name, content)
+    return patient
+
+
+def attach(storage, obj, name: str, content: bytes) -> Attachment:
+    name = storage.save(f"{AttachmentEntity.objects.count()}/{name}", ContentFile(content))
+    attachment = Attachment.objects.create(file=name)
+    AttachmentEntity.objects.create(attachment=attachment, content_type=ContentType.objects.get_for_model(obj),
+                                    object_id=obj.pk)
+    return attachment
+
+
+def read_zip(response) -> zipfile.ZipFile:
+    assert response["Content-Type"] == "application/zip"
+    return zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+
+
+def archive_url(obj) -> str:
+    return reverse("download_attachments", args=[obj._meta.app_label, obj._meta.model_name, obj.pk])
+
+
+@pytest.mark.django_db
+def test_attachments_are_streamed_as_zip(patient, admin_client):
+    """Test that all files attached to object are in archive, media STORED and other files DEFLATED"""
+    response = admin_client.get(archive_url(patient))
+
+    assert response.status_code == 200
+    assert response["Content-Disposition"] == f'attachment; filename="user-{patient.pk}-attachments.zip"'
+    archive = read_zip(response)
+    assert archive.testzip() is None
+    assert sorted(archive.namelist()) == ["photo.jpg", "scan (2).pdf", "scan.pdf"]
+    assert archive.read("scan.pdf") == b"scan " * 1000
+    assert archive.getinfo("scan.pdf").compress_type == zipfile.ZIP_DEFLATED
+    assert archive.getinfo("photo.jpg").compress_type == zipfile.ZIP_STORED
+
+
+@pytest.mark.django_db
+def test_archive_is_not_found_without_permission_or_attachments(patient, client, admin_client):
+    """Test 404 for users who can't view attachments, unknown models and objects without attachments"""
+    client.force_login(patient)
+    assert client.get(archive_url(patient)).status_code == 404
+
+    assert admin_client.get(reverse("download_attachments", args=["app", "unknown", 1])).status_code == 404
+    other = User.objects.create_user(username="other", password="password123")
+    assert admin_client.get(archive_url(other)).status_code == 404
+
+
+async def consume(response) -> list[bytes]:
+    return [chunk async for chunk in response.streaming_content]
+
+
+@pytest.mark.django_db
+def test_asgi_request_streams_archive_by_async_iterator(patient, async_client, admin_user):
+    """Test that under ASGI archive is streamed by async iterator, chunk by chunk instead of being built whole"""
+    async_to_sync(async_client.aforce_login)(admin_user)
+    response = async_to_sync(async_client.get)(archive_url(patient))
+
+    assert response.status_code == 200
+    assert response.is_async
+    chunks = async_to_sync(consume)(response)
+    assert len(chunks) > 1
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+    assert archive.testzip() is None
+    assert sorted(archive.namelist()) == ["photo.jpg", "scan (2).pdf", "scan.pdf"]
+
+
+def test_archive_is_streamed_in_bounded_chunks():
+    """Test that archive of big file is yielded by chunks, never holding the whole file"""
+    content = os.urandom(1024 * 1024)
+    chunks = list(zip_stream([("video.mp4", len(content), lambda: io.BytesIO(content))], chunk_size=64 * 1024))
+
+    assert max(len(chunk) for chunk in chunks) < 70 * 1024
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+    assert archive.read("video.mp4") == content
+
+
+@pytest.mark.django_db
+def test_admin_action_puts_every_object_into_own_directory(storage, patient, admin_client):
+    """Test that admin action downloads attachments of all selected users, one directory per user"""
+    other = User.objects.create_user(username="other", password="password123")
+    attach(storage, other, "scan.pdf", b"other scan")
+
+    response = admin_client.post(reverse("admin:app_user_changelist"), {
+        "action": "download_attachments", "_selected_action": [patient.pk, other.pk],
+    })
+
+    archive = read_zip(response)
+    assert sorted(archive.namelist()) == sorted([
+        f"user-{other.pk}/scan.pdf", f"user-{patient.pk}/photo.jpg", f"user-{patient.pk}/scan (2).pdf",
+        f"user-{patient.pk}/scan.pdf",
+    ])
+    assert archive.read(f"user-{other.pk}/scan.pdf") == b"other scan"
+
+
+@pytest.mark.django_db
+def test_admin_actions_require_permission_to_view_attachments(patient, client):
+    """Test that staff who can change users but can't view attachments can't download them with admin actions"""
+    staff = User.objects.create_user(username="staff", password="password123", is_staff=True)
+    staff.user_permissions.set(Permission.objects.filter(codename__in=["view_user", "change_user",
+                                                                      "view_attachmententity"]))
+    client.force_login(staff)
+
+    response = client.post(reverse("admin:app_user_changelist"), {
+        "action": "download_attachments", "_selected_action": [patient.pk],
+    })
+    assert response["Content-Type"].startswith("text/html") # action isn't available, changelist is shown again
+
+    entity = AttachmentEntity.objects.first()
+    response = client.post(reverse("admin:app_attachmententity_changelist"), {
+        "action": "download_objects_attachments", "_selected_action": [entity.pk],
+    })
+    assert response["Content-Type"].startswith("text/html")
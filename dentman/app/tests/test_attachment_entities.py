@@ -0,0 +1,87 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from dentman.app.models import Attachment, AttachmentEntity, Metrics
+from dentman.man.tests.utils import InMemoryStorage
+
+User = get_user_model()
+
+
+@pytest.fixture(autouse=True)
+def storage(monkeypatch):
+    monkeypatch.setattr(Attachment._meta.get_field("file"), "storage", InMemoryStorage())
+
+
+def attach(obj, name: str) -> Attachment:
+    attachment = Attachment.objects.create(file=name)
+    AttachmentEntity.objects.create(attachment=attachment, content_type=ContentType.objects.get_for_model(obj),
+                                    object_id=obj.pk)
+    return attachment
+
+
+@pytest.fixture
+def objects(db):
+    """Fixture to create objects of two models (two users and metric) to attach files to"""
+    patient = User.objects.create_user(username="patient", password="password123")
+    other = User.objects.create_user(username="other", password="password123")
+    metric = Metrics.objects.create(measurement_type=1, measurement_name="Depth", measurement_name_shortcut="mm")
+    return patient, other, metric
+
+
+@pytest.mark.django_db
+def test_attachments_are_grouped_by_object(objects, django_assert_num_queries):
+    """Test that attachments of objects of different models cost one query per content type"""
+    patient, other, metric = objects
+    scan, photo = attach(patient, "scan.pdf"), attach(patient, "photo.jpg")
+    chart = attach(metric, "chart.png")
+    ContentType.objects.get_for_models(User, Metrics) # warm up content types' cache
+
+    with django_assert_num_queries(2):
+        grouped = AttachmentEntity.objects.attachments_by_object([patient, other, metric])
+    assert grouped == {patient: [scan, photo], other: [], metric: [chart]}
+
+    with django_assert_num_queries(2):
+        grouped = AttachmentEntity.objects.attachments_by_object(User.objects.order_by("pk"))
+        assert [attachment.file.name for attachment in grouped[patient]] == ["scan.pdf", "photo.jpg"]
+
+
+@pytest.mark.django_db
+def test_entities_of_queryset(objects):
+    """Test that entities can be filtered by queryset of objects"""
+    patient, other, metric = objects
+    attach(patient, "scan.pdf")
+    attach(metric, "chart.png")
+
+    entities = AttachmentEntity.objects.for_objects(User.objects.filter(username="patient"))
+    assert [entity.attachment.file.name for entity in entities] == ["scan.pdf"]
+
+
+@pytest.mark.django_db
+def test_str_describes_attachment_and_object(objects):
+    """Test text representation with model's verbose name and object"""
+    patient, _, _ = objects
+    attachment = attach(patient, "scan.pdf")
+    entity = AttachmentEntity.objects.get(attachment=attachment)
+    assert str(entity) == f"Attachment scan.pdf (ID: {attachment.pk}) for user: patient (ID: {patient.pk})"
+
+
+@pytest.mark.django_db
+def test_admin_changelist_queries_do_not_grow_with_rows(objects, admin_client):
+    """Test that changelist of entities costs the same number of queries for 2 and 6 rows"""
+    patient, other, metric = objects
+
+    def count_queries():
+        with CaptureQueriesContext(connection) as context:
+            assert admin_client.get(reverse("admin:app_attachmententity_changelist")).status_code == 200
+        return len(context.captured_queries)
+
+    attach(patient, "scan.pdf")
+    attach(metric, "chart.png")
+    queries = count_queries()
+    for obj in (patient, other, metric, other):
+        attach(obj, "photo.jpg")
+    assert count_queries() == queries
@@ -0,0 +1,91 @@
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+
+from dentman.app.models import Attachment, StoredBlob
+from dentman.storage import ContentAddressedStorage
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    """Fixture to store attachments in content-addressed storage inside temporary directory"""
+    storage = ContentAddressedStorage(location=tmp_path)
+    monkeypatch.setattr(Attachment._meta.get_field("file"), "storage", storage)
+    monkeypatch.setattr("dentman.app.management.commands.dedupe_attachments.content_addressed_storage", storage)
+    return storage
+
+
+def attach(name, content):
+    attachment = Attachment(file=SimpleUploadedFile(name, content))
+    attachment.save()
+    return attachment
+
+
+@pytest.mark.django_db
+def test_same_content_is_stored_once(storage, tmp_path):
+    """Test that the same file uploaded twice is one blob with two references"""
+    first = attach("xray.pdf", b"x-ray")
+    second = attach("other-name.pdf", b"x-ray")
+    third = attach("different.pdf", b"other x-ray")
+
+    assert first.file.name == second.file.name != third.file.name
+    assert first.file.name.startswith("blobs/") and first.file.name.endswith(".pdf")
+    assert StoredBlob.objects.get(name=first.file.name).references == 2
+    assert len([path for path in (tmp_path / "blobs").rglob("*") if path.is_file()]) == 2
+    assert not any((tmp_path / ".tmp").iterdir())
+
+
+@pytest.mark.django_db
+def test_blob_is_removed_with_last_reference(storage, django_capture_on_commit_callbacks):
+    """Test that deleting attachment removes file only when nothing else uses it"""
+    first = attach("xray.pdf", b"x-ray")
+    second = attach("xray.pdf", b"x-ray")
+    name = first.file.name
+
+    with django_capture_on_commit_callbacks(execute=True):
+        first.delete()
+    assert storage.exists(name)
+    assert StoredBlob.objects.get(name=name).references == 1
+
+    with django_capture_on_commit_callbacks(execute=True):
+        second.delete()
+    assert not storage.exists(name)
+    assert not StoredBlob.objects.exists()
+
+
+@pytest.mark.django_db
+def test_dedupe_command(storage, tmp_path, capsys, settings):
+    """Test that command moves existing files into blobs, removes duplicates and counts references"""
+    settings.CONTENT_ADDRESSED_ATTACHMENTS = True
+    for name, content in [("00/01/a.pdf", b"same"), ("00/02/b.pdf", b"same"), ("00/03/c.pdf", b"other")]:
+        path = tmp_path / "Attachment" / name
+        path.parent.mkdir(parents=True)
+        path.write_bytes(content)
+    Attachment.objects.bulk_create([
+        Attachment(file="Attachment/00/01/a.pdf"), Attachment(file="Attachment/00/02/b.pdf"),
+        Attachment(file="Attachment/00/03/c.pdf"), Attachment(file="Attachment/00/04/missing.pdf"),
+    ])
+
+    call_command("dedupe_attachments", "--batch-size", "2")
+    assert "2 files were moved into blobs, 1 duplicates were removed, 1 files are missing" in capsys.readouterr().out
+
+    names = list(Attachment.objects.order_by("pk").values_list("file", flat=True))
+    assert names[0] == names[1] != names[2]
+    assert names[3] == "Attachment/00/04/missing.pdf"
+    assert dict(StoredBlob.objects.values_list("name", "references")) == {names[0]: 2, names[2]: 1}
+    assert not [path for path in (tmp_path / "Attachment").rglob("*") if path.is_file()]
+    assert storage.open(names[0]).read() == b"same"
+
+
+@pytest.mark.django_db
+def test_dedupe_command_requires_content_addressed_attachments(storage, tmp_path, settings):
+    """Test that command refuses to move files into blobs while attachments aren't content-addressed"""
+    settings.CONTENT_ADDRESSED_ATTACHMENTS = False
+    (tmp_path / "Attachment").mkdir()
+    (tmp_path / "Attachment" / "a.pdf").write_bytes(b"same")
+    Attachment.objects.bulk_create([Attachment(file="Attachment/a.pdf")])
+
+    with pytest.raises(CommandError):
+        call_command("dedupe_attachments")
+    assert Attachment.objects.get().file.name == "Attachment/a.pdf"
+    assert (tmp_path / "Attachment" / "a.pdf").exists()
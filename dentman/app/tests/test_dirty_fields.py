@@ -0,0 +1,91 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from dentman.man.tests.utils import InMemoryStorage
+
+User = get_user_model()
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    storage = InMemoryStorage()
+    monkeypatch.setattr(User._meta.get_field("profile_photo"), "storage", storage)
+    return storage
+
+
+@pytest.fixture
+def user(db, storage):
+    """Fixture to create user with profile photo and load it from database"""
+    storage.save("abc/old.jpg", ContentFile(b"old photo"))
+    user = User.objects.create_user(username="patient", password="password123", profile_photo="abc/old.jpg")
+    return User.objects.get(pk=user.pk)
+
+
+@pytest.mark.django_db
+def test_changed_fields_are_tracked(user):
+    """Test that changes are compared with values loaded from database and forgotten after save"""
+    assert user.get_changed_fields() == set()
+
+    user.first_name = "Anna"
+    user.profile_photo = "abc/new.jpg"
+    assert user.get_changed_fields() == {"first_name", "profile_photo"}
+    assert user.get_loaded_value("first_name") == ""
+
+    user.save(update_fields=["first_name"])
+    assert user.get_changed_fields() == {"profile_photo"}
+
+
+@pytest.mark.django_db
+def test_save_of_loaded_user_costs_only_update(user, django_assert_num_queries):
+    """Test that saving loaded user doesn't select it again nor checks uniqueness of unchanged fields"""
+    user.first_name = "Anna"
+    with django_assert_num_queries(1):
+        user.save()
+
+
+@pytest.mark.django_db
+def test_uniqueness_of_changed_fields_is_validated(user):
+    """Test that changed unique field is still validated"""
+    User.objects.create_user(username="other", password="password123")
+    user.username = "other"
+    with pytest.raises(ValidationError) as excinfo:
+        user.save()
+    assert "username" in excinfo.value.message_dict
+
+
+@pytest.mark.django_db
+def test_unchanged_field_unique_together_with_changed_one_is_validated(user, monkeypatch):
+    """Test that fields unique together are validated together, although only one of them has changed"""
+    monkeypatch.setattr(User._meta, "unique_together", (("first_name", "last_name"), ))
+    User.objects.create_user(username="other", password="password123", first_name="Anna", last_name="Nowak")
+    user.first_name, user.last_name = "Anna", "Lis"
+    user.save()
+
+    user.last_name = "Nowak"
+    with pytest.raises(ValidationError) as excinfo:
+        user.save()
+    assert "__all__" in excinfo.value.message_dict
+
+
+@pytest.mark.django_db
+def test_replaced_photo_is_deleted(user, storage):
+    """Test that old profile photo is deleted when new one is uploaded"""
+    user.profile_photo = SimpleUploadedFile("new.jpg", b"new photo")
+    user.save()
+
+    assert not storage.exists("abc/old.jpg")
+    assert storage.exists(user.profile_photo.name)
+
+
+@pytest.mark.django_db
+def test_deferred_and_not_loaded_values_are_read_on_demand(user, django_assert_num_queries):
+    """Test that value of deferred field is read from database when it's needed"""
+    deferred = User.objects.only("username").get(pk=user.pk)
+    with django_assert_num_queries(1):
+        assert deferred.get_loaded_value("profile_photo") == "abc/old.jpg"
+    assert not deferred.has_changed("profile_photo")
+
+    assert User(username="new").get_loaded_value("username") is None
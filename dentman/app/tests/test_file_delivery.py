@@ -0,0 +1,136 @@
+import pytest
+from asgiref.sync import async_to_sync
+from django.urls import reverse
+
+
+@pytest.fixture
+def storage_root(settings, tmp_path):
+    """Fixture to use temporary directory as storage with one profile photo"""
+    settings.STORAGE_ROOT = tmp_path
+    photo = tmp_path / "users-prof-photo" / "00" / "01" / "my photo.jpg"
+    photo.parent.mkdir(parents=True)
+    photo.write_bytes(b"jpeg bytes")
+    return tmp_path
+
+
+@pytest.mark.django_db
+def test_django_backend_streams_file(storage_root, client, settings):
+    """Test that by default file is sent by Django"""
+    settings.FILE_DELIVERY_BACKEND = "django"
+    response = client.get(reverse("get_user_profile_photo", args=["00/01/my photo.jpg"]))
+
+    assert response.status_code == 200
+    assert b"".join(response.streaming_content) == b"jpeg bytes"
+    assert "X-Accel-Redirect" not in response
+
+
+@pytest.mark.django_db
+def test_nginx_backend_returns_accel_redirect(storage_root, admin_client, settings):
+    """Test that with nginx backend only header pointing to internal location is returned"""
+    settings.FILE_DELIVERY_BACKEND = "nginx"
+    response = admin_client.get(reverse("get_file", args=["users-prof-photo/00/01/my photo.jpg"]))
+
+    assert response.status_code == 200
+    assert response.content == b""
+    assert response["X-Accel-Redirect"] == "/protected-storage/users-prof-photo/00/01/my%20photo.jpg"
+    assert response["Content-Type"] == "image/jpeg"
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("backend", ["django", "nginx"])
+def test_missing_and_outside_files_are_not_found(storage_root, client, settings, backend):
+    """Test that missing files and paths leading outside of storage return 404"""
+    settings.FILE_DELIVERY_BACKEND = backend
+    (storage_root / "secret.txt").write_text("secret")
+
+    assert client.get(reverse("get_user_profile_photo", args=["00/01/other.jpg"])).status_code == 404
+    assert client.get(reverse("get_user_profile_photo", args=["../secret.txt"])).status_code == 404
+
+
+def photo_url():
+    return reverse("get_user_profile_photo", args=["00/01/my photo.jpg"])
+
+
+@pytest.mark.django_db
+def test_conditional_requests_return_not_modified(storage_root, client):
+    """Test that ETag and Last-Modified validators let clients revalidate files without downloading them"""
+    response = client.get(photo_url())
+    etag, last_modified = response["ETag"], response["Last-Modified"]
+    assert response["Accept-Ranges"] == "bytes"
+
+    response = client.get(photo_url(), headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response["ETag"] == etag
+    assert client.get(photo_url(), headers={"If-Modified-Since": last_modified}).status_code == 304
+    assert client.get(photo_url(), headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("header, content, content_range", [
+    ("bytes=0-3", b"jpeg", "bytes 0-3/10"),
+    ("bytes=5-", b"bytes", "bytes 5-9/10"),
+    ("bytes=-3", b"tes", "bytes 7-9/10"),
+    ("bytes=8-100", b"es", "bytes 8-9/10"),
+])
+def test_range_requests_return_partial_content(storage_root, client, header, content, content_range):
+    """Test that single byte range is answered with 206 Partial Content"""
+    response = client.get(photo_url(), headers={"Range": header})
+
+    assert response.status_code == 206
+    assert b"".join(response.streaming_content) == content
+    assert response["Content-Range"] == content_range
+    assert response["Content-Length"] == str(len(content))
+
+
+@pytest.mark.django_db
+def test_unsatisfiable_and_unsupported_ranges(storage_root, client):
+    """Test 416 for range outside of file and whole file for invalid or many ranges or outdated If-Range"""
+    response = client.get(photo_url(), headers={"Range": "bytes=10-20"})
+    assert response.status_code == 416
+    assert response["Content-Range"] == "bytes */10"
+
+    response = client.get(photo_url(), headers={"Range": "bytes=5-3"})
+    assert response.status_code == 200
+    assert b"".join(response.streaming_content) == b"jpeg bytes"
+
+    assert client.get(photo_url(), headers={"Range": "bytes=0-1,4-5"}).status_code == 200
+    assert client.get(photo_url(), headers={"Range": "bytes=0-1", "If-Range": '"old"'}).status_code == 200
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("header", ["bytes=0-", "bytes=-5", "bytes=0-0"])
+def test_any_range_of_empty_file_is_not_satisfiable(storage_root, client, header):
+    """Test that no range of empty file can be satisfied"""
+    (storage_root / "users-prof-photo" / "00" / "01" / "my photo.jpg").write_bytes(b"")
+    response = client.get(photo_url(), headers={"Range": header})
+
+    assert response.status_code == 416
+    assert response["Content-Range"] == "bytes */0"
+
+
+async def consume(response) -> list[bytes]:
+    return [chunk async for chunk in response.streaming_content]
+
+
+@pytest.mark.django_db
+def test_asgi_request_streams_file_by_chunks(storage_root, async_client, settings):
+    """Test that under ASGI file is streamed by async iterator reading chunks of configured size"""
+    settings.FILE_STREAM_CHUNK_SIZE = 4
+    response = async_to_sync(async_client.get)(photo_url())
+
+    assert response.status_code == 200
+    assert response.is_async
+    assert response["Content-Length"] == "10"
+    assert response["Content-Disposition"] == 'inline; filename="my photo.jpg"'
+    assert async_to_sync(consume)(response) == [b"jpeg", b" byt", b"es"]
+
+
+@pytest.mark.django_db
+def test_asgi_range_request_streams_partial_content(storage_root, async_client):
+    """Test that under ASGI single byte range is streamed asynchronously as well"""
+    response = async_to_sync(async_client.get)(photo_url(), headers={"Range": "bytes=5-"})
+
+    assert response.status_code == 206
+    assert response.is_async
+    assert response["Content-Range"] == "bytes 5-9/10"
+    assert b"".join(async_to_sync(consume)(response)) == b"bytes"
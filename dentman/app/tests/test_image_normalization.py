@@ -0,0 +1,108 @@
+import io
+import pytest
+from PIL import Image
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+
+from dentman.images import normalize_image
+from dentman.storage import CustomFileSystemStorage
+
+User = get_user_model()
+
+ORIENTATION = 0x0112
+
+
+def jpeg_bytes(size=(3000, 1000), orientation=None) -> bytes:
+    exif = Image.Exif()
+    exif[0x010F] = "Phone maker"
+    if orientation:
+        exif[ORIENTATION] = orientation
+    output = io.BytesIO()
+    Image.new("RGB", size, "red").save(output, format="JPEG", exif=exif)
+    return output.getvalue()
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch, settings):
+    """Fixture to keep profile photos in temporary directory and normalize them to 1000 px WebP"""
+    settings.IMAGE_UPLOAD_MAX_SIZE = 1000
+    settings.IMAGE_UPLOAD_FORMAT = "webp"
+    storage = CustomFileSystemStorage(location=tmp_path)
+    monkeypatch.setattr(User._meta.get_field("profile_photo"), "storage", storage)
+    return storage
+
+
+def test_image_is_rotated_downscaled_and_stripped():
+    """Test that EXIF orientation is applied before downscaling and metadata isn't kept"""
+    content, extension = normalize_image(io.BytesIO(jpeg_bytes(orientation=6)), 1000, "webp", 80)
+
+    image = Image.open(io.BytesIO(content))
+    assert extension == ".webp"
+    assert (image.format, image.size) == ("WEBP", (333, 1000))
+    assert not image.getexif()
+
+
+def test_original_format_can_be_kept():
+    """Test that without target format image keeps its own format"""
+    content, extension = normalize_image(io.BytesIO(jpeg_bytes()), 1000, None, 80)
+    assert extension == ".jpg"
+    assert Image.open(io.BytesIO(content)).format == "JPEG"
+
+
+def test_not_images_and_normalized_images_are_skipped():
+    """Test that files which aren't images and images which wouldn't change are left as they are"""
+    assert normalize_image(io.BytesIO(b"not an image"), 1000, "webp", 80) is None
+
+    content, _ = normalize_image(io.BytesIO(jpeg_bytes()), 1000, "webp", 80)
+    assert normalize_image(io.BytesIO(content), 1000, "webp", 80) is None
+
+
+def test_decompression_bombs_are_skipped(monkeypatch):
+    """Test that image with more pixels than Pillow allows to decode is left as it is"""
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000)
+    assert normalize_image(io.BytesIO(jpeg_bytes()), 1000, "webp", 80) is None
+
+
+@pytest.mark.django_db
+def test_uploaded_profile_photo_is_normalized(storage, tmp_path):
+    """Test that only normalized version of uploaded photo is written to storage"""
+    user = User.objects.create_user(username="patient", password="password123",
+                                    profile_photo=SimpleUploadedFile("me.jpg", jpeg_bytes()))
+
+    assert user.profile_photo.name == "temp/me.webp"
+    assert not (tmp_path / "temp" / "me.jpg").exists()
+    with Image.open(tmp_path / "temp" / "me.webp") as image:
+        assert image.size == (1000, 333)
+
+
+@pytest.mark.django_db
+def test_uploaded_file_which_is_not_image_is_kept(storage, tmp_path):
+    """Test that file which Pillow can't decode is stored unchanged"""
+    user = User.objects.create_user(username="patient", password="password123",
+                                    profile_photo=SimpleUploadedFile("me.jpg", b"fake image"))
+
+    assert user.profile_photo.name == "temp/me.jpg"
+    assert (tmp_path / "temp" / "me.jpg").read_bytes() == b"fake image"
+
+
+@pytest.mark.django_db
+def test_command_normalizes_stored_images(storage, tmp_path):
+    """Test that management command re-encodes stored photos, updates rows and removes old files"""
+    photo = tmp_path / "abc" / "old.jpg"
+    photo.parent.mkdir()
+    photo.write_bytes(jpeg_bytes())
+    user = User.objects.create_user(username="patient", password="password123")
+    User.objects.filter(pk=user.pk).update(profile_photo="abc/old.jpg")
+
+    out = io.StringIO()
+    call_command("normalize_images", "--workers", "1", stdout=out)
+
+    user.refresh_from_db()
+    assert user.profile_photo.name == "abc/old.webp"
+    assert not photo.exists()
+    assert "1 of 1 images normalized" in out.getvalue()
+
+    out = io.StringIO()
+    call_command("normalize_images", "--workers", "1", stdout=out)
+    assert "0 of 1 images normalized" in out.getvalue()
@@ -0,0 +1,82 @@
+import io
+import os
+import pytest
+from PIL import Image
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from dentman.images import get_image_variant, variant_path
+from dentman.storage import CustomFileSystemStorage
+from dentman.utils import delete_old_file
+
+User = get_user_model()
+
+
+@pytest.fixture
+def photo(settings, tmp_path):
+    """Fixture to create 1000x500 JPEG profile photo in temporary storage"""
+    settings.STORAGE_ROOT = tmp_path
+    path = tmp_path / "users-prof-photo" / "abc" / "me.jpg"
+    path.parent.mkdir(parents=True)
+    Image.new("RGB", (1000, 500), "red").save(path, format="JPEG")
+    return path
+
+
+def read_image(response) -> Image.Image:
+    return Image.open(io.BytesIO(b"".join(response.streaming_content)))
+
+
+@pytest.mark.django_db
+def test_variant_is_served_through_storage_view(photo, client):
+    """Test that resized variant is generated, cached next to original and served by storage view"""
+    url = reverse("get_user_profile_photo", args=["abc/me.jpg"])
+    response = client.get(url, {"size": 64, "format": "webp"})
+
+    assert response.status_code == 200
+    assert response["Content-Type"] == "image/webp"
+    image = read_image(response)
+    assert (image.format, image.size) == ("WEBP", (64, 32))
+    assert os.path.exists(variant_path(str(photo), 64, "webp"))
+
+
+def test_variant_is_generated_once(photo):
+    """Test that cached variant is reused until the original changes"""
+    path = get_image_variant(str(photo), 128, "jpeg")
+    generated_at = os.stat(path).st_mtime_ns
+    assert get_image_variant(str(photo), 128, "jpeg") == path
+    assert os.stat(path).st_mtime_ns == generated_at
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("params", [{"size": 65}, {"size": "big"}, {"size": 64, "format": "tiff"}])
+def test_not_allowed_variants_are_not_found(photo, client, params):
+    """Test that only whitelisted sizes and formats can be requested"""
+    response = client.get(reverse("get_user_profile_photo", args=["abc/me.jpg"]), params)
+    assert response.status_code == 404
+
+
+def test_not_images_have_no_variants(photo):
+    """Test that files which aren't images aren't resized"""
+    fake = photo.with_name("fake.jpg")
+    fake.write_bytes(b"not an image")
+    assert get_image_variant(str(photo.with_name("scan.pdf")), 64, "jpeg") is None
+    assert get_image_variant(str(fake), 64, "jpeg") is None
+    assert not (photo.parent / ".variants").exists()
+
+
+def test_decompression_bombs_have_no_variants(photo, monkeypatch):
+    """Test that image with more pixels than Pillow allows to decode isn't resized"""
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000)
+    assert get_image_variant(str(photo), 64, "jpeg") is None
+
+
+@pytest.mark.django_db
+def test_variants_are_deleted_with_original(photo, monkeypatch):
+    """Test that replacing photo with `delete_old_file` removes its cached variants"""
+    storage = CustomFileSystemStorage(location=photo.parent.parent)
+    monkeypatch.setattr(User._meta.get_field("profile_photo"), "storage", storage)
+    user = User(username="patient", profile_photo="abc/me.jpg")
+    small, big = get_image_variant(str(photo), 64, "jpeg"), get_image_variant(str(photo), 400, "webp")
+
+    delete_old_file(user.profile_photo)
+    assert not any(os.path.exists(path) for path in (photo, small, big))
@@ -0,0 +1,130 @@
+import csv
+import hashlib
+import io
+import json
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.urls import reverse
+from PIL import Image
+
+from dentman.app.models import PatientImport
+from dentman.app.patient_import import import_patients
+from dentman.man.tests.utils import InMemoryStorage
+
+User = get_user_model()
+
+CSV = (
+    "username,first_name,last_name,email,phone_number\n"
+    "anna,Anna,Nowak,anna@example.com,+48 600-100-200\n"
+    "jan,Jan,Kowalski,,12\n" # invalid phone number
+    "anna,Anna,Duplicate,,\n" # duplicate username in file
+    ",No,Username,,\n"
+    "ewa,Ewa,Lis,ewa@example.com,600100200\n"
+)
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    storage = InMemoryStorage()
+    monkeypatch.setattr(User._meta.get_field("profile_photo"), "storage", storage)
+    return storage
+
+
+@pytest.mark.django_db
+def test_valid_rows_are_imported_and_invalid_ones_reported():
+    """Test that valid rows become patients with unusable passwords and rejected rows are reported by number"""
+    report = import_patients(io.BytesIO(CSV.encode()), "csv", "patients.csv", batch_size=2)
+
+    assert report.created == 2
+    assert [number for number, _ in report.errors] == [2, 3, 4]
+    assert report.errors[0][1] == {"phone_number": ["Invalid phone number format"]}
+    assert "username" in report.errors[1][1] and "username" in report.errors[2][1]
+
+    anna = User.objects.get(username="anna")
+    assert anna.is_patient and anna.phone_number == "+48 600-100-200" and anna.last_name == "Nowak"
+    assert anna.phone_digits == "48600100200"
+    assert not anna.has_usable_password()
+    checkpoint = PatientImport.objects.get()
+    assert (checkpoint.rows_done, checkpoint.created, checkpoint.failed) == (5, 2, 3)
+    assert checkpoint.finished_at is not None
+
+
+@pytest.mark.django_db
+def test_json_lines_file():
+    """Test that JSON Lines file is imported and lines which aren't JSON objects are rejected"""
+    lines = [json.dumps({"username": "anna", "email": "anna@example.com"}), "not json", "",
+             json.dumps({"username": "jan", "phone_number": "600100200"})]
+
+    report = import_patients(io.BytesIO("\n".join(lines).encode()), "jsonl", "patients.jsonl")
+
+    assert report.created == 2
+    assert [number for number, _ in report.errors] == [2]
+    assert set(User.objects.values_list("username", flat=True)) == {"anna", "jan"}
+
+
+@pytest.mark.django_db
+def test_import_is_resumed_after_last_committed_batch():
+    """Test that import of the same file skips rows of batches committed by previous run"""
+    content = CSV.encode()
+    PatientImport.objects.create(source_name="patients.csv", digest=hashlib.sha256(content).hexdigest(), rows_done=4,
+                                 created=1, failed=3)
+
+    report = import_patients(io.BytesIO(content), "csv", "patients.csv", batch_size=2)
+
+    assert report.resumed_from == 4 and report.created == 1 and not report.errors
+    assert list(User.objects.values_list("username", flat=True)) == ["ewa"]
+    assert PatientImport.objects.get().created == 2
+
+    report = import_patients(io.BytesIO(content), "csv", "patients.csv", restart=True)
+    assert report.created == 1 # "ewa" already exists now
+    assert PatientImport.objects.get().rows_done == 5
+
+
+@pytest.mark.django_db
+def test_queries_do_not_depend_on_number_of_rows(django_assert_max_num_queries):
+    """Test that batch of rows costs constant number of queries"""
+    rows = "username,phone_number\n" + "".join(f"patient{i},600100{i:03}\n" for i in range(300))
+    with django_assert_max_num_queries(20):
+        report = import_patients(io.BytesIO(rows.encode()), "csv", "patients.csv", batch_size=300)
+    assert report.created == 300
+
+
+@pytest.mark.django_db
+def test_command_imports_photos_and_writes_errors(tmp_path, storage):
+    """Test that command stores normalized photos in patients' directories and writes CSV report of rejected rows"""
+    (tmp_path / "photos").mkdir()
+    Image.new("RGB", (3000, 1500), "red").save(tmp_path / "photos" / "anna.jpg")
+    source = tmp_path / "patients.csv"
+    source.write_text("username,profile_photo\nanna,anna.jpg\njan,missing.jpg\newa,\nola,../patients.csv\n")
+    errors = tmp_path / "errors.csv"
+
+    call_command("import_patients", str(source), photos_dir=str(tmp_path / "photos"), errors=str(errors),
+                 stdout=io.StringIO())
+
+    anna = User.objects.get(username="anna")
+    assert anna.profile_photo.name == f"{anna.eid}/anna.webp"
+    with storage.open(anna.profile_photo.name) as photo, Image.open(photo) as image:
+        assert max(image.size) == 2048
+    assert not User.objects.get(username="ewa").profile_photo
+    with open(errors, newline="") as report:
+        assert list(csv.reader(report)) == [["row", "field", "message"],
+                                            ["2", "profile_photo", "Photo missing.jpg doesn't exist"],
+                                            ["4", "profile_photo", "Photo ../patients.csv doesn't exist"]]
+
+
+@pytest.mark.django_db
+def test_admin_upload(admin_client):
+    """Test that file uploaded in admin is imported and rejected rows are shown"""
+    url = reverse("admin:app_user_import")
+    assert admin_client.get(url).status_code == 200
+
+    response = admin_client.post(url, {"file": SimpleUploadedFile("patients.csv", CSV.encode())}, follow=True)
+
+    assert response.status_code == 200
+    texts = [str(message) for message in response.context["messages"]]
+    assert texts[0] == "2 patients imported, 3 rows rejected"
+    assert texts[1] == "Row 2: phone_number: Invalid phone number format"
+    assert User.objects.filter(is_patient=True, username__in=["anna", "ewa"]).count() == 2
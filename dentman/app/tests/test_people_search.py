@@ -0,0 +1,113 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from dentman.man.models import Worker
+from dentman.ops.models import Post
+from dentman.search import install_search_index, people_search
+
+User = get_user_model()
+
+
+def search(admin_client, url_name: str, term: str, **params) -> list:
+    response = admin_client.get(reverse(url_name), {"q": term, **params})
+    assert response.status_code == 200
+    return list(response.context["cl"].result_list)
+
+
+@pytest.fixture
+def users(db):
+    """Fixture to create two patients named Anna (the first one matches "anna" in more fields) and one other user"""
+    anna = User.objects.create_user(username="anna", password="password123", first_name="Anna", last_name="Nowak",
+                                    email="anna@clinic.pl", phone_number="+48 600-100-200")
+    other_anna = User.objects.create_user(username="patient2", password="password123", first_name="Anna",
+                                          last_name="Żak")
+    jan = User.objects.create_user(username="jan", password="password123", first_name="Jan", last_name="Kowalski")
+    return anna, other_anna, jan
+
+
+@pytest.mark.django_db
+def test_document_follows_changes_of_user(users):
+    """Test that search document is rebuilt on save (also with update_fields) and index follows it"""
+    anna, _, _ = users
+    assert anna.search_document == "anna anna nowak anna@clinic.pl +48 600-100-200 48600100200 48600100200"
+
+    anna.last_name = "Lis"
+    anna.save(update_fields=["last_name"])
+    assert User.objects.get(pk=anna.pk).search_document.startswith("anna anna lis")
+    condition, _ = people_search("nowak")
+    assert not User.objects.filter(condition).exists()
+    condition, _ = people_search("lis")
+    assert list(User.objects.filter(condition)) == [anna]
+
+    anna.delete()
+    assert not User.objects.filter(condition).exists()
+
+
+@pytest.mark.django_db
+def test_users_are_searched_by_words_prefixes_without_diacritics(users, admin_client):
+    """Test that users are found by beginnings of words of names, e-mail and phone number in any form"""
+    anna, other_anna, jan = users
+    assert search(admin_client, "admin:app_user_changelist", "zak") == [other_anna]
+    assert search(admin_client, "admin:app_user_changelist", "ANNA Nowa") == [anna]
+    assert search(admin_client, "admin:app_user_changelist", "clinic") == [anna]
+    assert search(admin_client, "admin:app_user_changelist", "600 100") == [anna]
+    assert search(admin_client, "admin:app_user_changelist", "+48600100") == [anna]
+    assert search(admin_client, "admin:app_user_changelist", "kowalska") == []
+
+
+@pytest.mark.django_db
+def test_results_are_ranked(users, admin_client):
+    """Test that user matching search in more fields comes first, although users are normally ordered by newest"""
+    anna, other_anna, _ = users
+    assert search(admin_client, "admin:app_user_changelist", "anna") == [anna, other_anna]
+
+
+@pytest.mark.django_db
+def test_order_chosen_in_changelist_overrides_rank(users, admin_client):
+    """Test that results are ordered by column chosen in changelist instead of rank"""
+    anna, other_anna, _ = users
+    assert search(admin_client, "admin:app_user_changelist", "anna", o="2") == [anna, other_anna] # by username
+    assert search(admin_client, "admin:app_user_changelist", "anna", o="-2") == [other_anna, anna]
+
+
+@pytest.mark.django_db
+def test_search_uses_index(users, admin_client):
+    """Test that changelist searches with full-text index instead of scanning names' columns"""
+    with CaptureQueriesContext(connection) as context:
+        search(admin_client, "admin:app_user_changelist", "anna")
+    searches = [query["sql"] for query in context.captured_queries if "MATCH" in query["sql"]]
+    assert searches and all("LIKE" not in sql for sql in searches)
+
+
+@pytest.mark.django_db
+def test_related_models_are_searched_through_users(users, admin_client):
+    """Test that workers are found by their users' documents and posts also by their own fields"""
+    anna, other_anna, jan = users
+    worker = Worker.objects.create(user=jan)
+    assert search(admin_client, "admin:man_worker_changelist", "kowal") == [worker]
+
+    post = Post.objects.create(title="Whitening", slug="whitening", text_html="...", main_photo="post.jpg",
+                               created_by=anna)
+    other_post = Post.objects.create(title="About Anna", slug="about", text_html="...", main_photo="post.jpg",
+                                     created_by=jan)
+    assert search(admin_client, "admin:ops_post_changelist", "anna") == [post, other_post]
+    assert search(admin_client, "admin:ops_post_changelist", "anna whitening") == [post]
+    assert search(admin_client, "admin:ops_post_changelist", "kowalski about") == [other_post]
+
+
+@pytest.mark.django_db
+def test_missing_sqlite_index_is_reinstalled(users):
+    """Test that dropped triggers are created again and index is rebuilt with changes made meanwhile"""
+    anna, _, _ = users
+    with connection.cursor() as cursor:
+        cursor.execute("DROP TRIGGER app_user_search_update")
+    anna.first_name = "Joanna"
+    anna.save()
+
+    install_search_index(connection)
+
+    condition, _ = people_search("joanna")
+    assert list(User.objects.filter(condition)) == [anna]
@@ -0,0 +1,83 @@
+import importlib
+
+import pytest
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from dentman.app.phones import find_users_by_phone
+from dentman.phones import normalize_phone_number
+
+User = get_user_model()
+
+
+@pytest.mark.parametrize("number, digits", [
+    ("+48 600-100-200", "48600100200"),
+    ("0048 600 100 200", "48600100200"),
+    ("600100200", "48600100200"),
+    ("(0) 600 100 200", "48600100200"),
+    ("48600100200", "48600100200"),
+    ("+1 (202) 555-0143", "12025550143"),
+    ("", None),
+    (None, None),
+    ("+1234567890123456", None),
+])
+def test_phone_numbers_are_normalized(settings, number, digits):
+    """Test that numbers in different formats are normalized to the same digits with default country code"""
+    settings.PHONE_DEFAULT_COUNTRY_CODE = "48"
+    assert normalize_phone_number(number) == digits
+
+
+@pytest.mark.django_db
+def test_normalized_number_is_maintained_on_save():
+    """Test that normalized number follows changes of phone number, also saved with update_fields"""
+    user = User.objects.create_user(username="patient", password="password123", phone_number="600 100 200")
+    assert user.phone_digits == "48600100200"
+
+    user.phone_number = "+48 600 100 300"
+    user.save(update_fields=["phone_number"])
+    assert User.objects.get(pk=user.pk).phone_digits == "48600100300"
+
+
+@pytest.mark.django_db
+def test_users_are_found_with_one_indexed_query(django_assert_num_queries):
+    """Test that number in any format finds users with one query using index of normalized numbers"""
+    patient = User.objects.create_user(username="patient", password="password123", phone_number="600-100-200")
+    worker = User.objects.create_user(username="worker", password="password123", phone_number="+48600100200",
+                                      is_patient=False, is_worker=True)
+    User.objects.create_user(username="other", password="password123", phone_number="600100201")
+    User.objects.create_user(username="inactive", password="password123", phone_number="600100200", is_active=False)
+
+    with django_assert_num_queries(1):
+        assert list(find_users_by_phone("0048 600 100 200")) == [patient, worker]
+    assert "app_user_phone_digits_idx" in find_users_by_phone("600100200").explain()
+    with django_assert_num_queries(0):
+        assert list(find_users_by_phone("unknown")) == []
+
+
+@pytest.mark.django_db
+def test_existing_numbers_are_backfilled():
+    """Test that migration fills normalized numbers of users saved before the column existed"""
+    user = User.objects.create_user(username="patient", password="password123", phone_number="600 100 200")
+    User.objects.update(phone_digits=None)
+
+    migration = importlib.import_module("dentman.app.migrations.0020_user_phone_digits")
+    migration.fill_phone_digits(apps, None)
+
+    assert User.objects.get(pk=user.pk).phone_digits == "48600100200"
+
+
+@pytest.mark.django_db
+def test_identify_caller_endpoint(client, admin_client):
+    """Test that staff allowed to view users gets callers' data and others get 403"""
+    patient = User.objects.create_user(username="patient", password="password123", phone_number="600100200",
+                                       first_name="Anna", last_name="Nowak")
+    url = reverse("identify_caller", args=["+48 600 100 200"])
+
+    response = admin_client.get(url)
+    assert response.status_code == 200
+    assert response.json()["users"] == [{"id": patient.pk, "eid": str(patient.eid), "name": "Anna Nowak",
+                                         "phone_number": "600100200", "is_patient": True, "is_worker": False}]
+
+    client.force_login(patient)
+    assert client.get(url).status_code == 403
@@ -0,0 +1,13 @@
+import pytest
+from django.contrib.contenttypes.models import ContentType
+
+from dentman.app.models import AttachmentEntity, User
+from dentman.man.tests.utils import assert_index_used
+
+
+@pytest.mark.django_db
+def test_object_attachments_query_uses_index():
+    """Test that attachments of object use (content_type, object_id) index"""
+    content_type = ContentType.objects.get_for_model(User)
+    queryset = AttachmentEntity.objects.filter(content_type=content_type, object_id=1)
+    assert_index_used(queryset, "app_attachent_ct_obj_idx")
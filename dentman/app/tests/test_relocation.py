@@ -0,0 +1,71 @@
+import errno
+import os
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from dentman.app.models import Attachment
+from dentman.man.tests.utils import InMemoryStorage
+from dentman.storage import CustomFileSystemStorage
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    storage = CustomFileSystemStorage(location=tmp_path)
+    monkeypatch.setattr(Attachment._meta.get_field("file"), "storage", storage)
+    return storage
+
+
+def create_attachment(django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        attachment = Attachment(file=SimpleUploadedFile("scan.pdf", b"scan"))
+        attachment.save()
+    return attachment
+
+
+@pytest.mark.django_db
+def test_file_is_renamed_after_commit(storage, tmp_path, django_capture_on_commit_callbacks):
+    """Test that new upload is renamed from temporary directory and its path is updated in database"""
+    with django_capture_on_commit_callbacks() as callbacks:
+        attachment = Attachment(file=SimpleUploadedFile("scan.pdf", b"scan"))
+        attachment.save()
+    assert attachment.file.name == "Attachment/temp/scan.pdf"
+
+    inode = os.stat(tmp_path / "Attachment/temp/scan.pdf").st_ino
+    callbacks[0]()
+
+    expected = f"Attachment/{attachment.pk // 100:02d}/{attachment.pk % 100:02d}/scan.pdf"
+    assert attachment.file.name == expected
+    assert Attachment.objects.get(pk=attachment.pk).file.name == expected
+    assert os.stat(tmp_path / expected).st_ino == inode
+    assert not (tmp_path / "Attachment/temp/scan.pdf").exists()
+
+
+@pytest.mark.django_db
+def test_file_is_copied_between_filesystems(storage, tmp_path, monkeypatch, django_capture_on_commit_callbacks):
+    """Test that file is copied by chunks when it can't be renamed across filesystems"""
+    def cross_device_replace(source, destination):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    monkeypatch.setattr("dentman.utils.os.replace", cross_device_replace)
+    attachment = create_attachment(django_capture_on_commit_callbacks)
+
+    assert storage.open(attachment.file.name).read() == b"scan"
+    assert not (tmp_path / "Attachment/temp/scan.pdf").exists()
+
+
+@pytest.mark.django_db
+def test_file_is_moved_through_storage_without_local_files(monkeypatch, django_capture_on_commit_callbacks):
+    """Test fallback for storages which don't keep files on local filesystem"""
+    memory = InMemoryStorage()
+    monkeypatch.setattr(Attachment._meta.get_field("file"), "storage", memory)
+    attachment = create_attachment(django_capture_on_commit_callbacks)
+
+    assert "temp" not in attachment.file.name
+    assert list(memory._files) == [attachment.file.name]
+
+
+@pytest.mark.django_db
+def test_file_is_not_moved_without_commit(storage, tmp_path):
+    """Test that nothing is moved until the transaction is committed"""
+    Attachment(file=SimpleUploadedFile("scan.pdf", b"scan")).save()
+    assert (tmp_path / "Attachment/temp/scan.pdf").exists()
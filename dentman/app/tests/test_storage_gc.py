@@ -0,0 +1,84 @@
+import os
+import time
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+
+from dentman.app.models import Attachment
+from dentman.man.models import Employment
+from dentman.ops.models import Post
+from dentman.storage import CustomFileSystemStorage
+from dentman.storage_gc import collect_garbage
+
+User = get_user_model()
+
+OLD = time.time() - 3 * 24 * 3600
+
+
+@pytest.fixture
+def storage_root(tmp_path, monkeypatch):
+    """Fixture to keep files of all file fields in temporary directory laid out like STORAGE_ROOT"""
+    for model, field_name, location in [(Attachment, "file", tmp_path), (Post, "main_photo", tmp_path),
+                                        (Employment, "contract_scan", tmp_path / "contr"),
+                                        (User, "profile_photo", tmp_path / "users-prof-photo")]:
+        monkeypatch.setattr(model._meta.get_field(field_name), "storage", CustomFileSystemStorage(location=location))
+    return tmp_path
+
+
+def make_file(path, old=True):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"12345")
+    if old:
+        os.utime(path, (OLD, OLD))
+    return path
+
+
+@pytest.fixture
+def files(storage_root):
+    """Fixture to create referenced files, orphans and files within grace period"""
+    Attachment.objects.bulk_create([Attachment(file="Attachment/00/01/used.pdf")])
+    User.objects.create_user(username="patient", password="password123")
+    User.objects.filter(username="patient").update(profile_photo="abc/me.jpg")
+    return {
+        "used": make_file(storage_root / "Attachment/00/01/used.pdf"),
+        "photo": make_file(storage_root / "users-prof-photo/abc/me.jpg"),
+        "variant": make_file(storage_root / "users-prof-photo/abc/.variants/me.jpg.64.webp"),
+        "recent": make_file(storage_root / "Attachment/temp/uploading.pdf", old=False),
+        "orphans": [
+            make_file(storage_root / "Attachment/temp/stuck.pdf"),
+            make_file(storage_root / "Post/00/02/lost.jpg"),
+            make_file(storage_root / "contr/temp/contract.pdf"),
+            make_file(storage_root / "users-prof-photo/abc/.variants/old.jpg.64.webp"),
+        ],
+    }
+
+
+@pytest.mark.django_db
+def test_report_lists_only_old_orphans(files):
+    """Test that only unreferenced files older than grace period are reported and nothing is deleted"""
+    found = []
+    report = collect_garbage(batch_size=2, on_orphan=lambda path, size: found.append(path))
+
+    assert sorted(found) == sorted(str(path) for path in files["orphans"])
+    assert (report.orphans, report.size, report.deleted) == (4, 20, 0)
+    assert all(path.exists() for path in files["orphans"])
+
+
+@pytest.mark.django_db(transaction=True)
+def test_parallel_scan_deletes_orphans(files):
+    """Test that parallel scan finds the same files and deletes them"""
+    report = collect_garbage(delete=True, workers=3)
+
+    assert (report.orphans, report.deleted) == (4, 4)
+    assert not any(path.exists() for path in files["orphans"])
+    assert all(files[key].exists() for key in ("used", "photo", "variant", "recent"))
+
+
+@pytest.mark.django_db
+def test_collect_storage_garbage_command(files, capsys):
+    """Test management command reporting orphans"""
+    call_command("collect_storage_garbage", "--verbosity", "2")
+    output = capsys.readouterr().out
+
+    assert "Attachment/temp/stuck.pdf" in output
+    assert "4 orphaned files (20\xa0bytes) found" in output
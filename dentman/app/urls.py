@@ -5,4 +5,7 @@ from . import views
 urlpatterns = [
     path("", views.index, name="index"),
     path(f"profile-photos/<path:file_path>", views.get_user_profile_photo, name="get_user_profile_photo"),
+    path("attachments/<str:app_label>/<str:model_name>/<int:object_id>.zip", views.download_attachments,
+         name="download_attachments"),
+    path("callers/<str:number>/", views.identify_caller, name="identify_caller"),
 ]
\ No newline at end of file
@@ -1,13 +1,60 @@
 from django.conf import settings
-from django.http import HttpResponse, HttpResponseBase
+from django.contrib.contenttypes.models import ContentType
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseBase, JsonResponse
 from django.contrib.auth.decorators import login_not_required
+from django.views.decorators.http import require_GET
 
-from dentman.utils import return_file_in_response
+from dentman.app.models import AttachmentEntity
+from dentman.app.phones import find_users_by_phone
+from dentman.archives import attachments_zip_response
+from dentman.utils import areturn_file_in_response
 
 
 def index(request):
     return HttpResponse("Hello, world. You're at the polls index.")
 
 @login_not_required
-def get_user_profile_photo(request, file_path: str) -> HttpResponseBase:
-    return return_file_in_response(settings.STORAGE_ROOT / "users-prof-photo",file_path)
\ No newline at end of file
+async def get_user_profile_photo(request, file_path: str) -> HttpResponseBase:
+    return await areturn_file_in_response(request, settings.STORAGE_ROOT / "users-prof-photo", file_path)
+
+
+@require_GET
+def download_attachments(request, app_label: str, model_name: str, object_id: int) -> HttpResponseBase:
+    """
+    Function to stream ZIP archive with all files attached (through `AttachmentEntity`) to the given object, e.g.
+    patient. Only users allowed to view attachments can download it, for others (and objects without attachments) 404
+    is returned
+    """
+    if not request.user.has_perm("app.view_attachment"):
+        return HttpResponse("Resource not found", status=404)
+    try:
+        content_type = ContentType.objects.get_by_natural_key(app_label, model_name)
+    except ContentType.DoesNotExist:
+        return HttpResponse("Resource not found", status=404)
+
+    entities = AttachmentEntity.objects.filter(content_type=content_type, object_id=object_id)
+    if not entities.exists():
+        return HttpResponse("Resource not found", status=404)
+    return attachments_zip_response(entities, f"{model_name}-{object_id}-attachments.zip",
+                                    asynchronous=isinstance(request, ASGIRequest))
+
+
+@require_GET
+def identify_caller(request, number: str) -> JsonResponse:
+    """
+    Function to identify caller by phone number in any format (e.g. passed by telephone exchange). Returns users with
+    this number, patients first; only users allowed to view users can identify callers.
+    """
+    if not request.user.has_perm("app.view_user"):
+        return JsonResponse({"error": "You aren't allowed to identify callers"}, status=403)
+    users = find_users_by_phone(number).only("eid", "username", "first_name", "last_name", "phone_number",
+                                             "is_patient", "is_worker")
+    return JsonResponse({"users": [{
+        "id": user.pk,
+        "eid": user.eid,
+        "name": user.get_full_name() or user.username,
+        "phone_number": user.phone_number,
+        "is_patient": user.is_patient,
+        "is_worker": user.is_worker,
+    } for user in users]})
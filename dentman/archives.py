@@ -0,0 +1,124 @@
+"""
+ZIP archives of attachments streamed on the fly.
+
+`zip_stream` is a generator which writes the archive with `zipfile` into a write-only buffer and yields what was
+written after every chunk of files' content, so neither a temporary file nor the whole archive is ever kept - memory use
+doesn't depend on the size of the export. Files which are already compressed (images, videos, archives) are STORED,
+other ones are DEFLATED. Archive is written as for unseekable output: sizes and checksums follow the data in data
+descriptors and are repeated in the central directory, and ZIP64 is used when sizes or offsets need it.
+
+Under ASGI (uvicorn) the response gets an async iterator which takes the generator's chunks one by one in the thread of
+sync code - Django would otherwise consume sync iterator with `sync_to_async(list)`, building the whole archive in
+memory before sending the first byte.
+"""
+import os
+import zipfile
+from typing import IO, AsyncIterator, Callable, Iterable, Iterator
+
+from asgiref.sync import sync_to_async
+from django.db.models import QuerySet
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.http import content_disposition_header
+
+CHUNK_SIZE = 64 * 1024
+
+STORED_EXTENSIONS = {
+    ".jpg", ".jpeg", ".png", ".webp", ".gif", ".avif", ".mp4", ".mov", ".webm", ".mp3", ".zip", ".gz", ".7z",
+}
+
+
+class _ChunkWriter:
+    """Write-only file object collecting bytes written by `zipfile` until the generator takes them"""
+    def __init__(self):
+        self._chunks = []
+        self.size = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        self.size = 0
+        return data
+
+
+def compress_type(name: str) -> int:
+    """STORED for already compressed media, DEFLATED for everything else"""
+    return zipfile.ZIP_STORED if os.path.splitext(name)[1].lower() in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+
+def zip_stream(entries: Iterable[tuple[str, int, Callable[[], IO[bytes]]]], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Generator of ZIP archive with files given as (name in archive, size, function opening file). Files are opened
+    one by one, only when they're written.
+    """
+    writer = _ChunkWriter()
+    date_time = timezone.localtime().timetuple()[:6]
+    with zipfile.ZipFile(writer, "w") as archive:
+        for name, size, open_file in entries:
+            info = zipfile.ZipInfo(name, date_time=date_time)
+            info.compress_type = compress_type(name)
+            info.file_size = size
+            with open_file() as file, archive.open(info, "w") as member:
+                while chunk := file.read(chunk_size):
+                    member.write(chunk)
+                    if writer.size >= chunk_size:
+                        yield writer.take()
+            yield writer.take()
+    yield writer.take() # central directory
+
+
+async def _aiterate(stream: Iterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    Async iterator over chunks of `zip_stream`. Every step runs in the thread of sync code (not in the reader pool of
+    file responses), because the generator reads attachments' rows with the request's database connection.
+    """
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    while (chunk := await next_chunk(stream, None)) is not None:
+        if chunk:
+            yield chunk
+
+
+def _unique_name(name: str, used: set) -> str:
+    base, extension = os.path.splitext(name)
+    counter = 1
+    while name in used:
+        counter += 1
+        name = f"{base} ({counter}){extension}"
+    used.add(name)
+    return name
+
+
+def attachment_entries(entities: QuerySet, folders: bool = False) -> Iterator[tuple[str, int, Callable]]:
+    """
+    Entries of `zip_stream` for files of attachments of the given `AttachmentEntity` rows (read with iterator, so rows
+    aren't kept in memory). With `folders` every object's files are put into its own directory. Repeated names get
+    a number.
+    """
+    used = set()
+    entities = entities.select_related("attachment", "content_type").order_by("content_type", "object_id", "pk")
+    for entity in entities.iterator(chunk_size=500):
+        file = entity.attachment.file
+        name = os.path.basename(file.name)
+        if folders:
+            name = f"{entity.content_type.model}-{entity.object_id}/{name}"
+        yield _unique_name(name, used), file.size, lambda file=file: file.open("rb")
+
+
+def attachments_zip_response(entities: QuerySet, filename: str, folders: bool = False,
+                             asynchronous: bool = False) -> StreamingHttpResponse:
+    """
+    Response streaming ZIP archive with files of attachments of the given `AttachmentEntity` rows. With `asynchronous`
+    (request served by ASGI) archive is streamed by async iterator.
+    """
+    stream = zip_stream(attachment_entries(entities, folders))
+    response = StreamingHttpResponse(_aiterate(stream) if asynchronous else stream, content_type="application/zip")
+    response["Content-Disposition"] = content_disposition_header(True, filename)
+    return response
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dentman.settings.dev')
 
 application = get_asgi_application()
+
+# scheduler runs only in serving processes, not in management commands (imported after apps are loaded)
+from dentman.ops.validity import start_configured_validity_scheduler
+
+start_configured_validity_scheduler()
@@ -0,0 +1,158 @@
+"""
+Validated bulk creation of records - fast path for imports instead of saving rows one by one.
+
+`FullCleanMixin` validates every saved record with `full_clean()`, which queries the database once per unique field and
+foreign key of every row, while `bulk_create` doesn't validate at all. `validated_bulk_create` validates a batch with the
+same rules, but with queries per batch instead of per row:
+1) fields' validators run in memory (`clean_fields`) and model's `clean()` runs for every object
+2) foreign keys are checked with one `IN` query per foreign key field (and for empty values in memory)
+3) unique fields and unique constraints of otherwise valid objects are checked within the batch and with one query
+per field (constraint); so are computed fields which models declare unique without constraint in
+`UNIQUE_COMPUTED_FIELDS` (model checks them in `validate_unique`, which isn't run per row here)
+Valid objects are inserted with `bulk_create` and invalid ones are returned with their errors, keyed by position in
+the input. Fields which models compute in `save()` are set by `set_computed_fields()` (if model has it), but otherwise
+`save()` and signals aren't run, so models with side effects in `save()` (e.g. `ResourcesUpdate`) can't be created
+this way.
+"""
+from collections import defaultdict
+from dataclasses import dataclass, field
+from itertools import batched
+from typing import Callable, Iterable
+
+from django.core.exceptions import NON_FIELD_ERRORS, ValidationError
+from django.db import models, transaction
+from django.db.models import Q
+
+
+@dataclass
+class BulkCreateResult:
+    """Result of `validated_bulk_create`: number of created objects and errors (message dicts) by position"""
+    created: int = 0
+    errors: dict[int, dict[str, list[str]]] = field(default_factory=dict)
+
+
+def _foreign_keys(model) -> list[models.ForeignKey]:
+    return [f for f in model._meta.concrete_fields if f.many_to_one]
+
+
+def _unique_checks(model) -> list[tuple[tuple[str, ...], str]]:
+    """
+    Sets of fields which have to be unique together (single unique fields, total unique constraints and model's
+    `UNIQUE_COMPUTED_FIELDS`) with the key their errors are reported at
+    """
+    checks = [(f.name,) for f in model._meta.concrete_fields if f.unique and not f.primary_key]
+    checks += [tuple(fields) for fields in model._meta.unique_together]
+    checks += [tuple(constraint.fields) for constraint in model._meta.total_unique_constraints]
+    checks = [(fields, fields[0] if len(fields) == 1 else NON_FIELD_ERRORS) for fields in checks]
+    checks += [((name, ), error_field) for name, error_field in getattr(model, "UNIQUE_COMPUTED_FIELDS", {}).items()]
+    return checks
+
+
+def _check_foreign_keys(model, objects: dict[int, models.Model], errors: dict) -> None:
+    for fk in _foreign_keys(model):
+        if not (fk.null and fk.blank):
+            for position, obj in objects.items():
+                if getattr(obj, fk.attname) is None:
+                    code = "null" if not fk.null else "blank"
+                    errors[position].append(ValidationError({fk.name: ValidationError(fk.error_messages[code],
+                                                                                      code=code)}))
+
+        values = {getattr(obj, fk.attname) for obj in objects.values()} - {None}
+        if not values:
+            continue
+        target_field = fk.target_field.attname
+        existing = set(
+            fk.remote_field.model._base_manager.filter(**{f"{target_field}__in": values})
+            .complex_filter(fk.get_limit_choices_to()).values_list(target_field, flat=True)
+        )
+        for position, obj in objects.items():
+            value = getattr(obj, fk.attname)
+            if value is not None and value not in existing:
+                errors[position].append(ValidationError({fk.name: ValidationError(
+                    fk.error_messages["invalid"], code="invalid",
+                    params={"model": fk.remote_field.model._meta.verbose_name, "pk": value, "field": target_field,
+                            "value": value},
+                )}))
+
+
+def _check_unique(model, objects: dict[int, models.Model], errors: dict) -> None:
+    for fields, error_key in _unique_checks(model):
+        attnames = [model._meta.get_field(name).attname for name in fields]
+        keys = {}
+        for position, obj in objects.items():
+            key = tuple(getattr(obj, attname) for attname in attnames)
+            if None in key or position in errors:
+                continue # NULLs are never equal; invalid objects won't be inserted anyway
+            if key in keys:
+                errors[position].append(ValidationError({error_key: obj.unique_error_message(model, fields)}))
+            else:
+                keys[key] = position
+        if not keys:
+            continue
+
+        if len(attnames) == 1:
+            condition = Q(**{f"{attnames[0]}__in": [key[0] for key in keys]})
+        else:
+            condition = Q()
+            for key in keys:
+                condition |= Q(**dict(zip(attnames, key)))
+        for key in model._default_manager.filter(condition).values_list(*attnames):
+            position = keys.get(tuple(key))
+            if position is not None:
+                errors[position].append(ValidationError({
+                    error_key: objects[position].unique_error_message(model, fields)
+                }))
+
+
+def validate_batch(model, objects: dict[int, models.Model]) -> dict[int, dict[str, list[str]]]:
+    """
+    Function to validate objects (by their positions) like `full_clean` does, but with one query per foreign key and
+    unique field for the whole batch. Returns message dicts of invalid objects.
+    """
+    errors = defaultdict(list)
+    fk_names = [fk.name for fk in _foreign_keys(model)]
+    for position, obj in objects.items():
+        if hasattr(obj, "set_computed_fields"):
+            obj.set_computed_fields()
+        try:
+            # foreign keys are checked for the whole batch below
+            obj.clean_fields(exclude=fk_names)
+            obj.clean()
+        except ValidationError as error:
+            errors[position].append(error)
+
+    _check_foreign_keys(model, objects, errors)
+    _check_unique(model, objects, errors)
+
+    result = {}
+    for position, position_errors in sorted(errors.items()):
+        merged = {}
+        for error in position_errors:
+            merged = error.update_error_dict(merged)
+        result[position] = ValidationError(merged).message_dict
+    return result
+
+
+def validated_bulk_create(model, objects: Iterable[models.Model], batch_size: int = 1000,
+                          on_batch: Callable[[list, dict], None] = None) -> BulkCreateResult:
+    """
+    Function to validate and insert objects of the model in batches of `batch_size` (objects can be a generator, only
+    one batch is kept in memory). Every batch is inserted in its own transaction; `on_batch` gets created objects and
+    errors of every batch inside it, so what it writes (e.g. progress of import) is committed together with the batch.
+    Returns number of created objects and errors of rejected ones by their
+    position in `objects`
+    """
+    result = BulkCreateResult()
+    start = 0
+    for batch in batched(objects, batch_size):
+        positions = dict(enumerate(batch, start))
+        start += len(batch)
+        errors = validate_batch(model, positions)
+        valid = [obj for position, obj in positions.items() if position not in errors]
+        with transaction.atomic():
+            created = model._default_manager.bulk_create(valid)
+            if on_batch:
+                on_batch(created, errors)
+        result.created += len(created)
+        result.errors.update(errors)
+    return result
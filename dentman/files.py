@@ -0,0 +1,170 @@
+"""
+Shared layer building responses for files from storage (used by `dentman.utils.return_file_in_response`).
+
+Every response carries `ETag` and `Last-Modified` built from file's stat, so conditional requests (If-None-Match,
+If-Modified-Since) are answered with 304 without opening the file. Single byte ranges (`Range: bytes=...`) are answered
+with 206 Partial Content, which lets browsers seek in videos without downloading them again; requests for many ranges
+get the whole file, which is allowed by RFC 9110. With nginx backend ranges are handled by nginx itself.
+
+Under ASGI (uvicorn) responses are streamed by an async iterator: every chunk of `settings.FILE_STREAM_CHUNK_SIZE` bytes
+is read in a small shared thread pool (`settings.FILE_STREAM_THREADS` threads) and sent from the event loop, so a slow
+client holds a thread only while its next chunk is being read, not for the whole download.
+"""
+import asyncio
+import mimetypes
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpRequest, HttpResponse, StreamingHttpResponse
+from django.http.response import HttpResponseBase
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+_reader_pool = None
+
+
+def reader_pool() -> ThreadPoolExecutor:
+    """Thread pool shared by all async file responses (created at first use)"""
+    global _reader_pool
+    if _reader_pool is None:
+        _reader_pool = ThreadPoolExecutor(max_workers=settings.FILE_STREAM_THREADS, thread_name_prefix="file-reader")
+    return _reader_pool
+
+
+async def run_in_reader_pool(func, *args, **kwargs):
+    """Run blocking function (stat, open, read) in reader pool without blocking the event loop"""
+    return await asyncio.get_running_loop().run_in_executor(reader_pool(), partial(func, *args, **kwargs))
+
+
+def file_etag(stat: os.stat_result) -> str:
+    """Strong ETag of file version built from its modification time and size"""
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """
+    Parse `Range` header with single byte range into (first, last) inclusive byte positions. Returns None for headers
+    which aren't valid single byte range (whole file is sent then) and raises ValueError if range can't be satisfied -
+    also any range of empty file
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first and last and int(last) < int(first):
+        return None # invalid range is ignored (RFC 9110)
+    if size == 0:
+        raise ValueError("Empty file has no satisfiable range")
+    if first == "":
+        # suffix range - last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(size - length, 0), size - 1
+    first, last = int(first), int(last) if last else size - 1
+    if first >= size:
+        raise ValueError("Range not satisfiable")
+    return first, min(last, size - 1)
+
+
+def _if_range_matches(request: HttpRequest, etag: str, last_modified: int) -> bool:
+    if_range = request.headers.get("If-Range")
+    if if_range is None:
+        return True
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def _read_range(path: str, first: int, length: int):
+    chunk_size = settings.FILE_STREAM_CHUNK_SIZE
+    with open(path, "rb") as file:
+        file.seek(first)
+        while length > 0:
+            chunk = file.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+async def _aread_range(path: str, first: int, length: int):
+    chunk_size = settings.FILE_STREAM_CHUNK_SIZE
+    file = await run_in_reader_pool(open, path, "rb")
+    try:
+        await run_in_reader_pool(file.seek, first)
+        while length > 0:
+            chunk = await run_in_reader_pool(file.read, min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        await run_in_reader_pool(file.close)
+
+
+def accel_redirect_response(file_full_path: str) -> HttpResponse:
+    """
+    Function to return empty response telling nginx to send file from storage by itself. File has to be inside
+    `settings.STORAGE_ROOT` which is served by nginx as internal location `settings.FILE_DELIVERY_INTERNAL_URL`
+    """
+    relative_path = Path(file_full_path).relative_to(settings.STORAGE_ROOT).as_posix()
+    content_type, _ = mimetypes.guess_type(file_full_path)
+    response = HttpResponse(content_type=content_type or "application/octet-stream")
+    response["X-Accel-Redirect"] = settings.FILE_DELIVERY_INTERNAL_URL + quote(relative_path)
+    return response
+
+
+def file_response(request: HttpRequest, file_full_path: str, asynchronous: bool = False) -> HttpResponseBase:
+    """
+    Function to return existing file with validators, answering conditional requests with 304 and single range
+    requests with 206 (416 if range is outside of file). With `asynchronous` content is streamed by async iterator
+    reading chunks in reader pool (for ASGI), otherwise by regular iterator
+    """
+    stat = os.stat(file_full_path)
+    etag, last_modified = file_etag(stat), int(stat.st_mtime)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = _content_response(request, file_full_path, stat.st_size, etag, last_modified, asynchronous)
+    response.headers.setdefault("ETag", etag)
+    response.headers.setdefault("Last-Modified", http_date(last_modified))
+    return response
+
+
+def _content_response(request, file_full_path, size, etag, last_modified, asynchronous) -> HttpResponseBase:
+    if settings.FILE_DELIVERY_BACKEND == "nginx":
+        return accel_redirect_response(file_full_path)
+
+    byte_range = None
+    if "Range" in request.headers and _if_range_matches(request, etag, last_modified):
+        try:
+            byte_range = parse_range(request.headers["Range"], size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+
+    if byte_range is None and not asynchronous:
+        response = FileResponse(open(file_full_path, "rb"))
+    else:
+        first, last = byte_range or (0, size - 1)
+        content_type, _ = mimetypes.guess_type(file_full_path)
+        read_range = _aread_range if asynchronous else _read_range
+        response = StreamingHttpResponse(read_range(file_full_path, first, last - first + 1),
+                                         status=200 if byte_range is None else 206,
+                                         content_type=content_type or "application/octet-stream")
+        response["Content-Length"] = str(last - first + 1)
+        if byte_range is None:
+            response["Content-Disposition"] = content_disposition_header(False, os.path.basename(file_full_path))
+        else:
+            response["Content-Range"] = f"bytes {first}-{last}/{size}"
+    response["Accept-Ranges"] = "bytes"
+    return response
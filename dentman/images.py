@@ -0,0 +1,185 @@
+"""
+Images in storage (profile photos, posts' main photos): normalization of uploads and resized variants.
+
+Uploaded images are normalized before they're stored (`normalize_image`): EXIF orientation is applied, metadata (EXIF,
+XMP) is dropped, image is downscaled to fit `settings.IMAGE_UPLOAD_MAX_SIZE` and re-encoded to
+`settings.IMAGE_UPLOAD_FORMAT` (or to its own format if it's None). Files which Pillow can't decode are stored as they
+are. Already stored images are normalized by `normalize_stored_images` (`normalize_images` management command).
+
+Variant is generated with Pillow on the first request and cached on disk next to the original, in `.variants`
+directory: `<dir>/.variants/<filename>.<size>.<format>`. Sizes and formats are whitelisted in settings, so clients can't
+fill the disk with arbitrary variants. Variants are regenerated when the original is newer and removed by
+`dentman.utils.delete_old_file` together with the original.
+"""
+import glob
+import io
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable
+
+from django.apps import apps
+from django.conf import settings
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+VARIANTS_DIR = ".variants"
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp", ".avif"}
+
+FORMAT_EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp", "AVIF": ".avif", "GIF": ".gif", "BMP": ".bmp"}
+
+# image fields whose uploads are normalized
+IMAGE_FIELDS = [
+    ("app.User", "profile_photo"),
+    ("ops.Post", "main_photo"),
+]
+
+
+def variant_path(original_path: str, size: int, image_format: str) -> str:
+    """Path of variant of the original image with the given size and format"""
+    directory, filename = os.path.split(original_path)
+    return os.path.join(directory, VARIANTS_DIR, f"{filename}.{size}.{image_format}")
+
+
+def get_image_variant(original_path: str, size: int, image_format: str) -> str | None:
+    """
+    Function to return path of variant of the original image which fits in `size` x `size` square, generating it if
+    it doesn't exist yet or is older than the original. Returns None if size or format isn't allowed or the original
+    isn't an image.
+    """
+    if size not in settings.IMAGE_VARIANT_SIZES or image_format not in settings.IMAGE_VARIANT_FORMATS:
+        return None
+    if os.path.splitext(original_path)[1].lower() not in IMAGE_EXTENSIONS:
+        return None
+
+    path = variant_path(original_path, size, image_format)
+    try:
+        if os.stat(path).st_mtime >= os.stat(original_path).st_mtime:
+            return path
+    except FileNotFoundError:
+        pass
+
+    try:
+        with Image.open(original_path) as image:
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((size, size))
+            if image_format == "jpeg" and image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # variant is written to temporary file and renamed, so concurrent requests never see half-written file
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            try:
+                with os.fdopen(fd, "wb") as temp_file:
+                    image.save(temp_file, format=image_format.upper())
+                os.replace(temp_path, path)
+            except BaseException:
+                os.remove(temp_path)
+                raise
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        return None
+    return path
+
+
+def delete_image_variants(original_path: str) -> None:
+    """Function to delete all cached variants of the original image"""
+    directory, filename = os.path.split(original_path)
+    for path in glob.glob(os.path.join(glob.escape(directory), VARIANTS_DIR, f"{glob.escape(filename)}.*")):
+        os.remove(path)
+
+
+def normalize_image(source, max_size: int, image_format: str | None, quality: int) -> tuple[bytes, str] | None:
+    """
+    Function to decode image from path or file object, apply EXIF orientation, drop metadata, downscale it to fit in
+    `max_size` x `max_size` square and encode it to `image_format` (its own format if None). Returns encoded bytes with
+    file extension, or None if source isn't a (still) image or is already normalized.
+    """
+    try:
+        with Image.open(source) as image:
+            if getattr(image, "n_frames", 1) > 1:
+                return None # animations would lose frames
+            target_format = (image_format or image.format).upper()
+            if (image.format == target_format and max(image.size) <= max_size and not image.getexif()
+                    and "xmp" not in image.info):
+                return None
+            icc_profile = image.info.get("icc_profile")
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((max_size, max_size))
+            if image.mode not in ("RGB", "RGBA", "L"):
+                image = image.convert("RGBA" if image.has_transparency_data else "RGB")
+            if target_format == "JPEG" and image.mode == "RGBA":
+                image = image.convert("RGB")
+            output = io.BytesIO()
+            image.save(output, format=target_format, quality=quality, icc_profile=icc_profile)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, ValueError):
+        return None
+    return output.getvalue(), FORMAT_EXTENSIONS.get(target_format, f".{target_format.lower()}")
+
+
+def normalize_image_file(path: str, max_size: int, image_format: str | None, quality: int) -> tuple[str, int] | None:
+    """
+    Function to normalize image file in place of the file with normalized extension (run in worker processes by
+    `normalize_stored_images`). Returns path of the new file and number of saved bytes, or None if nothing changed.
+    """
+    original_size = os.path.getsize(path)
+    result = normalize_image(path, max_size, image_format, quality)
+    if result is None:
+        return None
+    content, extension = result
+    new_path = os.path.splitext(path)[0] + extension
+    if new_path != path and os.path.exists(new_path):
+        return None # don't overwrite other file with the same name
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as temp_file:
+            temp_file.write(content)
+        os.replace(temp_path, new_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return new_path, original_size - len(content)
+
+
+@dataclass
+class NormalizationReport:
+    """Summary of normalizing stored images"""
+    images: int = 0
+    normalized: int = 0
+    saved: int = 0
+
+
+def normalize_stored_images(workers: int = None, on_image: Callable[[str, str], None] = None) -> NormalizationReport:
+    """
+    Function to normalize images already kept in local storages of `IMAGE_FIELDS` with process pool of `workers`
+    processes (decoding and encoding is CPU bound). Renamed files are written to rows with queryset `update()` (only if
+    the row still points to the old file) and old files are removed with their variants.
+    """
+    report = NormalizationReport()
+    options = (settings.IMAGE_UPLOAD_MAX_SIZE, settings.IMAGE_UPLOAD_FORMAT, settings.IMAGE_UPLOAD_QUALITY)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for model_label, field_name in IMAGE_FIELDS:
+            model = apps.get_model(model_label)
+            storage = model._meta.get_field(field_name).storage
+            rows = model.objects.exclude(**{field_name: ""}).exclude(**{f"{field_name}__isnull": True})
+            names = dict(rows.values_list("pk", field_name))
+            paths = {pk: storage.path(name) for pk, name in names.items()}
+            report.images += len(paths)
+
+            results = pool.map(normalize_image_file, paths.values(), *[[option] * len(paths) for option in options])
+            for (pk, path), result in zip(paths.items(), results):
+                if result is None:
+                    continue
+                new_path, saved = result
+                delete_image_variants(path)
+                if new_path != path:
+                    new_name = os.path.relpath(new_path, storage.location).replace(os.sep, "/")
+                    if model.objects.filter(pk=pk, **{field_name: names[pk]}).update(**{field_name: new_name}):
+                        os.remove(path)
+                    else:
+                        os.remove(new_path) # row changed meanwhile
+                        continue
+                report.normalized += 1
+                report.saved += saved
+                if on_image:
+                    on_image(path, new_path)
+    return report
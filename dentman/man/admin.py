@@ -4,10 +4,12 @@ from django.utils.html import format_html
 from dentman.man.models import (Worker, DentistStaff, ManagementStaff, WorkersAvailability, SpecialAvailability,
                                 Inaccessibility, Employment, Bonus, Resource, ResourcesUpdate)
 from dentman.man.forms import EmploymentAdminForm
+from dentman.man.signing import signed_contract_url
+from dentman.search import PeopleSearchMixin
 
 
 @admin.register(Worker)
-class WorkerAdmin(admin.ModelAdmin):
+class WorkerAdmin(PeopleSearchMixin, admin.ModelAdmin):
     def worker_name(self, obj: Worker) -> str:
         return f"Worker {obj.user.get_full_name()}"
     worker_name.short_description = "Worker name"
@@ -24,7 +26,7 @@ class WorkerAdmin(admin.ModelAdmin):
     ]
 
 @admin.register(DentistStaff)
-class DentistStaffAdmin(admin.ModelAdmin):
+class DentistStaffAdmin(PeopleSearchMixin, admin.ModelAdmin):
     def dentist_name(self, obj: DentistStaff) -> str:
         role = "Dentist"
         if not obj.is_dentist:
@@ -51,7 +53,7 @@ class DentistStaffAdmin(admin.ModelAdmin):
     ]
 
 @admin.register(ManagementStaff)
-class ManagementStaffAdmin(admin.ModelAdmin):
+class ManagementStaffAdmin(PeopleSearchMixin, admin.ModelAdmin):
     def management_name(self, obj: ManagementStaff) -> str:
         return obj.worker.user.get_full_name()
     management_name.short_description = "Name"
@@ -76,7 +78,7 @@ class ManagementStaffAdmin(admin.ModelAdmin):
     ]
 
 @admin.register(WorkersAvailability)
-class WorkersAvailabilityAdmin(admin.ModelAdmin):
+class WorkersAvailabilityAdmin(PeopleSearchMixin, admin.ModelAdmin):
     list_per_page = 50
     list_display = ("worker", "weekday", "since", "until", )
     list_filter = ("weekday", )
@@ -91,7 +93,7 @@ class WorkersAvailabilityAdmin(admin.ModelAdmin):
     ]
 
 @admin.register(SpecialAvailability)
-class SpecialAvailabilityAdmin(admin.ModelAdmin):
+class SpecialAvailabilityAdmin(PeopleSearchMixin, admin.ModelAdmin):
     list_display = ("worker", "date", "since", "until", )
     search_fields = ("worker__user__first_name", "worker__user__last_name", )
     fieldsets = [
@@ -104,7 +106,7 @@ class SpecialAvailabilityAdmin(admin.ModelAdmin):
     ]
 
 @admin.register(Inaccessibility)
-class InaccessibilityAdmin(admin.ModelAdmin):
+class InaccessibilityAdmin(PeopleSearchMixin, admin.ModelAdmin):
     list_display = ("worker", "date", "is_whole_day", "since", "until", )
     list_filter = ("is_whole_day", )
     search_fields = ("worker__user__first_name", "worker__user__last_name",)
@@ -118,17 +120,30 @@ class InaccessibilityAdmin(admin.ModelAdmin):
     ]
 
 @admin.register(Employment)
-class EmploymentAdmin(admin.ModelAdmin):
+class EmploymentAdmin(PeopleSearchMixin, admin.ModelAdmin):
     def employee_contract(self, obj: Employment) -> str:
         return f"{obj.new_employee.user.get_full_name()}'s contract"
     employee_contract.short_description = "Employee's contract"
 
     def actual_contract(self, obj: Employment) -> str:
         if obj and obj.pk:
-            return format_html(f'<a href="{obj.contract_scan.url}" target="_blank">Click here</a>')
+            # link is signed only for user viewing the page (set in `get_object`) who may see the scan anyway, so
+            # opening it needs no queries; others get plain link checked by the view
+            viewer = getattr(obj, "_viewed_by", None)
+            if viewer is not None and obj.can_view_contract(viewer):
+                url = signed_contract_url(obj.contract_scan.name, viewer.pk)
+            else:
+                url = obj.contract_scan.url
+            return format_html('<a href="{}" target="_blank">Click here</a>', url)
         return "-"
     actual_contract.short_description = "Actual contract"
 
+    def get_object(self, request, object_id, from_field=None):
+        obj = super().get_object(request, object_id, from_field)
+        if obj is not None:
+            obj._viewed_by = request.user
+        return obj
+
     form = EmploymentAdminForm
     list_display = ("employee_contract", "new_employee", "representative", "type_of_employment", "salary", "is_active", )
     list_filter = ("type_of_employment", "is_active", "is_for_limited_time", )
@@ -148,7 +163,7 @@ class EmploymentAdmin(admin.ModelAdmin):
     ]
 
 @admin.register(Bonus)
-class BonusAdmin(admin.ModelAdmin):
+class BonusAdmin(PeopleSearchMixin, admin.ModelAdmin):
     def bonus_name(self, obj: Bonus) -> str:
         return f"{obj.worker.user.get_full_name()}'s bonus at {obj.bonus_date}"
     bonus_name.short_description = "Overview"
@@ -0,0 +1,164 @@
+"""
+Materialized per-day free time of workers (`DailyAvailability`).
+
+Rows are kept for days between today and `settings.AVAILABILITY_HORIZON_DAYS` ahead. Signals in `dentman.man.signals`
+recompute only worker-days affected by the change of availability, inaccessibility or visit, and
+`rebuild_daily_availability` management command recomputes everything in bulk. Thanks to that reading free time is
+one indexed range query on (worker, date).
+"""
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import Iterable
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from dentman.man.models import Worker, DailyAvailability
+from dentman.man.scheduling import Interval, merge_intervals, get_free_intervals_for_workers
+
+MINUTES_PER_DAY = 24 * 60
+
+WorkerDays = dict[int, set[date]]
+
+
+def materialized_window() -> tuple[date, date]:
+    """First and last day for which daily availability is kept"""
+    today = timezone.localdate()
+    return today, today + timedelta(days=settings.AVAILABILITY_HORIZON_DAYS - 1)
+
+
+def _days_between(date_from: date, date_to: date) -> list[date]:
+    return [date_from + timedelta(days=i) for i in range((date_to - date_from).days + 1)]
+
+
+def merge_worker_days(*worker_days: WorkerDays) -> WorkerDays:
+    """Union of many worker-days dictionaries"""
+    merged = defaultdict(set)
+    for item in worker_days:
+        for worker_id, days in item.items():
+            merged[worker_id] |= set(days)
+    return dict(merged)
+
+
+def worker_days_for_weekday(worker_id: int, weekday: int) -> WorkerDays:
+    """All days with the given weekday (1 is Monday, 7 is Sunday) inside materialized window"""
+    return {worker_id: {day for day in _days_between(*materialized_window()) if day.isoweekday() == weekday}}
+
+
+def worker_days_for_window(worker_id: int) -> WorkerDays:
+    """All days inside materialized window"""
+    return {worker_id: set(_days_between(*materialized_window()))}
+
+
+def worker_days_for_visit(user_ids: Iterable[int], scheduled_from: datetime, scheduled_to: datetime) -> WorkerDays:
+    """Days covered by visit for workers of the given dentists' users"""
+    first_day = timezone.localtime(scheduled_from).date()
+    last_day = max(first_day, timezone.localtime(scheduled_to - timedelta(microseconds=1)).date())
+    days = set(_days_between(first_day, last_day))
+    worker_ids = Worker.objects.filter(user_id__in=list(user_ids)).values_list("pk", flat=True)
+    return {worker_id: days for worker_id in worker_ids}
+
+
+def split_by_day(intervals: Iterable[Interval]) -> dict[date, list[list[int]]]:
+    """Split free intervals into `[since, until]` minutes since local midnight of every day they cover"""
+    by_day = defaultdict(list)
+    for interval in intervals:
+        start, end = timezone.localtime(interval.start), timezone.localtime(interval.end)
+        day = start.date()
+        since = start.hour * 60 + start.minute
+        while day < end.date():
+            if since < MINUTES_PER_DAY:
+                by_day[day].append([since, MINUTES_PER_DAY])
+            day, since = day + timedelta(days=1), 0
+        until = end.hour * 60 + end.minute
+        if since < until:
+            by_day[day].append([since, until])
+    return by_day
+
+
+def _minute_to_datetime(day: date, minute: int) -> datetime:
+    day, minute = day + timedelta(days=minute // MINUTES_PER_DAY), minute % MINUTES_PER_DAY
+    return timezone.make_aware(datetime.combine(day, time(minute // 60, minute % 60)))
+
+
+def _compute_rows(worker_days: WorkerDays) -> list[DailyAvailability]:
+    date_from = min(min(days) for days in worker_days.values())
+    date_to = max(max(days) for days in worker_days.values())
+    free = get_free_intervals_for_workers(Worker.objects.filter(pk__in=worker_days.keys()), date_from, date_to)
+
+    rows = []
+    for worker_id, intervals in free.items():
+        by_day = split_by_day(intervals)
+        rows.extend(
+            DailyAvailability(worker_id=worker_id, date=day, free_intervals=by_day.get(day, []))
+            for day in sorted(worker_days[worker_id])
+        )
+    return rows
+
+
+def refresh_daily_availability(worker_days: WorkerDays) -> int:
+    """
+    Function to recompute daily availability only for the given worker-days (days outside of materialized window are
+    skipped). Returns number of recomputed rows.
+    """
+    first, last = materialized_window()
+    worker_days = {worker_id: {day for day in days if first <= day <= last} for worker_id, days in worker_days.items()}
+    worker_days = {worker_id: days for worker_id, days in worker_days.items() if days}
+    if not worker_days:
+        return 0
+
+    rows = _compute_rows(worker_days)
+    stale = Q()
+    for worker_id, days in worker_days.items():
+        stale |= Q(worker_id=worker_id, date__in=days)
+    with transaction.atomic():
+        DailyAvailability.objects.filter(stale).delete()
+        DailyAvailability.objects.bulk_create(rows)
+    return len(rows)
+
+
+def rebuild_daily_availability(workers=None, batch_size: int = 50) -> int:
+    """
+    Function to recompute whole materialized window for all (or given) workers in batches and to remove rows of
+    past days. Every batch costs constant number of queries. Returns number of computed rows.
+    """
+    first, last = materialized_window()
+    days = set(_days_between(first, last))
+    worker_ids = list((workers if workers is not None else Worker.objects.all()).values_list("pk", flat=True))
+
+    created = 0
+    for i in range(0, len(worker_ids), batch_size):
+        batch = worker_ids[i:i + batch_size]
+        rows = _compute_rows({worker_id: days for worker_id in batch})
+        with transaction.atomic():
+            DailyAvailability.objects.filter(worker_id__in=batch, date__range=(first, last)).delete()
+            DailyAvailability.objects.bulk_create(rows, batch_size=1000)
+        created += len(rows)
+    DailyAvailability.objects.filter(date__lt=first).delete()
+    return created
+
+
+def get_daily_free_intervals(worker: Worker, date_from: date, date_to: date) -> list[Interval]:
+    """
+    Function to read free time of the worker between `date_from` and `date_to` (both inclusive) from materialized
+    rows with one indexed query. Days which aren't materialized are computed on the fly.
+    """
+    computed = dict(
+        DailyAvailability.objects.filter(worker=worker, date__range=(date_from, date_to)).values_list("date", "free_intervals")
+    )
+    intervals = [
+        Interval(_minute_to_datetime(day, since), _minute_to_datetime(day, until))
+        for day, pairs in computed.items() for since, until in pairs
+    ]
+
+    missing = [day for day in _days_between(date_from, date_to) if day not in computed]
+    if missing:
+        live = get_free_intervals_for_workers([worker], min(missing), max(missing))[worker.id]
+        by_day = split_by_day(live)
+        intervals.extend(
+            Interval(_minute_to_datetime(day, since), _minute_to_datetime(day, until))
+            for day in missing for since, until in by_day.get(day, [])
+        )
+    return merge_intervals(intervals)
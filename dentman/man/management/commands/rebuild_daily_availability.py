@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from dentman.man.availability import materialized_window, rebuild_daily_availability
+from dentman.man.models import Worker
+
+
+class Command(BaseCommand):
+    help = "Recompute workers' daily availability for the whole materialized window in bulk"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--worker", type=int, action="append", dest="workers",
+                            help="ID of worker to rebuild (can be passed many times); all workers by default")
+        parser.add_argument("--batch-size", type=int, default=50, help="How many workers are computed at once")
+
+    def handle(self, *args, **options):
+        workers = Worker.objects.all()
+        if options["workers"]:
+            workers = workers.filter(pk__in=options["workers"])
+
+        first, last = materialized_window()
+        created = rebuild_daily_availability(workers, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Computed {created} worker-days between {first} and {last}"))
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('man', '0006_alter_bonus_bonus_amount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAvailability',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('free_intervals', models.JSONField(blank=True, default=list, verbose_name='Free intervals')),
+                ('computed_at', models.DateTimeField(auto_now=True, verbose_name='Computed at')),
+                ('worker', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='man.worker', verbose_name='Worker')),
+            ],
+            options={
+                'verbose_name': 'daily availability',
+                'verbose_name_plural': 'daily availabilities',
+                'constraints': [models.UniqueConstraint(fields=('worker', 'date'), name='man_dailyavailability_worker_date_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('man', '0007_dailyavailability'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='employment',
+            index=models.Index(fields=['new_employee', 'is_active'], name='man_employment_emp_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inaccessibility',
+            index=models.Index(fields=['worker', 'date'], name='man_inaccess_worker_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='specialavailability',
+            index=models.Index(fields=['worker', 'date'], name='man_specialavail_wk_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='worker',
+            index=models.Index(fields=['is_active'], name='man_worker_is_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workersavailability',
+            index=models.Index(fields=['worker', 'weekday'], name='man_workeravail_worker_wd_idx'),
+        ),
+    ]
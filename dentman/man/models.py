@@ -7,7 +7,7 @@ from django.core.validators import FileExtensionValidator, MinValueValidator
 from django.utils import timezone
 from django.conf import settings
 
-from dentman.app.mixins import CreatedUpdatedMixin, FullCleanMixin
+from dentman.app.mixins import CreatedUpdatedMixin, FullCleanMixin, DirtyFieldsMixin
 from dentman.storage import CustomFileSystemStorage
 from dentman.utils import get_upload_path, delete_old_file
 from dentman.app.models import Metrics
@@ -36,17 +36,23 @@ class Worker(CreatedUpdatedMixin, FullCleanMixin):
     class Meta:
         verbose_name = "worker"
         verbose_name_plural = "workers"
+        indexes = [
+            models.Index(fields=["is_active"], name="man_worker_is_active_idx"),
+        ]
 
     def __str__(self):
         return f"Worker {self.user.get_full_name()}"
 
     def save(self, *args, **kwargs):
-        # if value `to_when` is set that means that worker is still active
+        self.set_computed_fields()
+        super().save(*args, **kwargs)
+
+    def set_computed_fields(self):
+        """Set fields computed from other ones (also used by `dentman.bulk.validated_bulk_create`)"""
+        # if value `to_when` is set that means that worker isn't active anymore
         if self.to_when:
             self.is_active = False
 
-        super().save(*args, **kwargs)
-
 
 class DentistStaff(CreatedUpdatedMixin, FullCleanMixin):
     """
@@ -99,7 +105,7 @@ class ManagementStaff(CreatedUpdatedMixin, FullCleanMixin):
         return f"{self.worker.user.get_full_name()} with {roles_as_text} permissions"
 
 
-class WorkersAvailability(CreatedUpdatedMixin, FullCleanMixin):
+class WorkersAvailability(CreatedUpdatedMixin, FullCleanMixin, DirtyFieldsMixin):
     """
     Model to describe all office workers schedule availability. Fields:
     1) `worker` - OneToOneField to model `man.Worker`
@@ -125,6 +131,9 @@ class WorkersAvailability(CreatedUpdatedMixin, FullCleanMixin):
     class Meta:
         verbose_name = "worker's availability"
         verbose_name_plural = "workers' availabilities"
+        indexes = [
+            models.Index(fields=["worker", "weekday"], name="man_workeravail_worker_wd_idx"),
+        ]
 
     def __str__(self):
         return f"{self.worker.user.get_full_name()} availability on {self.get_weekday_display()} since {self.since} to {self.until}"
@@ -138,7 +147,7 @@ class WorkersAvailability(CreatedUpdatedMixin, FullCleanMixin):
             })
 
 
-class SpecialAvailability(CreatedUpdatedMixin, FullCleanMixin):
+class SpecialAvailability(CreatedUpdatedMixin, FullCleanMixin, DirtyFieldsMixin):
     """
     Model to describe special availabilities i.e. when have to that day work shorter than normally. Fields are:
     1) `worker` - OneToOneField to model `man.Worker`
@@ -156,6 +165,9 @@ class SpecialAvailability(CreatedUpdatedMixin, FullCleanMixin):
     class Meta:
         verbose_name = "special availability"
         verbose_name_plural = "special availabilities"
+        indexes = [
+            models.Index(fields=["worker", "date"], name="man_specialavail_wk_date_idx"),
+        ]
 
     def __str__(self):
         return f"{self.worker.user.get_full_name()} special availability at {self.date} since {self.since} to {self.until}"
@@ -169,7 +181,7 @@ class SpecialAvailability(CreatedUpdatedMixin, FullCleanMixin):
             })
 
 
-class Inaccessibility(CreatedUpdatedMixin, FullCleanMixin):
+class Inaccessibility(CreatedUpdatedMixin, FullCleanMixin, DirtyFieldsMixin):
     """
     Model for inaccessibility. Fields:
     1) `worker` - OneToOneField to model `man.Worker`
@@ -193,6 +205,9 @@ class Inaccessibility(CreatedUpdatedMixin, FullCleanMixin):
     class Meta:
         verbose_name = "inaccessibility"
         verbose_name_plural = "unavailability"
+        indexes = [
+            models.Index(fields=["worker", "date"], name="man_inaccess_worker_date_idx"),
+        ]
 
     def __str__(self):
         if self.is_whole_day:
@@ -225,7 +240,33 @@ class Inaccessibility(CreatedUpdatedMixin, FullCleanMixin):
             })
 
 
-class Employment(CreatedUpdatedMixin, FullCleanMixin):
+class DailyAvailability(models.Model):
+    """
+    Denormalized free time of the worker per day, computed by `dentman.man.scheduling` and kept up to date by signals
+    (see `dentman.man.availability`). Fields:
+    1) `worker` - foreign key to `man.Worker` model
+    2) `date` - day of availability
+    3) `free_intervals` - list of `[since, until]` pairs of free minutes since local midnight (empty list means that
+    worker isn't free that day, while missing row means that day hasn't been computed)
+    4) `computed_at` - when row was computed
+    """
+    worker = models.ForeignKey(Worker, verbose_name="Worker", on_delete=models.CASCADE)
+    date = models.DateField("Date")
+    free_intervals = models.JSONField("Free intervals", default=list, blank=True)
+    computed_at = models.DateTimeField("Computed at", auto_now=True)
+
+    class Meta:
+        verbose_name = "daily availability"
+        verbose_name_plural = "daily availabilities"
+        constraints = [
+            models.UniqueConstraint(fields=["worker", "date"], name="man_dailyavailability_worker_date_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.worker.user.get_full_name()} free time at {self.date}"
+
+
+class Employment(CreatedUpdatedMixin, FullCleanMixin, DirtyFieldsMixin):
     """
     Model describing contract details between office and employees. Model has fields:
     1) `new_employee` - foreign key to `man.Worker` model; new employee in office
@@ -272,17 +313,32 @@ class Employment(CreatedUpdatedMixin, FullCleanMixin):
     class Meta:
         verbose_name = "employment"
         verbose_name_plural = "employments"
+        indexes = [
+            models.Index(fields=["new_employee", "is_active"], name="man_employment_emp_active_idx"),
+        ]
 
     def __str__(self):
         return f"{self.new_employee.user.get_full_name()}'s employment"
 
     def save(self, *args, **kwargs):
-        if self.pk:
-            actual_contract_scan = Employment.objects.get(pk=self.pk).contract_scan
-            if self.contract_scan != actual_contract_scan: # if new contract scan has been uploaded delete old one and upload a new one
-                delete_old_file(actual_contract_scan)
+        if self.pk and self.has_changed("contract_scan"): # if new contract scan has been uploaded delete old one and upload a new one
+            delete_old_file(self.get_loaded_file("contract_scan"))
         super().save(*args, **kwargs)
 
+    def can_view_contract(self, user) -> bool:
+        """
+        Whether user can see contract scan: user is a superuser, the new employee or active worker responsible for HR
+        (the same check for `show_contract_scan` view and for links signed in admin)
+        """
+        if user.is_superuser:
+            return True
+        worker = Worker.objects.filter(user=user, is_active=True).only("pk").first()
+        if worker is None:
+            return False
+        if self.new_employee_id == worker.pk:
+            return True
+        return ManagementStaff.objects.filter(worker=worker, is_hr=True).exists()
+
     def clean(self):
         super().clean()
 
@@ -0,0 +1,163 @@
+"""
+Scheduling engine which answers the question "when is worker free?".
+
+Free time of the worker is built from:
+1) `WorkersAvailability` - weekly schedule of the worker
+2) `SpecialAvailability` - schedule for the given date; if it exists it replaces weekly schedule for that date
+3) `Inaccessibility` - whole day or partial inaccessibility which is subtracted from the schedule
+4) `ops.Visit` - already booked (not resigned) visits where worker's user is one of dentists
+
+All data is fetched with a constant number of queries (no matter how many days or workers are requested) and the rest
+is done in memory on sorted lists of intervals.
+"""
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, NamedTuple
+
+from django.utils import timezone
+
+from dentman.man.models import Worker, WorkersAvailability, SpecialAvailability, Inaccessibility
+from dentman.ops.models import Visit
+
+
+class Interval(NamedTuple):
+    """Half-open [start, end) interval of aware datetimes"""
+    start: datetime
+    end: datetime
+
+
+def merge_intervals(intervals: Iterable[Interval]) -> list[Interval]:
+    """Function to sort intervals and merge the overlapping or touching ones"""
+    merged = []
+    for start, end in sorted(intervals):
+        if start >= end:
+            continue
+        if merged and start <= merged[-1].end:
+            if end > merged[-1].end:
+                merged[-1] = Interval(merged[-1].start, end)
+        else:
+            merged.append(Interval(start, end))
+    return merged
+
+
+def subtract_intervals(base: list[Interval], removed: list[Interval]) -> list[Interval]:
+    """
+    Function to subtract `removed` intervals from `base` intervals.
+
+    Both lists have to be sorted and merged (see `merge_intervals`), then result is computed in one sweep.
+    """
+    result = []
+    i = 0
+    for start, end in base:
+        # skip removed intervals which end before this one starts
+        while i < len(removed) and removed[i].end <= start:
+            i += 1
+        j = i
+        while j < len(removed) and removed[j].start < end:
+            if removed[j].start > start:
+                result.append(Interval(start, removed[j].start))
+            start = max(start, removed[j].end)
+            j += 1
+        if start < end:
+            result.append(Interval(start, end))
+    return result
+
+
+def split_into_slots(intervals: Iterable[Interval], duration: timedelta, step: timedelta | None = None) -> list[Interval]:
+    """
+    Function to cut free intervals into slots of `duration` length.
+
+    Slots start at the beginning of every free interval and next ones are moved by `step` (by default by `duration`)
+    """
+    step = step or duration
+    slots = []
+    for start, end in intervals:
+        while start + duration <= end:
+            slots.append(Interval(start, start + duration))
+            start += step
+    return slots
+
+
+def _as_datetime(day: date, at: time) -> datetime:
+    return timezone.make_aware(datetime.combine(day, at))
+
+
+def _day_interval(day: date, since: time | None, until: time | None) -> Interval:
+    """Time range of the day as interval of aware datetimes (missing `until` means until the end of the day)"""
+    start = _as_datetime(day, since or time.min)
+    end = _as_datetime(day + timedelta(days=1), time.min) if until is None else _as_datetime(day, until)
+    return Interval(start, end)
+
+
+def _date_range(date_from: date, date_to: date) -> list[date]:
+    return [date_from + timedelta(days=i) for i in range((date_to - date_from).days + 1)]
+
+
+def get_free_intervals_for_workers(workers: Iterable[Worker], date_from: date, date_to: date) -> dict[int, list[Interval]]:
+    """
+    Function to compute free time of many workers at once between `date_from` and `date_to` (both inclusive).
+
+    Returns dictionary where key is worker's id and value is sorted list of free intervals. Whole computation uses
+    five queries (one if `workers` is a queryset plus one per each source of data), so it costs the same for one
+    worker and one day as for all workers and three months.
+    """
+    workers = list(workers)
+    if not workers or date_to < date_from:
+        return {worker.id: [] for worker in workers}
+
+    worker_ids = [worker.id for worker in workers]
+    workers_by_user = {worker.user_id: worker.id for worker in workers}
+    range_start = _as_datetime(date_from, time.min)
+    range_end = _as_datetime(date_to + timedelta(days=1), time.min)
+
+    weekly = defaultdict(list)
+    for worker_id, weekday, since, until in WorkersAvailability.objects.filter(worker_id__in=worker_ids).values_list(
+            "worker_id", "weekday", "since", "until"):
+        weekly[(worker_id, weekday)].append((since, until))
+
+    special = defaultdict(list)
+    for worker_id, day, since, until in SpecialAvailability.objects.filter(
+            worker_id__in=worker_ids, date__range=(date_from, date_to)).values_list("worker_id", "date", "since", "until"):
+        special[(worker_id, day)].append((since, until))
+
+    blocked = defaultdict(list)
+    for worker_id, day, is_whole_day, since, until in Inaccessibility.objects.filter(
+            worker_id__in=worker_ids, date__range=(date_from, date_to)).values_list(
+            "worker_id", "date", "is_whole_day", "since", "until"):
+        if is_whole_day:
+            blocked[worker_id].append(_day_interval(day, None, None))
+        else:
+            blocked[worker_id].append(_day_interval(day, since, until))
+
+    for user_id, scheduled_from, scheduled_to in Visit.objects.blocking().filter(
+            dentists__in=workers_by_user.keys(), scheduled_from__lt=range_end, scheduled_to__gt=range_start
+    ).values_list("dentists", "scheduled_from", "scheduled_to"):
+        blocked[workers_by_user[user_id]].append(Interval(scheduled_from, scheduled_to))
+
+    days = _date_range(date_from, date_to)
+    free = {}
+    for worker in workers:
+        available = []
+        for day in days:
+            # worker isn't free before he started working and after he stopped
+            if day < worker.since_when or (worker.to_when and day > worker.to_when):
+                continue
+            rows = special.get((worker.id, day)) or weekly.get((worker.id, day.isoweekday()), [])
+            available.extend(_day_interval(day, since, until) for since, until in rows)
+        free[worker.id] = subtract_intervals(merge_intervals(available), merge_intervals(blocked[worker.id]))
+    return free
+
+
+def get_free_intervals(worker: Worker, date_from: date, date_to: date) -> list[Interval]:
+    """Function to compute free time of one worker between `date_from` and `date_to` (both inclusive)"""
+    return get_free_intervals_for_workers([worker], date_from, date_to)[worker.id]
+
+
+def get_free_slots(worker: Worker, date_from: date, date_to: date, duration: timedelta,
+                   step: timedelta | None = None) -> list[Interval]:
+    """
+    Function to return free slots of `duration` length for the worker between `date_from` and `date_to` (both inclusive).
+
+    Slots are generated every `step` (by default every `duration`) since the beginning of each free interval.
+    """
+    return split_into_slots(get_free_intervals(worker, date_from, date_to), duration, step)
@@ -1,24 +1,22 @@
 import os
 
-from django.db.models.signals import pre_delete, post_save
+from django.db.models.signals import pre_delete, post_save, pre_save, post_delete, m2m_changed
 from django.dispatch import receiver
 
-from dentman.man.models import Employment, Inaccessibility
-from dentman.utils import get_upload_path, delete_old_file
+from dentman.man.availability import (refresh_daily_availability, merge_worker_days, worker_days_for_weekday,
+                                      worker_days_for_window, worker_days_for_visit)
+from dentman.man.models import Employment, Inaccessibility, Worker, WorkersAvailability, SpecialAvailability
+from dentman.ops.models import Visit
+from dentman.utils import get_upload_path, delete_old_file, relocate_file
+
+VISIT_SCHEDULE_FIELDS = {'scheduled_from', 'scheduled_to', 'visit_status'}
 
 @receiver(post_save, sender=Employment)
 def move_contract_scan(sender, instance, created, **kwargs):
     """Signal's function for employment's contract scan to move from temporary folder into dedicated directory"""
     if instance.contract_scan and 'temp' in instance.contract_scan.name:
-        old_name = instance.contract_scan.name
-        filename = os.path.basename(old_name)
-        new_name = get_upload_path(instance, filename)
-        if old_name != new_name:
-            file = instance.contract_scan.storage.open(old_name)
-            instance.contract_scan.storage.save(new_name, file)
-            instance.contract_scan.storage.delete(old_name)
-            instance.contract_scan.name = new_name
-            instance.save(update_fields=['contract_scan'])
+        filename = os.path.basename(instance.contract_scan.name)
+        relocate_file(instance, 'contract_scan', get_upload_path(instance, filename))
 
 @receiver(pre_delete, sender=Employment)
 def delete_contract_scan(sender, instance, **kwargs):
@@ -33,4 +31,94 @@ def set_none_when_is_for_whole_day(sender, instance, created, **kwargs):
     if instance.is_whole_day and (instance.since is not None or instance.until is not None):
         instance.since = None
         instance.until = None
-        instance.save(update_fields=['since', 'until'])
\ No newline at end of file
+        instance.save(update_fields=['since', 'until'])
+
+def _schedule_worker_days(instance, get_value=getattr):
+    """Worker-days affected by the availability or inaccessibility record (by default with its current values)"""
+    worker_id = get_value(instance, 'worker_id')
+    if worker_id is None:
+        return {}
+    if isinstance(instance, WorkersAvailability):
+        return worker_days_for_weekday(worker_id, get_value(instance, 'weekday'))
+    return {worker_id: {get_value(instance, 'date')}}
+
+@receiver(pre_save, sender=WorkersAvailability)
+@receiver(pre_save, sender=SpecialAvailability)
+@receiver(pre_save, sender=Inaccessibility)
+def remember_previous_schedule(sender, instance, **kwargs):
+    """
+    Signal's function to remember worker-days of the record before change (i.e. when date or worker was changed). Values
+    from database are remembered by the model (`DirtyFieldsMixin`), so it doesn't query database
+    """
+    instance._previous_worker_days = _schedule_worker_days(instance, sender.get_loaded_value)
+
+@receiver(post_save, sender=WorkersAvailability)
+@receiver(post_save, sender=SpecialAvailability)
+@receiver(post_save, sender=Inaccessibility)
+@receiver(post_delete, sender=WorkersAvailability)
+@receiver(post_delete, sender=SpecialAvailability)
+@receiver(post_delete, sender=Inaccessibility)
+def refresh_availability_after_schedule_change(sender, instance, **kwargs):
+    """Signal's function to recompute daily availability of worker-days affected by schedule's change"""
+    previous = getattr(instance, '_previous_worker_days', {})
+    refresh_daily_availability(merge_worker_days(previous, _schedule_worker_days(instance)))
+
+@receiver(post_save, sender=Worker)
+def refresh_availability_after_worker_change(sender, instance, created, **kwargs):
+    """Signal's function to recompute daily availability of worker, because `since_when` or `to_when` could change"""
+    if not created:
+        refresh_daily_availability(worker_days_for_window(instance.pk))
+
+@receiver(pre_save, sender=Visit)
+def remember_previous_visit_time(sender, instance, update_fields=None, **kwargs):
+    """Signal's function to remember visit's scheduled time before change"""
+    instance._previous_schedule = None
+    if instance.pk and (update_fields is None or VISIT_SCHEDULE_FIELDS & set(update_fields)):
+        previous = instance.get_loaded_value('scheduled_from'), instance.get_loaded_value('scheduled_to')
+        if previous[0] is not None:
+            instance._previous_schedule = previous
+
+@receiver(post_save, sender=Visit)
+def refresh_availability_after_visit_change(sender, instance, created, update_fields=None, **kwargs):
+    """Signal's function to recompute daily availability of visit's dentists after visit's time or status change"""
+    if created or (update_fields is not None and not VISIT_SCHEDULE_FIELDS & set(update_fields)):
+        return # new visit doesn't have dentists yet; they are handled by `m2m_changed`
+    user_ids = list(instance.dentists.values_list('pk', flat=True))
+    worker_days = worker_days_for_visit(user_ids, instance.scheduled_from, instance.scheduled_to)
+    if instance._previous_schedule:
+        worker_days = merge_worker_days(worker_days, worker_days_for_visit(user_ids, *instance._previous_schedule))
+    refresh_daily_availability(worker_days)
+
+@receiver(pre_delete, sender=Visit)
+def remember_deleted_visit_worker_days(sender, instance, **kwargs):
+    """Signal's function to remember worker-days of visit while its dentists still exist"""
+    user_ids = instance.dentists.values_list('pk', flat=True)
+    instance._previous_worker_days = worker_days_for_visit(user_ids, instance.scheduled_from, instance.scheduled_to)
+
+@receiver(post_delete, sender=Visit)
+def refresh_availability_after_visit_delete(sender, instance, **kwargs):
+    """Signal's function to recompute daily availability of worker-days freed by deleted visit"""
+    refresh_daily_availability(getattr(instance, '_previous_worker_days', {}))
+
+@receiver(m2m_changed, sender=Visit.dentists.through)
+def refresh_availability_after_dentists_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Signal's function to recompute daily availability of dentists added to or removed from visit"""
+    if action not in ('post_add', 'post_remove', 'pre_clear', 'post_clear'):
+        return
+
+    if not reverse: # instance is visit and `pk_set` contains dentists' ids
+        def affected_worker_days(user_ids):
+            return worker_days_for_visit(user_ids, instance.scheduled_from, instance.scheduled_to)
+    else: # instance is dentist and `pk_set` contains visits' ids
+        def affected_worker_days(visit_ids):
+            visits = Visit.objects.filter(pk__in=visit_ids).values_list('scheduled_from', 'scheduled_to')
+            return merge_worker_days(*(worker_days_for_visit([instance.pk], *times) for times in visits))
+
+    if action == 'pre_clear':
+        # after clearing there is no information which dentists (or visits) were related, so remember them now
+        # (`dentists` is both visit's field and user's related name of visits)
+        instance._previous_worker_days = affected_worker_days(list(instance.dentists.values_list('pk', flat=True)))
+    elif action == 'post_clear':
+        refresh_daily_availability(getattr(instance, '_previous_worker_days', {}))
+    else:
+        refresh_daily_availability(affected_worker_days(pk_set))
@@ -0,0 +1,43 @@
+"""
+Signed, expiring URLs of contract scans.
+
+Admin renders links to contract scans with `?expires=<unix time>&signature=<hmac>` where HMAC (keyed with SECRET_KEY)
+covers the file path, id of the user the link was generated for and the expiry. `show_contract_scan` view checks such
+signature without any database query, and falls back to checking permissions only for unsigned (or invalid, or
+expired) URLs. Links are valid for `settings.CONTRACT_URL_MAX_AGE` seconds.
+"""
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+SALT = "dentman.man.signing.contract_scan"
+
+
+def contract_signature(file_path: str, user_id: int, expires: int) -> str:
+    """Return HMAC of the file path, user's id and expiry"""
+    return salted_hmac(SALT, f"{file_path}:{user_id}:{expires}", algorithm="sha256").hexdigest()
+
+
+def signed_contract_url(file_path: str, user_id: int, max_age: int | None = None) -> str:
+    """Return URL of contract scan signed for the user, valid for `max_age` seconds (default from settings)"""
+    if max_age is None:
+        max_age = settings.CONTRACT_URL_MAX_AGE
+    expires = int(time.time()) + max_age
+    query = urlencode({"expires": expires, "signature": contract_signature(file_path, user_id, expires)})
+    return f"{reverse('show_contract_scan', kwargs={'file_path': file_path})}?{query}"
+
+
+def is_signature_valid(file_path: str, user_id: int | None, expires: str | None, signature: str | None) -> bool:
+    """Check that signature matches the file path and user and that it hasn't expired yet (no database access)"""
+    if user_id is None or not expires or not signature:
+        return False
+    try:
+        expires = int(expires)
+    except ValueError:
+        return False
+    if expires < time.time():
+        return False
+    return constant_time_compare(signature, contract_signature(file_path, user_id, expires))
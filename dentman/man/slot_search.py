@@ -0,0 +1,161 @@
+"""
+Minute-resolution bitset calendar to search free slots across many workers at once.
+
+Free time of every worker over the whole searched horizon is kept as one Python integer where n-th bit means that n-th
+minute since the local midnight of the first day is free (every day has 1440 bits, so minutes are counted in local
+wall-clock time). Thanks to that, finding slots of the given length, limiting them to the wanted weekdays and hours and
+merging results of all dentists are bitwise AND/OR/shift operations done in C over whole integers instead of Python
+loops over intervals.
+"""
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, NamedTuple
+
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from dentman.man.models import Worker
+from dentman.man.scheduling import get_free_intervals_for_workers
+
+MINUTES_PER_DAY = 24 * 60
+
+
+class Slot(NamedTuple):
+    worker: Worker
+    start: datetime
+    end: datetime
+
+
+def _minutes(duration: timedelta) -> int:
+    return int(duration.total_seconds() // 60)
+
+
+def _day_minutes(since: time | None, until: time | None) -> tuple[int, int]:
+    since_minute = since.hour * 60 + since.minute if since else 0
+    until_minute = until.hour * 60 + until.minute if until else MINUTES_PER_DAY
+    return since_minute, until_minute
+
+
+def run_starts(bits: int, length: int) -> int:
+    """
+    Function to return bitset of minutes where at least `length` free minutes in a row start.
+
+    After each step n-th bit is set only if `covered` minutes since n-th are free; shifting by at most `covered`
+    and AND-ing doubles checked length, so only log2(length) operations are needed.
+    """
+    covered = 1
+    while covered < length:
+        shift = min(covered, length - covered)
+        bits &= bits >> shift
+        covered += shift
+    return bits
+
+
+class BitCalendar:
+    """
+    Free time of many workers between `date_from` and `date_to` (both inclusive) stored as one bitset per worker
+    """
+    def __init__(self, date_from: date, date_to: date, workers: Iterable[Worker], bits: dict[int, int]):
+        self.date_from = date_from
+        self.date_to = date_to
+        self.days = (date_to - date_from).days + 1
+        self.size = self.days * MINUTES_PER_DAY
+        self.workers = {worker.id: worker for worker in workers}
+        self.bits = bits
+
+    @classmethod
+    def build(cls, workers: Iterable[Worker], date_from: date, date_to: date) -> "BitCalendar":
+        """Build calendar from workers' availabilities, inaccessibilities and visits (with constant number of queries)"""
+        workers = list(workers)
+        calendar = cls(date_from, date_to, workers, {})
+        free = get_free_intervals_for_workers(workers, date_from, date_to)
+        for worker_id, intervals in free.items():
+            bits = 0
+            for interval in intervals:
+                start, end = calendar.to_minute(interval.start, ceil=True), calendar.to_minute(interval.end)
+                if start < end:
+                    bits |= ((1 << (end - start)) - 1) << start
+            calendar.bits[worker_id] = bits
+        return calendar
+
+    def to_minute(self, moment: datetime, ceil: bool = False) -> int:
+        """Index of minute in calendar for the given moment (clipped to the calendar's size)"""
+        moment = timezone.localtime(moment)
+        minute = (moment.date() - self.date_from).days * MINUTES_PER_DAY + moment.hour * 60 + moment.minute
+        if ceil and (moment.second or moment.microsecond):
+            minute += 1
+        return min(max(minute, 0), self.size)
+
+    def to_datetime(self, minute: int) -> datetime:
+        """Aware datetime of the minute in calendar"""
+        day, minute_of_day = divmod(minute, MINUTES_PER_DAY)
+        naive = datetime.combine(self.date_from + timedelta(days=day), time(minute_of_day // 60, minute_of_day % 60))
+        return timezone.make_aware(naive)
+
+    def window_mask(self, length: int, weekdays: Iterable[int] | None = None, time_from: time | None = None,
+                    time_to: time | None = None, step: int = 1) -> int:
+        """
+        Mask of minutes where slot of `length` minutes may start:
+        1) day's weekday (1 is Monday, 7 is Sunday) is in `weekdays` (all days if not set)
+        2) whole slot fits between `time_from` and `time_to` of that day
+        3) slot starts at a full `step` since midnight (i.e. every 15 minutes)
+        """
+        since_minute, until_minute = _day_minutes(time_from, time_to)
+        day_pattern = 0
+        for minute in range((since_minute + step - 1) // step * step, until_minute - length + 1, step):
+            day_pattern |= 1 << minute
+
+        weekdays = set(weekdays) if weekdays else None
+        mask = 0
+        for day in range(self.days):
+            if weekdays is None or (self.date_from + timedelta(days=day)).isoweekday() in weekdays:
+                mask |= day_pattern << (day * MINUTES_PER_DAY)
+        return mask
+
+    def slot_starts(self, worker_id: int, length: int, mask: int = -1) -> int:
+        """Bitset of minutes where the worker has free slot of `length` minutes (limited to `mask`)"""
+        return run_starts(self.bits.get(worker_id, 0), length) & mask
+
+    def find_slots(self, duration: timedelta, limit: int = 10, weekdays: Iterable[int] | None = None,
+                   time_from: time | None = None, time_to: time | None = None,
+                   step: timedelta = timedelta(minutes=15), not_before: datetime | None = None) -> list[Slot]:
+        """Return first `limit` slots (ordered by start time) of all workers in calendar"""
+        length = _minutes(duration)
+        mask = self.window_mask(length, weekdays, time_from, time_to, max(_minutes(step), 1))
+        if not_before is not None:
+            mask &= -1 << self.to_minute(not_before, ceil=True)
+
+        starts = {worker_id: self.slot_starts(worker_id, length, mask) for worker_id in self.bits}
+        any_worker = 0
+        for worker_starts in starts.values():
+            any_worker |= worker_starts
+
+        slots = []
+        while any_worker and len(slots) < limit:
+            lowest = any_worker & -any_worker
+            minute = lowest.bit_length() - 1
+            start = self.to_datetime(minute)
+            end = self.to_datetime(minute + length)
+            for worker_id, worker_starts in starts.items():
+                if worker_starts & lowest:
+                    slots.append(Slot(self.workers[worker_id], start, end))
+                    if len(slots) == limit:
+                        break
+            any_worker ^= lowest
+        return slots
+
+
+def find_slots(duration: timedelta, date_from: date, date_to: date, workers: QuerySet | Iterable[Worker] | None = None,
+               limit: int = 10, weekdays: Iterable[int] | None = None, time_from: time | None = None,
+               time_to: time | None = None, step: timedelta = timedelta(minutes=15)) -> list[Slot]:
+    """
+    Function to find first `limit` free slots of `duration` length across all workers between `date_from` and
+    `date_to` (both inclusive), e.g. "any dentist, any time Tuesday afternoon":
+
+        find_slots(timedelta(minutes=30), today, today + timedelta(days=90), weekdays=[2], time_from=time(12))
+
+    By default active dentists are searched, otherwise pass filtered `workers` queryset. Slots in the past are skipped.
+    """
+    if workers is None:
+        workers = Worker.objects.filter(is_active=True, dentiststaff__is_dentist=True)
+    calendar = BitCalendar.build(workers, date_from, date_to)
+    return calendar.find_slots(duration, limit, weekdays, time_from, time_to, step, not_before=timezone.now())
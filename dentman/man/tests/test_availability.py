@@ -0,0 +1,121 @@
+import pytest
+from datetime import date, datetime, time, timedelta
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.utils import timezone
+
+from dentman.man.availability import get_daily_free_intervals, rebuild_daily_availability, split_by_day
+from dentman.man.models import Worker, WorkersAvailability, SpecialAvailability, Inaccessibility, DailyAvailability
+from dentman.man.scheduling import Interval
+from .utils import book_visit
+
+User = get_user_model()
+
+
+def next_monday() -> date:
+    today = timezone.localdate()
+    return today + timedelta(days=7 - today.weekday())
+
+
+def at(day: date, hour: int, minute: int = 0) -> datetime:
+    return timezone.make_aware(datetime.combine(day, time(hour, minute)))
+
+
+def free_minutes(worker: Worker, day: date) -> list:
+    return DailyAvailability.objects.get(worker=worker, date=day).free_intervals
+
+
+@pytest.fixture
+def worker(db, settings):
+    """Fixture to create worker available on Mondays from 9 to 17 with materialized availability"""
+    settings.AVAILABILITY_HORIZON_DAYS = 28
+    user = User.objects.create_user(username='dentist', password='password123', is_dentist=True)
+    worker = Worker.objects.create(user=user, since_when=date(2020, 1, 1))
+    WorkersAvailability.objects.create(worker=worker, weekday=1, since=time(9, 0), until=time(17, 0))
+    rebuild_daily_availability()
+    return worker
+
+
+def test_split_by_day():
+    """Test splitting intervals crossing midnight into minutes of each day"""
+    monday = date(2030, 1, 7)
+    intervals = [Interval(at(monday, 9), at(monday, 10, 30)), Interval(at(monday, 22), at(monday + timedelta(days=1), 2))]
+    assert split_by_day(intervals) == {
+        monday: [[540, 630], [1320, 1440]],
+        monday + timedelta(days=1): [[0, 120]],
+    }
+
+
+@pytest.mark.django_db
+def test_rebuild_creates_row_for_every_day(worker):
+    """Test that rebuild materializes every day of the window, including days without free time"""
+    assert DailyAvailability.objects.filter(worker=worker).count() == 28
+    assert free_minutes(worker, next_monday()) == [[540, 1020]]
+    assert free_minutes(worker, next_monday() + timedelta(days=1)) == []
+
+
+@pytest.mark.django_db
+def test_visit_updates_only_its_day(worker):
+    """Test that booking visit recomputes only day of the visit"""
+    monday = next_monday()
+    other_monday_computed_at = DailyAvailability.objects.get(worker=worker, date=monday + timedelta(days=7)).computed_at
+
+    visit = book_visit(worker.user, at(monday, 10), at(monday, 11))
+    assert free_minutes(worker, monday) == [[540, 600], [660, 1020]]
+    assert DailyAvailability.objects.get(worker=worker, date=monday + timedelta(days=7)).computed_at == other_monday_computed_at
+
+    visit.scheduled_from, visit.scheduled_to = at(monday, 12), at(monday, 13)
+    visit.save()
+    assert free_minutes(worker, monday) == [[540, 720], [780, 1020]]
+
+    visit.dentists.clear()
+    assert free_minutes(worker, monday) == [[540, 1020]]
+
+
+@pytest.mark.django_db
+def test_deleted_visit_frees_time(worker):
+    """Test that deleting visit recomputes its day"""
+    monday = next_monday()
+    visit = book_visit(worker.user, at(monday, 10), at(monday, 11))
+    visit.delete()
+    assert free_minutes(worker, monday) == [[540, 1020]]
+
+
+@pytest.mark.django_db
+def test_schedule_changes_are_materialized(worker):
+    """Test that weekly, special availability and inaccessibility changes update affected days"""
+    monday, tuesday = next_monday(), next_monday() + timedelta(days=1)
+
+    availability = WorkersAvailability.objects.create(worker=worker, weekday=2, since=time(8, 0), until=time(12, 0))
+    assert free_minutes(worker, tuesday) == [[480, 720]]
+    assert free_minutes(worker, tuesday + timedelta(days=7)) == [[480, 720]]
+
+    SpecialAvailability.objects.create(worker=worker, date=tuesday, since=time(10, 0), until=time(11, 0))
+    assert free_minutes(worker, tuesday) == [[600, 660]]
+
+    inaccessibility = Inaccessibility.objects.create(worker=worker, date=monday, is_whole_day=True)
+    assert free_minutes(worker, monday) == []
+    inaccessibility.date = tuesday
+    inaccessibility.save()
+    assert free_minutes(worker, monday) == [[540, 1020]]
+    assert free_minutes(worker, tuesday) == []
+
+    availability.delete()
+    assert free_minutes(worker, tuesday + timedelta(days=7)) == []
+
+
+@pytest.mark.django_db
+def test_lookup_is_one_query(worker, django_assert_num_queries):
+    """Test that reading materialized days costs one query"""
+    monday = next_monday()
+    with django_assert_num_queries(1):
+        intervals = get_daily_free_intervals(worker, monday, monday + timedelta(days=6))
+    assert intervals == [Interval(at(monday, 9), at(monday, 17))]
+
+
+@pytest.mark.django_db
+def test_rebuild_command(worker):
+    """Test management command rebuilding materialized availability"""
+    DailyAvailability.objects.all().delete()
+    call_command("rebuild_daily_availability")
+    assert DailyAvailability.objects.filter(worker=worker).count() == 28
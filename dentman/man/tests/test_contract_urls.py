@@ -0,0 +1,115 @@
+import pytest
+from datetime import date
+from urllib.parse import parse_qs, urlsplit
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.urls import reverse
+
+from dentman.man.models import Worker, ManagementStaff, Employment
+from dentman.man.signing import signed_contract_url, is_signature_valid
+
+User = get_user_model()
+
+FILE_PATH = "00/07/contract.pdf"
+
+
+@pytest.fixture
+def storage_root(settings, tmp_path):
+    """Fixture to use temporary directory as storage with one contract scan"""
+    settings.STORAGE_ROOT = tmp_path
+    scan = tmp_path / "contr" / FILE_PATH
+    scan.parent.mkdir(parents=True)
+    scan.write_bytes(b"%PDF contract")
+    return tmp_path
+
+
+@pytest.fixture
+def user_client(db, client):
+    """Fixture to log in user who isn't a worker, so only signed URLs give access to the scan"""
+    user = User.objects.create_user(username='outsider', password='password123')
+    client.force_login(user)
+    client.user = user
+    return client
+
+
+def query(url: str) -> dict:
+    return {key: values[0] for key, values in parse_qs(urlsplit(url).query).items()}
+
+
+def test_signature_is_bound_to_path_user_and_expiry():
+    """Test that signature doesn't match other file, other user or changed expiry"""
+    params = query(signed_contract_url(FILE_PATH, 1))
+    assert is_signature_valid(FILE_PATH, 1, params["expires"], params["signature"])
+    assert not is_signature_valid("00/08/contract.pdf", 1, params["expires"], params["signature"])
+    assert not is_signature_valid(FILE_PATH, 2, params["expires"], params["signature"])
+    assert not is_signature_valid(FILE_PATH, 1, str(int(params["expires"]) + 60), params["signature"])
+    assert not is_signature_valid(FILE_PATH, 1, "soon", params["signature"])
+    assert not is_signature_valid(FILE_PATH, None, params["expires"], params["signature"])
+
+
+def test_expired_signature_is_rejected():
+    """Test that signature stops being valid after max age"""
+    params = query(signed_contract_url(FILE_PATH, 1, max_age=-1))
+    assert not is_signature_valid(FILE_PATH, 1, params["expires"], params["signature"])
+
+
+def test_signed_url_is_served_without_permission_queries(storage_root, user_client, django_assert_max_num_queries):
+    """Test that valid signed URL returns file without querying workers, employments or management staff"""
+    url = signed_contract_url(FILE_PATH, user_client.user.pk)
+    assert url.startswith(reverse("show_contract_scan", kwargs={"file_path": FILE_PATH}))
+
+    # only session and user are loaded by authentication middleware
+    with django_assert_max_num_queries(2) as context:
+        response = user_client.get(url)
+    assert response.status_code == 200
+    assert b"".join(response.streaming_content) == b"%PDF contract"
+    assert not any("man_" in query["sql"] for query in context.captured_queries)
+
+
+def test_invalid_signature_falls_back_to_permissions(storage_root, user_client):
+    """Test that URL signed for other user, expired or unsigned URL goes through permission checks"""
+    other_user_url = signed_contract_url(FILE_PATH, user_client.user.pk + 1)
+    expired_url = signed_contract_url(FILE_PATH, user_client.user.pk, max_age=-1)
+    unsigned_url = reverse("show_contract_scan", kwargs={"file_path": FILE_PATH})
+
+    for url in (other_user_url, expired_url, unsigned_url):
+        assert user_client.get(url).status_code == 404
+
+
+def test_unsigned_url_still_works_for_superuser(storage_root, admin_client):
+    """Test that superuser can still open unsigned URL"""
+    response = admin_client.get(reverse("show_contract_scan", kwargs={"file_path": FILE_PATH}))
+    assert response.status_code == 200
+
+
+@pytest.fixture
+def employment(db):
+    """Fixture to create employment whose contract scan is kept at `FILE_PATH`"""
+    worker = Worker.objects.create(user=User.objects.create_user(username='employee', password='password123'))
+    hr_worker = Worker.objects.create(user=User.objects.create_user(username='hr', password='password123'))
+    representative = ManagementStaff.objects.create(worker=hr_worker, is_hr=True)
+    return Employment.objects.create(new_employee=worker, representative=representative, type_of_employment='full_time',
+                                     since_when=date(2025, 1, 1), agreement_date=date(2024, 12, 15),
+                                     contract_scan=FILE_PATH)
+
+
+def staff_client(client, user):
+    user.is_staff = True
+    user.save()
+    user.user_permissions.add(Permission.objects.get(codename="view_employment"))
+    client.force_login(user)
+    return client
+
+
+def test_admin_signs_link_only_for_users_allowed_to_see_scan(storage_root, employment, client):
+    """Test that staff only allowed to view employments gets plain link (denied by view) and HR worker signed one"""
+    change_url = reverse("admin:man_employment_change", args=[employment.pk])
+    viewer = staff_client(client, User.objects.create_user(username='viewer', password='password123'))
+
+    response = viewer.get(change_url)
+    assert response.status_code == 200
+    assert "signature=" not in response.content.decode()
+    assert viewer.get(reverse("show_contract_scan", kwargs={"file_path": FILE_PATH})).status_code == 404
+
+    hr_client = staff_client(client, employment.representative.worker.user)
+    assert "signature=" in hr_client.get(change_url).content.decode()
@@ -0,0 +1,34 @@
+import pytest
+from datetime import date
+from django.db import connection
+
+from dentman.man.models import Worker, WorkersAvailability, SpecialAvailability, Inaccessibility, Employment
+from .utils import assert_index_used
+
+
+@pytest.mark.django_db
+def test_active_workers_query_uses_index():
+    """Test that filtering active workers uses index on `is_active`"""
+    if connection.vendor == "sqlite":
+        pytest.skip("SQLite doesn't use indexes for bare boolean column in WHERE clause")
+    assert_index_used(Worker.objects.filter(is_active=True), "man_worker_is_active_idx")
+
+
+@pytest.mark.django_db
+def test_weekly_availability_query_uses_index():
+    """Test that worker's availability on weekday uses (worker, weekday) index"""
+    assert_index_used(WorkersAvailability.objects.filter(worker_id=1, weekday=1), "man_workeravail_worker_wd_idx")
+
+
+@pytest.mark.django_db
+def test_special_availability_and_inaccessibility_queries_use_index():
+    """Test that worker's special availability and inaccessibility in date range use (worker, date) indexes"""
+    dates = (date(2030, 1, 1), date(2030, 3, 31))
+    assert_index_used(SpecialAvailability.objects.filter(worker_id=1, date__range=dates), "man_specialavail_wk_date_idx")
+    assert_index_used(Inaccessibility.objects.filter(worker_id=1, date__range=dates), "man_inaccess_worker_date_idx")
+
+
+@pytest.mark.django_db
+def test_active_employments_query_uses_index():
+    """Test that active employments of worker use (new_employee, is_active) index"""
+    assert_index_used(Employment.objects.filter(new_employee_id=1, is_active=True), "man_employment_emp_active_idx")
@@ -0,0 +1,113 @@
+import pytest
+from datetime import date, datetime, time, timedelta
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from dentman.man.models import Worker, WorkersAvailability, SpecialAvailability, Inaccessibility
+from dentman.man.scheduling import (Interval, merge_intervals, subtract_intervals, get_free_intervals,
+                                    get_free_intervals_for_workers, get_free_slots)
+from dentman.ops.models import VisitStatus
+from .utils import book_visit
+
+User = get_user_model()
+
+MONDAY = date(2030, 1, 7)
+
+
+def at(day: date, hour: int, minute: int = 0) -> datetime:
+    return timezone.make_aware(datetime.combine(day, time(hour, minute)))
+
+
+@pytest.fixture
+def worker(db):
+    """Fixture to create a dentist worker available on Mondays and Tuesdays from 9 to 17."""
+    user = User.objects.create_user(username='dentist', password='password123', is_dentist=True)
+    worker = Worker.objects.create(user=user, since_when=date(2020, 1, 1))
+    for weekday in (1, 2):
+        WorkersAvailability.objects.create(worker=worker, weekday=weekday, since=time(9, 0), until=time(17, 0))
+    return worker
+
+
+def test_merge_intervals():
+    """Test merging overlapping and touching intervals"""
+    intervals = [Interval(5, 7), Interval(1, 3), Interval(2, 4), Interval(4, 5), Interval(9, 9)]
+    assert merge_intervals(intervals) == [Interval(1, 7)]
+
+
+def test_subtract_intervals():
+    """Test subtracting intervals which cover base partially, fully and across many base intervals"""
+    base = [Interval(0, 10), Interval(20, 30), Interval(40, 50)]
+    removed = [Interval(2, 4), Interval(8, 22), Interval(40, 50)]
+    assert subtract_intervals(base, removed) == [Interval(0, 2), Interval(4, 8), Interval(22, 30)]
+
+
+@pytest.mark.django_db
+def test_free_intervals_from_weekly_availability(worker):
+    """Test that weekly availability is used for matching weekdays only"""
+    free = get_free_intervals(worker, MONDAY, MONDAY + timedelta(days=6))
+    assert free == [
+        Interval(at(MONDAY, 9), at(MONDAY, 17)),
+        Interval(at(MONDAY + timedelta(days=1), 9), at(MONDAY + timedelta(days=1), 17)),
+    ]
+
+
+@pytest.mark.django_db
+def test_special_availability_replaces_weekly_one(worker):
+    """Test that special availability overrides weekly schedule for that date"""
+    SpecialAvailability.objects.create(worker=worker, date=MONDAY, since=time(10, 0), until=time(12, 0))
+    assert get_free_intervals(worker, MONDAY, MONDAY) == [Interval(at(MONDAY, 10), at(MONDAY, 12))]
+
+
+@pytest.mark.django_db
+def test_inaccessibility_is_subtracted(worker):
+    """Test that whole day and partial inaccessibility are subtracted"""
+    tuesday = MONDAY + timedelta(days=1)
+    Inaccessibility.objects.create(worker=worker, date=MONDAY, is_whole_day=True)
+    Inaccessibility.objects.create(worker=worker, date=tuesday, since=time(12, 0), until=time(13, 0))
+
+    assert get_free_intervals(worker, MONDAY, tuesday) == [
+        Interval(at(tuesday, 9), at(tuesday, 12)),
+        Interval(at(tuesday, 13), at(tuesday, 17)),
+    ]
+
+
+@pytest.mark.django_db
+def test_booked_visits_are_subtracted(worker):
+    """Test that visits are subtracted and resigned visits are ignored"""
+    resigned = VisitStatus.objects.create(name="Resigned", is_resigned_by_patient=True)
+    book_visit(worker.user, at(MONDAY, 10), at(MONDAY, 11))
+    book_visit(worker.user, at(MONDAY, 14), at(MONDAY, 15), visit_status=resigned)
+
+    assert get_free_intervals(worker, MONDAY, MONDAY) == [
+        Interval(at(MONDAY, 9), at(MONDAY, 10)),
+        Interval(at(MONDAY, 11), at(MONDAY, 17)),
+    ]
+
+
+@pytest.mark.django_db
+def test_no_free_time_outside_of_employment(worker):
+    """Test that worker isn't free before `since_when` and after `to_when`"""
+    worker.since_when = MONDAY + timedelta(days=1)
+    worker.save()
+    assert get_free_intervals(worker, MONDAY, MONDAY) == []
+
+
+@pytest.mark.django_db
+def test_free_slots(worker):
+    """Test splitting free time into slots"""
+    SpecialAvailability.objects.create(worker=worker, date=MONDAY, since=time(9, 0), until=time(10, 45))
+    slots = get_free_slots(worker, MONDAY, MONDAY, timedelta(minutes=30))
+    assert [slot.start for slot in slots] == [at(MONDAY, 9), at(MONDAY, 9, 30), at(MONDAY, 10)]
+
+
+@pytest.mark.django_db
+def test_constant_number_of_queries(worker, django_assert_num_queries):
+    """Test that the number of queries doesn't depend on the number of days and workers"""
+    other_user = User.objects.create_user(username='other', password='password123', is_dentist=True)
+    other = Worker.objects.create(user=other_user, since_when=date(2020, 1, 1))
+    book_visit(worker.user, at(MONDAY, 10), at(MONDAY, 11))
+
+    with django_assert_num_queries(5):
+        free = get_free_intervals_for_workers(Worker.objects.all(), MONDAY, MONDAY + timedelta(days=90))
+    assert len(free[worker.id]) == 27
+    assert free[other.id] == []
@@ -0,0 +1,96 @@
+import pytest
+from datetime import date, datetime, time, timedelta
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from dentman.man.models import Worker, DentistStaff, WorkersAvailability
+from dentman.man.slot_search import BitCalendar, find_slots, run_starts
+from .utils import book_visit
+
+User = get_user_model()
+
+MONDAY = date(2030, 1, 7)
+TUESDAY = MONDAY + timedelta(days=1)
+
+
+def at(day: date, hour: int, minute: int = 0) -> datetime:
+    return timezone.make_aware(datetime.combine(day, time(hour, minute)))
+
+
+def create_dentist(username: str, since: time, until: time, is_dentist: bool = True) -> Worker:
+    user = User.objects.create_user(username=username, password='password123', is_dentist=True)
+    worker = Worker.objects.create(user=user, since_when=date(2020, 1, 1))
+    DentistStaff.objects.create(worker=worker, is_dentist=is_dentist)
+    for weekday in range(1, 6):
+        WorkersAvailability.objects.create(worker=worker, weekday=weekday, since=since, until=until)
+    return worker
+
+
+@pytest.fixture
+def dentists(db):
+    """Fixture to create morning and afternoon dentists and one dentist assistant"""
+    return (
+        create_dentist('morning', time(8, 0), time(12, 0)),
+        create_dentist('afternoon', time(12, 0), time(18, 0)),
+        create_dentist('assistant', time(6, 0), time(20, 0), is_dentist=False),
+    )
+
+
+def test_run_starts():
+    """Test that only minutes starting long enough run of free minutes are kept"""
+    bits = 0b0111011110
+    assert run_starts(bits, 1) == bits
+    assert run_starts(bits, 3) == 0b0000000110 | 0b0001000000
+    assert run_starts(bits, 4) == 0b0000000010
+    assert run_starts(bits, 5) == 0
+
+
+@pytest.mark.django_db
+def test_calendar_bits(dentists):
+    """Test that free intervals are painted at the right minutes"""
+    morning, _, _ = dentists
+    book_visit(morning.user, at(MONDAY, 9), at(MONDAY, 10))
+    calendar = BitCalendar.build([morning], MONDAY, MONDAY)
+
+    bits = calendar.bits[morning.id]
+    assert bits == ((1 << 60) - 1) << 8 * 60 | ((1 << 120) - 1) << 10 * 60
+    assert calendar.to_datetime(calendar.to_minute(at(MONDAY, 10, 30))) == at(MONDAY, 10, 30)
+
+
+@pytest.mark.django_db
+def test_find_slots_across_dentists(dentists, monkeypatch):
+    """Test that first slots are returned in time order across dentists and assistant is skipped by default"""
+    monkeypatch.setattr(timezone, "now", lambda: at(MONDAY, 0))
+    morning, afternoon, _ = dentists
+    book_visit(morning.user, at(TUESDAY, 8), at(TUESDAY, 11, 40))
+
+    slots = find_slots(timedelta(minutes=30), MONDAY, MONDAY + timedelta(days=90), weekdays=[2],
+                       time_from=time(11, 0), limit=3)
+
+    assert [(slot.worker, slot.start) for slot in slots] == [
+        (afternoon, at(TUESDAY, 12, 0)),
+        (afternoon, at(TUESDAY, 12, 15)),
+        (afternoon, at(TUESDAY, 12, 30)),
+    ]
+    assert slots[0].end == at(TUESDAY, 12, 30)
+
+
+@pytest.mark.django_db
+def test_find_slots_with_workers_filter(dentists, monkeypatch):
+    """Test that slots are searched only among filtered workers and fit into the time window"""
+    monkeypatch.setattr(timezone, "now", lambda: at(MONDAY, 0))
+    morning, afternoon, assistant = dentists
+
+    slots = find_slots(timedelta(hours=1), MONDAY, TUESDAY, workers=Worker.objects.filter(pk=morning.pk),
+                       time_to=time(10, 0), step=timedelta(hours=1), limit=10)
+
+    assert [slot.start for slot in slots] == [at(MONDAY, 8), at(MONDAY, 9), at(TUESDAY, 8), at(TUESDAY, 9)]
+    assert {slot.worker for slot in slots} == {morning}
+
+
+@pytest.mark.django_db
+def test_find_slots_skips_past(dentists, monkeypatch):
+    """Test that slots which already started are not returned"""
+    monkeypatch.setattr(timezone, "now", lambda: at(MONDAY, 17, 10))
+    slots = find_slots(timedelta(minutes=30), MONDAY, MONDAY, limit=5)
+    assert [slot.start for slot in slots] == [at(MONDAY, 17, 15), at(MONDAY, 17, 30)]
@@ -1,3 +1,5 @@
+from decimal import Decimal
+
 from django.core.files.storage import Storage
 from django.core.files.base import ContentFile
 
@@ -23,3 +25,37 @@ class InMemoryStorage(Storage):
 
     def url(self, name):
         return f"/test/{name}"
+
+
+def book_visit(dentist_user, scheduled_from, scheduled_to, visit_status=None, **kwargs):
+    """Helper to create a visit with all required relations for the given dentist"""
+    from django.contrib.auth import get_user_model
+    from dentman.ops.models import Visit, VisitStatus, Service, Category
+
+    User = get_user_model()
+    patient = User.objects.create_user(username=f"patient-{User.objects.count()}", password="password123")
+    category, _ = Category.objects.get_or_create(name="General")
+    service, _ = Service.objects.get_or_create(name="Checkup", defaults={"category": category})
+    if visit_status is None:
+        visit_status, _ = VisitStatus.objects.get_or_create(name="Booked", defaults={"is_booked": True})
+    visit = Visit.objects.create(patient=patient, service=service, scheduled_from=scheduled_from, scheduled_to=scheduled_to,
+                                 visit_status=visit_status, price=Decimal("100.00"), **kwargs)
+    visit.dentists.add(dentist_user)
+    return visit
+
+
+def assert_index_used(queryset, index_name):
+    """
+    Helper for query-plan tests: run EXPLAIN for the queryset and check that plan uses `index_name`.
+
+    Test tables are tiny, so on PostgreSQL sequential scans are disabled for the current transaction; otherwise planner
+    would always prefer them. SQLite picks indexes by their shape, so there is nothing to tune.
+    """
+    from django.db import connections
+
+    connection = connections[queryset.db]
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+    plan = queryset.explain()
+    assert index_name in plan, f"Index {index_name} isn't used by query:\n{queryset.query}\nPlan:\n{plan}"
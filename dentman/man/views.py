@@ -1,31 +1,36 @@
+from asgiref.sync import sync_to_async
 from django.http import HttpResponseBase, HttpResponse
 from django.conf import settings
 
-from dentman.man.models import Worker, Employment, ManagementStaff
-from dentman.utils import return_file_in_response
+from dentman.man.models import Employment
+from dentman.man.signing import is_signature_valid
+from dentman.utils import areturn_file_in_response
 
 
-def show_contract_scan(request, file_path: str) -> HttpResponseBase:
+async def show_contract_scan(request, file_path: str) -> HttpResponseBase:
     """
-    Function to show contract scan of employment. There are 3 cases when we return file
+    Function to show contract scan of employment. URL signed for the user (see `dentman.man.signing`) which hasn't
+    expired is served without any permission query. Otherwise, there are 3 cases when we return file (see
+    `Employment.can_view_contract`)
     1) user is a superuser
     2) user is the new_employee in Employment model
     3) user is in management staff and is responsible for hr
     Due to login_required middleware every user is authenticated, and it isn't checked again
-    If user doesn't match any of these cases return 404
+    If user doesn't match any of these cases return 404. View is async, so under ASGI the file is streamed without
+    occupying a thread (see `dentman.utils.areturn_file_in_response`)
     """
     storage_root =settings.STORAGE_ROOT / "contr"
 
-    # Case 1). if user is superuser return file
-    if request.user.is_superuser:
-        return return_file_in_response(storage_root, file_path)
+    # user was already loaded by login_required middleware, so it's read without database query
+    user = request.user
 
-    # try to get worker
-    try:
-        worker = Worker.objects.get(user=request.user, is_active=True)
-    except Worker.DoesNotExist:
-        # if user isn't even worker don't show file
-        return HttpResponse("Resource not found", status=404)
+    # URL signed in admin for this user - no need to check permissions in database
+    if is_signature_valid(file_path, user.pk, request.GET.get("expires"), request.GET.get("signature")):
+        return await areturn_file_in_response(request, storage_root, file_path)
+
+    # superuser doesn't need employment to be looked up
+    if user.is_superuser:
+        return await areturn_file_in_response(request, storage_root, file_path)
 
     # try to get employment from database
     url_parts = file_path.split('/')
@@ -35,21 +40,12 @@ def show_contract_scan(request, file_path: str) -> HttpResponseBase:
     try:
         element_id_str = id_part1 + id_part2
         element_id = int(element_id_str)
-        employment = Employment.objects.get(id=element_id)
+        employment = await Employment.objects.aget(id=element_id)
     except (ValueError, Employment.DoesNotExist):
         return HttpResponse("Resource not found", status=404) # wrong url format or such employment doesn't exist
 
-    # Case 2) user is the employment's new employee
-    if employment.new_employee == worker:
-        return return_file_in_response(storage_root, file_path)
-
-    # Case 3) user is the company representative
-    # first try to get management staff
-    try:
-        _ = ManagementStaff.objects.get(worker=worker, is_hr=True)
-        return return_file_in_response(storage_root, file_path)
-    except ManagementStaff.DoesNotExist:
-        # If the worker is not an HR rep, fall through to the final 404.
-        pass
+    # user is the employment's new employee or worker responsible for HR
+    if await sync_to_async(employment.can_view_contract)(user):
+        return await areturn_file_in_response(request, storage_root, file_path)
 
     return HttpResponse("Resource not found", status=404) # if user doesn't match any of cases, return 404
@@ -1,7 +1,9 @@
 from django.contrib import admin
+from django.utils.html import format_html
 
 from dentman.ops.forms import VisitAdminForm
-from dentman.ops.models import Category, Service, VisitStatus, Discount, Visit, Post
+from dentman.ops.models import Category, Service, VisitStatus, Discount, DiscountValidityRun, Visit, Post
+from dentman.search import PeopleSearchMixin
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -69,6 +71,16 @@ class DiscountAdmin(admin.ModelAdmin):
         )   
     )
 
+@admin.register(DiscountValidityRun)
+class DiscountValidityRunAdmin(admin.ModelAdmin):
+    list_display = ('started_at', 'finished_at', 'became_valid', 'became_invalid', )
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 @admin.register(Visit)
 class VisitAdmin(admin.ModelAdmin):
     form = VisitAdminForm
@@ -103,8 +115,8 @@ class VisitAdmin(admin.ModelAdmin):
 
 
 @admin.register(Post)
-class PostAdmin(admin.ModelAdmin):
-    list_display = ('title', 'slug', 'created_by', 'visit_counter',)
+class PostAdmin(PeopleSearchMixin, admin.ModelAdmin):
+    list_display = ('main_photo_thumbnail', 'title', 'slug', 'created_by', 'visit_counter',)
     search_fields = ('title', 'slug', 'created_by__first_name',)
     fieldsets = (
         (
@@ -124,6 +136,14 @@ class PostAdmin(admin.ModelAdmin):
     readonly_fields = ('visit_counter', 'created_by', 'created_at', 'updated_by', 'updated_at',)
     prepopulated_fields = {'slug': ('title',)}
 
+    def main_photo_thumbnail(self, obj: Post) -> str:
+        # small variant of the photo, so the list doesn't load full size photos
+        if obj.main_photo:
+            return format_html('<img src="{}?size=128&format=webp" height="48">', obj.main_photo.url)
+        return "-"
+
+    main_photo_thumbnail.short_description = "Main photo"
+
     def save_model(self, request, obj, form, change):
         if not obj.pk:
             obj.created_by = request.user
@@ -0,0 +1,83 @@
+"""
+Prevention of overlapping visits of the same dentist.
+
+Every blocking visit has one `DentistBooking` row per dentist with copied scheduled time. Overlaps are rejected when
+rows are written:
+1) on PostgreSQL by exclusion constraint `EXCLUDE USING gist (dentist_id WITH =, tstzrange(...) WITH &&)`, so two
+concurrent transactions can't both succeed
+2) on other databases (SQLite) by checking overlaps after writing own rows in the same transaction; SQLite allows only
+one writing transaction at a time, so after the first write nobody can commit conflicting rows before we check
+Conflicts are raised as `ValidationError` listing the clashing visits.
+"""
+from collections import defaultdict
+from datetime import datetime
+from typing import Iterable
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.utils.timezone import localtime
+
+from dentman.ops.models import Visit, DentistBooking
+
+
+def find_conflicting_bookings(dentist_ids: Iterable[int], scheduled_from: datetime, scheduled_to: datetime,
+                              exclude_visit_id: int | None = None):
+    """Return bookings of given dentists overlapping [scheduled_from, scheduled_to) (uses dentist and range index)"""
+    bookings = DentistBooking.objects.filter(
+        dentist_id__in=list(dentist_ids), scheduled_from__lt=scheduled_to, scheduled_to__gt=scheduled_from
+    ).select_related("visit", "dentist").order_by("scheduled_from")
+    if exclude_visit_id is not None:
+        bookings = bookings.exclude(visit_id=exclude_visit_id)
+    return bookings
+
+
+def conflict_error(bookings: Iterable[DentistBooking]) -> ValidationError:
+    """Build ValidationError with list of clashing visits grouped by dentist"""
+    by_dentist = defaultdict(list)
+    for booking in bookings:
+        visit_from = localtime(booking.scheduled_from)
+        visit_to = localtime(booking.scheduled_to)
+        by_dentist[booking.dentist].append(
+            f"{booking.visit.eid} ({visit_from.strftime('%d.%m.%Y %H:%M')}-{visit_to.strftime('%H:%M')})"
+        )
+    messages = [
+        f"Dentist {dentist.get_full_name() or dentist.username} already has visits at this time: {', '.join(visits)}"
+        for dentist, visits in by_dentist.items()
+    ]
+    return ValidationError({"dentists": messages})
+
+
+def check_dentists_availability(dentist_ids: Iterable[int], scheduled_from: datetime, scheduled_to: datetime,
+                                exclude_visit_id: int | None = None) -> None:
+    """Raise ValidationError if any of dentists already has a visit in the given time"""
+    conflicts = list(find_conflicting_bookings(dentist_ids, scheduled_from, scheduled_to, exclude_visit_id))
+    if conflicts:
+        raise conflict_error(conflicts)
+
+
+def sync_dentist_bookings(visit: Visit) -> None:
+    """
+    Function to rewrite visit's bookings from its current dentists and scheduled time.
+
+    Raises ValidationError (and rolls back) if any dentist would have overlapping visits.
+    """
+    with transaction.atomic():
+        DentistBooking.objects.filter(visit=visit).delete()
+        if not visit.is_blocking:
+            return
+
+        dentist_ids = list(visit.dentists.values_list("pk", flat=True))
+        bookings = [
+            DentistBooking(visit=visit, dentist_id=dentist_id, scheduled_from=visit.scheduled_from,
+                           scheduled_to=visit.scheduled_to)
+            for dentist_id in dentist_ids
+        ]
+        try:
+            with transaction.atomic():
+                DentistBooking.objects.bulk_create(bookings)
+        except IntegrityError:
+            # exclusion constraint (PostgreSQL) rejected rows; find out which visits clash to report them
+            check_dentists_availability(dentist_ids, visit.scheduled_from, visit.scheduled_to, visit.pk)
+            raise
+        # own rows are already written, so on SQLite this transaction holds the write lock while checking
+        check_dentists_availability(dentist_ids, visit.scheduled_from, visit.scheduled_to, visit.pk)
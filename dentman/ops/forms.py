@@ -1,6 +1,7 @@
 from django import forms
 
 from dentman.ops.models import Visit, Discount
+from dentman.ops.booking import find_conflicting_bookings, conflict_error
 
 class VisitDiscountForm(forms.ModelForm):
     class Meta:
@@ -20,5 +21,21 @@ class VisitDiscountForm(forms.ModelForm):
 
         return discounts
 
+    def clean(self):
+        cleaned_data = super().clean()
+        dentists = cleaned_data.get('dentists')
+        scheduled_from = cleaned_data.get('scheduled_from')
+        scheduled_to = cleaned_data.get('scheduled_to')
+        visit_status = cleaned_data.get('visit_status')
+
+        # check if dentists are free at this time, so the error is shown in form instead of failing while saving
+        if dentists and scheduled_from and scheduled_to and Visit(visit_status=visit_status).is_blocking:
+            conflicts = list(find_conflicting_bookings([dentist.pk for dentist in dentists], scheduled_from,
+                                                       scheduled_to, self.instance.pk))
+            if conflicts:
+                self.add_error(None, conflict_error(conflicts))
+
+        return cleaned_data
+
 class VisitAdminForm(VisitDiscountForm):
     pass
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from dentman.ops.validity import refresh_discounts_validity
+
+
+class Command(BaseCommand):
+    help = "Recompute whether discounts are currently valid (to be run periodically, e.g. daily from cron)"
+
+    def handle(self, *args, **options):
+        run = refresh_discounts_validity()
+        self.stdout.write(self.style.SUCCESS(
+            f"{run.became_valid} discounts became valid, {run.became_invalid} discounts became invalid"
+        ))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from dentman.ops.models import Visit
+from dentman.ops.pricing import reprice_visits
+
+
+class Command(BaseCommand):
+    help = "Recalculate final price of visits from their price and discounts in bulk"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only list visits whose final price would change")
+        parser.add_argument("--chunk-size", type=int, default=1000, help="How many visits are processed at once")
+        parser.add_argument("--visit", type=int, action="append", dest="visits",
+                            help="ID of visit to re-price (can be passed many times); all visits by default")
+
+    def handle(self, *args, **options):
+        visits = Visit.objects.all()
+        if options["visits"]:
+            visits = visits.filter(pk__in=options["visits"])
+        total = visits.count()
+
+        def progress(processed, changed):
+            self.stdout.write(f"Processed {processed}/{total} visits, {changed} with different final price")
+
+        result = reprice_visits(visits, chunk_size=options["chunk_size"], dry_run=options["dry_run"],
+                                progress=progress)
+
+        for change in result.changes:
+            self.stdout.write(f"{change.eid}: {change.old_price:.2f} -> {change.new_price:.2f}")
+        verb = "would be changed" if options["dry_run"] else "changed"
+        self.stdout.write(self.style.SUCCESS(
+            f"Final price of {result.changed} of {result.processed} visits {verb}"
+        ))
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_dentist_bookings(apps, schema_editor):
+    """
+    Create bookings for existing blocking visits. If dentist already has overlapping visits only the first one
+    (by scheduled time) gets a booking, otherwise exclusion constraint couldn't be created.
+    """
+    Visit = apps.get_model('ops', 'Visit')
+    DentistBooking = apps.get_model('ops', 'DentistBooking')
+    DentistsThrough = Visit.dentists.through
+
+    resigned = (models.Q(visit__visit_status__is_resigned_by_patient=True) |
+                models.Q(visit__visit_status__is_resigned_by_dentist=True) |
+                models.Q(visit__visit_status__is_resigned_by_office=True))
+    rows = DentistsThrough.objects.exclude(resigned).order_by('user_id', 'visit__scheduled_from', 'visit_id').values_list(
+        'visit_id', 'user_id', 'visit__scheduled_from', 'visit__scheduled_to'
+    )
+
+    bookings = []
+    last_dentist_id, last_end = None, None
+    for visit_id, dentist_id, scheduled_from, scheduled_to in rows.iterator(chunk_size=2000):
+        if dentist_id == last_dentist_id and scheduled_from < last_end:
+            continue
+        bookings.append(DentistBooking(visit_id=visit_id, dentist_id=dentist_id, scheduled_from=scheduled_from,
+                                       scheduled_to=scheduled_to))
+        last_dentist_id, last_end = dentist_id, scheduled_to
+        if len(bookings) == 2000:
+            DentistBooking.objects.bulk_create(bookings)
+            bookings = []
+    DentistBooking.objects.bulk_create(bookings)
+
+
+def create_exclusion_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    schema_editor.execute(
+        'ALTER TABLE ops_dentistbooking ADD CONSTRAINT ops_booking_no_overlap '
+        "EXCLUDE USING gist (dentist_id WITH =, tstzrange(scheduled_from, scheduled_to, '[)') WITH &&)"
+    )
+
+
+def drop_exclusion_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('ALTER TABLE ops_dentistbooking DROP CONSTRAINT IF EXISTS ops_booking_no_overlap')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ops', '0025_alter_post_main_photo'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DentistBooking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scheduled_from', models.DateTimeField(verbose_name='Scheduled from')),
+                ('scheduled_to', models.DateTimeField(verbose_name='Scheduled to')),
+                ('dentist', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dentist_bookings', to=settings.AUTH_USER_MODEL, verbose_name='Dentist')),
+                ('visit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dentist_bookings', to='ops.visit', verbose_name='Visit')),
+            ],
+            options={
+                'verbose_name': "dentist's booking",
+                'verbose_name_plural': "dentists' bookings",
+                'indexes': [models.Index(fields=['dentist', 'scheduled_from', 'scheduled_to'], name='ops_booking_dentist_range_idx')],
+            },
+        ),
+        migrations.RunPython(fill_dentist_bookings, migrations.RunPython.noop),
+        migrations.RunPython(create_exclusion_constraint, drop_exclusion_constraint),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:50
+
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ops', '0026_dentistbooking'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='visit',
+            name='eid',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True, verbose_name='EID'),
+        ),
+        migrations.AddIndex(
+            model_name='discount',
+            index=models.Index(fields=['promotion_code'], name='ops_discount_promo_code_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visit',
+            index=models.Index(fields=['scheduled_from'], name='ops_visit_sched_from_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visit',
+            index=models.Index(fields=['patient', 'scheduled_from'], name='ops_visit_patient_sched_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visit',
+            index=models.Index(fields=['visit_status', 'scheduled_from'], name='ops_visit_status_sched_idx'),
+        ),
+    ]
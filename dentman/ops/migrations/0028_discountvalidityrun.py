@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ops', '0027_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiscountValidityRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(verbose_name='Started at')),
+                ('finished_at', models.DateTimeField(verbose_name='Finished at')),
+                ('became_valid', models.PositiveIntegerField(default=0, verbose_name='Became valid')),
+                ('became_invalid', models.PositiveIntegerField(default=0, verbose_name='Became invalid')),
+            ],
+            options={
+                'verbose_name': "discounts' validity refresh",
+                'verbose_name_plural': "discounts' validity refreshes",
+                'ordering': ['-started_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:03
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Trim, Upper
+
+
+def fill_normalized_promotion_codes(apps, schema_editor):
+    """Normalize existing promotion codes with one UPDATE (the same as `Discount.normalize_promotion_code`)"""
+    Discount = apps.get_model('ops', 'Discount')
+    Discount.objects.exclude(promotion_code__isnull=True).exclude(promotion_code='').update(
+        normalized_promotion_code=Upper(Trim('promotion_code'))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ops', '0028_discountvalidityrun'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='discount',
+            name='ops_discount_promo_code_idx',
+        ),
+        migrations.AddField(
+            model_name='discount',
+            name='normalized_promotion_code',
+            field=models.CharField(blank=True, editable=False, max_length=30, null=True, verbose_name='Normalized promotion code'),
+        ),
+        migrations.RunPython(fill_normalized_promotion_codes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='discount',
+            index=models.Index(fields=['normalized_promotion_code'], name='ops_discount_norm_promo_idx'),
+        ),
+    ]
@@ -3,13 +3,15 @@ import datetime
 from decimal import Decimal
 from math import ceil
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce, Greatest
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils.timezone import localtime
 from django.core.exceptions import ValidationError
 
-from dentman.app.mixins import CreatedUpdatedMixin, FullCleanMixin
+from dentman.app.mixins import CreatedUpdatedMixin, FullCleanMixin, DirtyFieldsMixin
 from dentman.storage import CustomFileSystemStorage
 from dentman.utils import get_upload_path_with_class, delete_old_file, get_upload_path
 
@@ -91,6 +93,75 @@ class VisitStatus(CreatedUpdatedMixin, FullCleanMixin):
         return f"Visit's status {self.name}"
 
 
+class DiscountQuerySet(models.QuerySet):
+    def with_free_uses(self, count: int = 1):
+        """Discounts that can be used `count` more times (not limited discounts always can)"""
+        return self.filter(Q(is_limited=False) | Q(used_counter__lte=Coalesce("limit_value", 0) - count))
+
+    def use(self, count: int = 1) -> int:
+        """
+        Increase usage counter by `count` with one UPDATE. Limited discounts are updated only if they don't exceed their
+        limit; the condition is checked by the database on locked rows, so concurrent uses can't overshoot the limit.
+        Returns number of updated discounts.
+        """
+        return self.with_free_uses(count).update(used_counter=F("used_counter") + count)
+
+    def release(self, count: int = 1) -> int:
+        """Decrease usage counter by `count` (never below 0) with one UPDATE"""
+        return self.update(used_counter=Greatest(F("used_counter") - count, Value(0)))
+
+    @staticmethod
+    def _invalidity_conditions(today: datetime.date) -> tuple[Q, Q, Q, Q]:
+        """Conditions of discount being inactive, too early, expired and used up (the same as `Discount.check_*`)"""
+        return (
+            Q(is_active=False),
+            Q(valid_since__gt=today),
+            Q(valid_to__lt=today),
+            Q(is_limited=True, used_counter__gte=Coalesce("limit_value", 0)),
+        )
+
+    def currently_valid(self, today: datetime.date | None = None):
+        """Discounts which are valid now, checked on their fields (doesn't trust `is_currently_valid` flag)"""
+        inactive, too_early, expired, limit_reached = self._invalidity_conditions(today or datetime.date.today())
+        return self.exclude(inactive | too_early | expired | limit_reached)
+
+    def refresh_validity(self, today: datetime.date | None = None) -> tuple[int, int]:
+        """
+        Recompute `is_currently_valid` and `why_invalid_summary` like `Discount.save` does, but with UPDATE statements
+        instead of saving every discount. Summary is chosen with CASE over all combinations of reasons, so it's exactly
+        the same text as built by `Discount.get_why_invalid_summary`. Returns numbers of discounts which became valid and
+        which became invalid.
+        """
+        model = self.model
+        inactive, too_early, expired, limit_reached = self._invalidity_conditions(today or datetime.date.today())
+        invalid = inactive | too_early | expired | limit_reached
+
+        # the same order of checks as in `check_validation_date` - discount which is too early isn't expired
+        date_states = [(too_early, model.TOO_EARLY_REASON), (~too_early & expired, model.EXPIRED_REASON),
+                       (~too_early & ~expired, "")]
+        summary = models.Case(*[
+            models.When(
+                active_q & date_q & limit_q,
+                then=Value(model.get_why_invalid_summary(inactive_info, date_reason, limit_reason))
+            )
+            for active_q, inactive_info in [(inactive, model.INACTIVE_REASON), (~inactive, "")]
+            for date_q, date_reason in date_states
+            for limit_q, limit_reason in [(limit_reached, model.LIMIT_REACHED_REASON), (~limit_reached, "")]
+        ], output_field=models.TextField())
+
+        became_valid = self.filter(~invalid, is_currently_valid=False).update(
+            is_currently_valid=True, why_invalid_summary=model.VALID_SUMMARY
+        )
+        became_invalid = self.filter(invalid, is_currently_valid=True).update(
+            is_currently_valid=False, why_invalid_summary=summary
+        )
+        # reasons of discounts which stay invalid can change as well (e.g. expired discount has been deactivated)
+        self.filter(invalid).alias(expected_summary=summary).exclude(
+            why_invalid_summary=F("expected_summary")
+        ).update(why_invalid_summary=summary)
+        return became_valid, became_invalid
+
+
 class Discount(CreatedUpdatedMixin, FullCleanMixin):
     """
     Discounts that are or were available in the service for customers. Fields:
@@ -99,15 +170,16 @@ class Discount(CreatedUpdatedMixin, FullCleanMixin):
     3) percent - discount percentage (min 0, max 100)
     4) discount_type - discount type (all are stored in `DISCOUNT_TYPES`)
     5) promotion_code - discount promotion code (only when `discount_type` is `promo_code`)
-    6) valid_since - since when patients can use discount
-    7) valid_to - until when patients can use discount
-    8) is_currently_valid - boolean value if discount is currently valid and able to use
-    9) why_invalid_summary - TextField for all information why discount is invalid (if is valid then there's message that's valid)
-    10) is_limited - boolean value if discount is limited
-    11) limit_value - discount's limit usage
-    12) is_active - boolean value if discount is active
-    13) used_counter - how many times discount was used
-    14) additional_info - extra info about discount
+    6) normalized_promotion_code - promotion code in upper case used for looking up (set in `save`)
+    7) valid_since - since when patients can use discount
+    8) valid_to - until when patients can use discount
+    9) is_currently_valid - boolean value if discount is currently valid and able to use
+    10) why_invalid_summary - TextField for all information why discount is invalid (if is valid then there's message that's valid)
+    11) is_limited - boolean value if discount is limited
+    12) limit_value - discount's limit usage
+    13) is_active - boolean value if discount is active
+    14) used_counter - how many times discount was used
+    15) additional_info - extra info about discount
     """
     # Types of discounts
     # 1) first_visit - promotion for patients that used this dentist for the first time
@@ -121,6 +193,13 @@ class Discount(CreatedUpdatedMixin, FullCleanMixin):
         ('other', 'Other')
     )
 
+    # Reasons why discount is invalid (stored in `why_invalid_summary`)
+    VALID_SUMMARY = "Discount is currently valid"
+    INACTIVE_REASON = "Discount is currently inactive"
+    TOO_EARLY_REASON = "It's too early to use this promotion"
+    EXPIRED_REASON = "Discount has expired"
+    LIMIT_REACHED_REASON = "Discount's limit has been reached"
+
     name = models.CharField("Discount name", max_length=255, unique=True)
     description = models.TextField("Discount description", blank=True)
     percent = models.IntegerField("Discount percent", default=0,
@@ -130,6 +209,9 @@ class Discount(CreatedUpdatedMixin, FullCleanMixin):
                                   ])
     discount_type = models.CharField("Discount type", max_length=50, choices=DISCOUNT_TYPES)
     promotion_code = models.CharField("Promotion code", max_length=30, blank=True, null=True)
+    normalized_promotion_code = models.CharField(
+        "Normalized promotion code", max_length=30, null=True, blank=True, editable=False
+    ) # promotion code without surrounding spaces in upper case, used to look up typed codes
     valid_since = models.DateField("Discount valid date", null=True, blank=True) # since when discount is valid (null=since forever)
     valid_to = models.DateField("Discount valid to", null=True, blank=True) # to when discount is valid (null=to forever)
     is_currently_valid = models.BooleanField(
@@ -146,32 +228,40 @@ class Discount(CreatedUpdatedMixin, FullCleanMixin):
     used_counter = models.IntegerField("Discount used counter", default=0) # how much times discount was used
     additional_info = models.TextField("Additional information", blank=True)
 
+    objects = DiscountQuerySet.as_manager()
+
+    # computed fields which have to be unique (without database constraint) and fields their errors are reported at;
+    # checked by `validate_unique` and for whole batches by `dentman.bulk.validated_bulk_create`
+    UNIQUE_COMPUTED_FIELDS = {"normalized_promotion_code": "promotion_code"}
+
     class Meta:
         verbose_name = "discount"
         verbose_name_plural = "discounts"
+        indexes = [
+            models.Index(fields=["normalized_promotion_code"], name="ops_discount_norm_promo_idx"),
+        ]
 
     def __str__(self):
         return f"Discount {self.name} -{self.percent}%"
 
     def save(self, *args, **kwargs):
+        self.set_computed_fields()
+        super().save(*args, **kwargs)
+
+    def set_computed_fields(self):
+        """Set fields computed from other ones (also used by `dentman.bulk.validated_bulk_create`)"""
         # check if discount is still valid, update a flag and summary why is valid/invalid
         is_valid_date, invalid_date_reason = self.check_validation_date()
         is_valid_limit, invalid_limit_reason = self.check_limits()
         is_active, inactive_info = self.check_if_active()
 
-        why_invalid = f"{inactive_info}\n{invalid_date_reason}\n{invalid_limit_reason}"
-        if is_valid_date and is_valid_limit and is_active:
-            self.is_currently_valid = True
-            why_invalid = f"Discount is currently valid"
-        else:
-            self.is_currently_valid = False
-        self.why_invalid_summary = why_invalid.strip("\n")
+        self.is_currently_valid = is_valid_date and is_valid_limit and is_active
+        self.why_invalid_summary = self.get_why_invalid_summary(inactive_info, invalid_date_reason, invalid_limit_reason)
 
         # remove useless spaces in code
         if self.promotion_code:
             self.promotion_code = self.promotion_code.strip()
-
-        super().save(*args, **kwargs)
+        self.normalized_promotion_code = self.normalize_promotion_code(self.promotion_code)
 
     def clean(self):
         super().clean()
@@ -182,14 +272,49 @@ class Discount(CreatedUpdatedMixin, FullCleanMixin):
                 "promotion_code": "Set promotion code because discount's type requires promotion code"
             })
 
+    def validate_unique(self, exclude=None):
+        errors = {}
+        try:
+            super().validate_unique(exclude=exclude)
+        except ValidationError as error:
+            errors = error.update_error_dict(errors)
+
+        # typed codes are looked up case-insensitively, so codes have to be unique after normalization
+        normalized_code = self.normalize_promotion_code(self.promotion_code)
+        if (normalized_code and "promotion_code" not in (exclude or ())
+                and Discount.objects.filter(normalized_promotion_code=normalized_code).exclude(pk=self.pk).exists()):
+            errors.setdefault("promotion_code", []).append(
+                self.unique_error_message(Discount, ("normalized_promotion_code", ))
+            )
+        if errors:
+            raise ValidationError(errors)
+
+    def unique_error_message(self, model_class, unique_check):
+        if tuple(unique_check) == ("normalized_promotion_code", ):
+            return ValidationError("Other discount already has this promotion code", code="unique")
+        return super().unique_error_message(model_class, unique_check)
+
+    @staticmethod
+    def normalize_promotion_code(code):
+        """Promotion code in the form it's stored in `normalized_promotion_code` (None for empty code)"""
+        code = (code or "").strip().upper()
+        return code or None
+
+    @classmethod
+    def get_why_invalid_summary(cls, inactive_info, invalid_date_reason, invalid_limit_reason):
+        """Summary why discount is invalid built from reasons returned by `check_*` methods (empty if check passed)"""
+        if not (inactive_info or invalid_date_reason or invalid_limit_reason):
+            return cls.VALID_SUMMARY
+        return f"{inactive_info}\n{invalid_date_reason}\n{invalid_limit_reason}".strip("\n")
+
     def check_validation_date(self):
         """Check if discount is still up-to-date"""
         today = datetime.date.today()
 
         if self.valid_since is not None and today < self.valid_since:
-            return False, "It's too early to use this promotion"
+            return False, self.TOO_EARLY_REASON
         elif self.valid_to is not None and today > self.valid_to:
-            return False, "Discount has expired"
+            return False, self.EXPIRED_REASON
         return True, ""
 
     def check_limits(self):
@@ -197,17 +322,66 @@ class Discount(CreatedUpdatedMixin, FullCleanMixin):
         current_limit = self.limit_value if self.limit_value is not None else 0
         
         if self.is_limited and current_limit <= self.used_counter:
-            return False, "Discount's limit has been reached"
+            return False, self.LIMIT_REACHED_REASON
         return True, ""
 
     def check_if_active(self):
         """Check if discount is currently active"""
         if not self.is_active:
-            return False, "Discount is currently inactive"
+            return False, self.INACTIVE_REASON
         return True, ""
 
 
-class Visit(CreatedUpdatedMixin, FullCleanMixin):
+class DiscountValidityRun(models.Model):
+    """
+    Record of one run of the job refreshing discounts' validity (see `dentman.ops.validity`). Fields:
+    1) started_at - when run has started
+    2) finished_at - when run has finished
+    3) became_valid - how many discounts have become valid
+    4) became_invalid - how many discounts have become invalid
+    """
+    started_at = models.DateTimeField("Started at")
+    finished_at = models.DateTimeField("Finished at")
+    became_valid = models.PositiveIntegerField("Became valid", default=0)
+    became_invalid = models.PositiveIntegerField("Became invalid", default=0)
+
+    class Meta:
+        verbose_name = "discounts' validity refresh"
+        verbose_name_plural = "discounts' validity refreshes"
+        ordering = ["-started_at"]
+
+    def __str__(self):
+        return (f"Discounts' validity refreshed at {localtime(self.started_at).strftime('%d.%m.%Y %H:%M')}: "
+                f"{self.became_valid} became valid, {self.became_invalid} became invalid")
+
+
+class VisitQuerySet(models.QuerySet):
+    def blocking(self):
+        """Visits that still take dentist's time, i.e. all visits besides resigned ones"""
+        return self.exclude(
+            models.Q(visit_status__is_resigned_by_patient=True) |
+            models.Q(visit_status__is_resigned_by_dentist=True) |
+            models.Q(visit_status__is_resigned_by_office=True)
+        )
+
+
+def apply_discounts(price: Decimal, percents: list[int]) -> Decimal:
+    """
+    Function to apply discounts one after another to the price. After every discount price is rounded up to full
+    hundredths, so the result depends only on price and discounts' percents (it's used also for bulk re-pricing)
+    """
+    current_final_price = price
+
+    for percent in percents:
+        decimal_discount_percent = Decimal(percent)
+        multiplier = Decimal(1) - decimal_discount_percent / Decimal(100)
+        current_final_price *= multiplier
+        current_final_price = ceil((current_final_price * 100)) / Decimal(100)
+
+    return current_final_price
+
+
+class Visit(CreatedUpdatedMixin, FullCleanMixin, DirtyFieldsMixin):
     """
     Model describing patient's visits in dentist's office. Fields
     1) eid - additional identity field with uuid
@@ -225,7 +399,7 @@ class Visit(CreatedUpdatedMixin, FullCleanMixin):
     13) discounts - ManyToManyField to `Discount` model; all discount's that were used for this visit
     14) final_price - price of visit including discounts
     """
-    eid = models.UUIDField("EID", default=uuid.uuid4, editable=False)
+    eid = models.UUIDField("EID", default=uuid.uuid4, editable=False, unique=True)
     patient = models.ForeignKey(User, verbose_name="Patient", on_delete=models.SET_NULL, null=True, limit_choices_to={'is_patient': True})
     service = models.ForeignKey(Service, verbose_name="Service", on_delete=models.SET_NULL, null=True)
     dentists = models.ManyToManyField(User, verbose_name="Dentists", limit_choices_to={'is_dentist': True}, related_name="dentists")
@@ -241,25 +415,30 @@ class Visit(CreatedUpdatedMixin, FullCleanMixin):
     final_price = models.DecimalField("Final price", max_digits=10, decimal_places=2, default=0.0,
                                       help_text="Final price of service including discounts")
 
+    objects = VisitQuerySet.as_manager()
+
     class Meta:
         verbose_name = "visit"
         verbose_name_plural = "visits"
+        indexes = [
+            models.Index(fields=["scheduled_from"], name="ops_visit_sched_from_idx"),
+            models.Index(fields=["patient", "scheduled_from"], name="ops_visit_patient_sched_idx"),
+            models.Index(fields=["visit_status", "scheduled_from"], name="ops_visit_status_sched_idx"),
+        ]
 
     def __str__(self):
         scheduled_from_localtime = localtime(self.scheduled_from)
         return f"{self.patient.get_full_name()}'s visit for {self.service.name} scheduled for {scheduled_from_localtime.strftime('%d.%m.%Y %H:%M')}"
 
+    def save(self, *args, **kwargs):
+        # dentists' bookings are rewritten by post_save signal in the same transaction, so a rejected overlap rolls
+        # back the visit's own write as well (dentists' changes run in transaction of the related manager)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     def calculate_final_price(self):
         """Method to calculate final price of the service including discounts"""
-        current_final_price = self.price
-
-        for discount in self.discounts.all():
-            decimal_discount_percent = Decimal(discount.percent)
-            multiplier = Decimal(1) - decimal_discount_percent / Decimal(100)
-            current_final_price *= multiplier
-            current_final_price = ceil((current_final_price * 100)) / Decimal(100)
-
-        self.final_price = current_final_price
+        self.final_price = apply_discounts(self.price, [discount.percent for discount in self.discounts.all()])
 
     def clean(self):
         super().clean()
@@ -273,8 +452,44 @@ class Visit(CreatedUpdatedMixin, FullCleanMixin):
                 "ending_time": "Ending time has to later than starting time"
             })
 
+    @property
+    def is_blocking(self):
+        """Whether visit takes dentists' time (visits resigned by anyone don't)"""
+        status = self.visit_status
+        return status is None or not (
+            status.is_resigned_by_patient or status.is_resigned_by_dentist or status.is_resigned_by_office
+        )
+
+
+class DentistBooking(models.Model):
+    """
+    Denormalized copy of `Visit.dentists` with visit's scheduled time, kept in sync by signals. It exists only to let the
+    database reject overlapping visits of the same dentist (M2M table can't hold the time range), so rows are created
+    only for blocking visits. Fields:
+    1) visit - foreign key to `Visit` model
+    2) dentist - foreign key to User who is one of visit's dentists
+    3) scheduled_from - copy of `Visit.scheduled_from`
+    4) scheduled_to - copy of `Visit.scheduled_to`
+
+    On PostgreSQL overlapping is prevented by exclusion constraint on (dentist, tstzrange) created in migration.
+    """
+    visit = models.ForeignKey(Visit, verbose_name="Visit", on_delete=models.CASCADE, related_name="dentist_bookings")
+    dentist = models.ForeignKey(User, verbose_name="Dentist", on_delete=models.CASCADE, related_name="dentist_bookings")
+    scheduled_from = models.DateTimeField("Scheduled from")
+    scheduled_to = models.DateTimeField("Scheduled to")
+
+    class Meta:
+        verbose_name = "dentist's booking"
+        verbose_name_plural = "dentists' bookings"
+        indexes = [
+            models.Index(fields=["dentist", "scheduled_from", "scheduled_to"], name="ops_booking_dentist_range_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.dentist} booked since {localtime(self.scheduled_from)} to {localtime(self.scheduled_to)}"
+
 
-class Post(CreatedUpdatedMixin, FullCleanMixin):
+class Post(CreatedUpdatedMixin, FullCleanMixin, DirtyFieldsMixin):
     """
     Model for posts that office stuff can add and patients can read. Fields:
     1) title - title of post
@@ -298,8 +513,6 @@ class Post(CreatedUpdatedMixin, FullCleanMixin):
         return f"Post {self.title}"
 
     def save(self, *args, **kwargs):
-        if self.pk:
-            actual_photo = Post.objects.get(pk=self.pk).main_photo
-            if self.main_photo != actual_photo: # if new photo has been uploaded delete old one and upload a new one
-                delete_old_file(actual_photo)
+        if self.pk and self.has_changed("main_photo"): # if new photo has been uploaded delete old one and upload a new one
+            delete_old_file(self.get_loaded_file("main_photo"))
         super().save(*args, **kwargs)
@@ -0,0 +1,73 @@
+"""
+Bulk recalculation of `Visit.final_price`.
+
+Visits are read in chunks ordered by primary key (keyset pagination, so every chunk is one indexed range query no matter
+how deep we are) with discounts prefetched, prices are computed with the same `apply_discounts` function which is used
+by `Visit.calculate_final_price` and only changed visits are written back with one `bulk_update` per chunk. Saving
+visits one by one is avoided on purpose - it would run `full_clean` and all post_save signals for every row.
+"""
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Callable
+from uuid import UUID
+
+from django.db import transaction
+from django.db.models import Prefetch
+
+from dentman.ops.models import Visit, Discount, apply_discounts
+
+
+@dataclass
+class PriceChange:
+    """Final price of the visit before and after re-pricing"""
+    visit_id: int
+    eid: UUID
+    old_price: Decimal
+    new_price: Decimal
+
+
+@dataclass
+class RepricingResult:
+    """Summary of re-pricing run: numbers of processed and changed visits and (only for dry run) the changes"""
+    processed: int = 0
+    changed: int = 0
+    changes: list[PriceChange] = field(default_factory=list)
+
+
+def reprice_visits(visits=None, chunk_size: int = 1000, dry_run: bool = False,
+                   progress: Callable[[int, int], None] | None = None) -> RepricingResult:
+    """
+    Function to recalculate final price of all (or given) visits. With `dry_run` nothing is written and the result lists
+    differences instead (they aren't kept otherwise, so memory doesn't grow with number of visits). `progress` is
+    called after every chunk with number of processed visits and number of changed ones so far.
+    """
+    visits = (visits if visits is not None else Visit.objects.all()).order_by("pk").only(
+        "pk", "eid", "price", "final_price"
+    ).prefetch_related(Prefetch("discounts", queryset=Discount.objects.only("pk", "percent")))
+
+    result = RepricingResult()
+    last_pk = 0
+    while True:
+        chunk = list(visits.filter(pk__gt=last_pk)[:chunk_size])
+        if not chunk:
+            break
+
+        to_update = []
+        for visit in chunk:
+            new_price = apply_discounts(visit.price, [discount.percent for discount in visit.discounts.all()])
+            if new_price != visit.final_price:
+                result.changed += 1
+                if dry_run:
+                    result.changes.append(PriceChange(visit.pk, visit.eid, visit.final_price, new_price))
+                visit.final_price = new_price
+                to_update.append(visit)
+
+        if to_update and not dry_run:
+            with transaction.atomic():
+                Visit.objects.bulk_update(to_update, ["final_price"])
+
+        result.processed += len(chunk)
+        last_pk = chunk[-1].pk
+        if progress is not None:
+            progress(result.processed, result.changed)
+    return result
@@ -0,0 +1,75 @@
+"""
+Lookup of discounts by promotion codes typed at checkout.
+
+Codes are compared on `Discount.normalized_promotion_code` (indexed, upper case, without surrounding spaces). During
+campaigns the same few codes are checked over and over, so results (including unknown codes) are kept in an in-process
+LRU cache with time to live. The cache is cleared by `Discount` post_save/post_delete signals; changes made with
+queryset updates (e.g. usage counters) are picked up after TTL at the latest - the limit of usage is enforced anyway
+when discount is added to visit.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from dentman.ops.models import Discount
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache keeping at most `maxsize` entries, each for `ttl` seconds"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return default
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+promo_code_cache = TTLCache(settings.PROMO_CODE_CACHE_SIZE, settings.PROMO_CODE_CACHE_TTL)
+
+
+def get_discount_by_promo_code(code: str) -> Discount | None:
+    """
+    Function to resolve typed promotion code (case and surrounding spaces don't matter) to currently valid discount of
+    `promo_code` type. Returns None if there is no such discount.
+    """
+    normalized_code = Discount.normalize_promotion_code(code)
+    if normalized_code is None:
+        return None
+
+    discount = promo_code_cache.get(normalized_code, _MISSING)
+    if discount is _MISSING:
+        discount = Discount.objects.currently_valid().filter(
+            normalized_promotion_code=normalized_code, discount_type="promo_code"
+        ).first()
+        promo_code_cache.set(normalized_code, discount)
+    return discount
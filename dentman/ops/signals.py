@@ -1,11 +1,23 @@
 import os
 
-from django.db.models.signals import post_save, pre_delete, m2m_changed
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
 from django.dispatch import receiver
-from django.db.models import F
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models.functions import Coalesce
 
 from dentman.ops.models import Post, Visit, Discount
-from dentman.utils import get_upload_path, delete_old_file
+from dentman.ops.booking import sync_dentist_bookings
+from dentman.ops.pricing import reprice_visits
+from dentman.ops.promo_codes import promo_code_cache
+from dentman.utils import get_upload_path, delete_old_file, relocate_file, normalize_uploaded_image
+
+@receiver(pre_save, sender=Post)
+def normalize_main_photo(sender, instance, **kwargs):
+    """
+    Downscale newly uploaded main photo of post and strip its metadata before it's stored
+    """
+    normalize_uploaded_image(instance, 'main_photo')
 
 @receiver(post_save, sender=Post)
 def move_main_photo(sender, instance, created, **kwargs):
@@ -13,15 +25,8 @@ def move_main_photo(sender, instance, created, **kwargs):
     Move the main photo of post's into dedicated directory
     """
     if instance.main_photo and 'temp' in instance.main_photo.name:
-        old_name = instance.main_photo.name
-        filename = os.path.basename(old_name)
-        new_name = get_upload_path(instance, filename, True)
-        if old_name != new_name:
-            file = instance.main_photo.storage.open(old_name)
-            instance.main_photo.storage.save(new_name, file)
-            instance.main_photo.storage.delete(old_name)
-            instance.main_photo.name = new_name
-            instance.save(update_fields=['main_photo'])
+        filename = os.path.basename(instance.main_photo.name)
+        relocate_file(instance, 'main_photo', get_upload_path(instance, filename, True))
 
 @receiver(pre_delete, sender=Post)
 def delete_main_photo(sender, instance, **kwargs):
@@ -31,26 +36,46 @@ def delete_main_photo(sender, instance, **kwargs):
     delete_old_file(instance.main_photo)
 
 @receiver(m2m_changed, sender=Visit.discounts.through)
-def visit_discounts_changed(sender, instance, action, pk_set, **kwargs):
+def visit_discounts_changed(sender, instance, action, reverse, pk_set, **kwargs):
     """
-    Signal to update discounts' used_counter and calculate actual final price of visit including all discounts
+    Signal to update discounts' used_counter and final price of affected visits. Counters are changed with one UPDATE per
+    action inside the transaction of the change; if any limited discount has no uses left ValidationError is raised, so
+    the whole change is rolled back
     """
-    if action == "post_add":
-        for pk in pk_set:
-            Discount.objects.filter(pk=pk).update(used_counter=F('used_counter') + 1)
+    if action == "pre_clear":
+        # rows of the through table are already deleted in `post_clear`, so remember them now; `discounts` is the name
+        # of both sides of the relation (discounts of visit and visits of discount)
+        instance._cleared_discounts_pks = set(instance.discounts.values_list("pk", flat=True))
+        return
+    if action == "post_clear":
+        pk_set = instance.__dict__.pop("_cleared_discounts_pks", set())
+    elif action not in ("post_add", "post_remove"):
+        return
+    if not pk_set:
+        return
 
-    elif action == "post_remove":
-        for pk in pk_set:
-            Discount.objects.filter(pk=pk).update(used_counter=F('used_counter') - 1)
+    if reverse:
+        # visits have been added to (removed from) the discount, so it's used once per visit
+        discounts, count = Discount.objects.filter(pk=instance.pk), len(pk_set)
+    else:
+        discounts, count = Discount.objects.filter(pk__in=pk_set), 1
 
-    elif action == "post_clear":
-        discounts = instance.discounts.all()
-        for discount in discounts:
-            discount.used_counter = F('used_counter') - 1
-            discount.save(update_fields=['used_counter'])
+    if action == "post_add":
+        if discounts.use(count) != (1 if reverse else len(pk_set)):
+            exhausted = discounts if reverse else discounts.filter(is_limited=True,
+                                                                   used_counter__gte=Coalesce("limit_value", 0))
+            raise ValidationError({
+                "discounts": f"These discounts have reached their limit of usage: "
+                             f"{", ".join(exhausted.values_list("name", flat=True))}"
+            })
+    else:
+        discounts.release(count)
 
-    instance.calculate_final_price()
-    instance.save(update_fields=['final_price'])
+    if reverse:
+        reprice_visits(Visit.objects.filter(pk__in=pk_set))
+    else:
+        instance.calculate_final_price()
+        Visit.objects.filter(pk=instance.pk).update(final_price=instance.final_price)
 
 @receiver(post_save, sender=Discount)
 def remove_promo_code_for_non_promo_code_discount(sender, instance, created, **kwargs):
@@ -59,6 +84,38 @@ def remove_promo_code_for_non_promo_code_discount(sender, instance, created, **k
     """
     if instance.promotion_code and instance.discount_type != 'promo_code':
         instance.promotion_code = None
-        instance.save(update_fields=['promotion_code'])
+        instance.save(update_fields=['promotion_code', 'normalized_promotion_code'])
 
+@receiver(post_save, sender=Discount)
+@receiver(post_delete, sender=Discount)
+def invalidate_promo_code_cache(sender, instance, **kwargs):
+    """
+    Signal to forget cached promotion codes after discount has changed (the code itself could have been changed, so
+    the whole cache is cleared; discounts are changed rarely)
+    """
+    transaction.on_commit(promo_code_cache.clear)
+
+@receiver(post_save, sender=Visit)
+def sync_bookings_after_visit_change(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Signal to rewrite dentists' bookings after visit's time or status has changed (raises ValidationError on overlap)
+    """
+    if update_fields is not None and not {"scheduled_from", "scheduled_to", "visit_status"} & set(update_fields):
+        return
+    sync_dentist_bookings(instance)
 
+@receiver(m2m_changed, sender=Visit.dentists.through)
+def sync_bookings_after_dentists_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Signal to rewrite dentists' bookings after visit's dentists have changed (raises ValidationError on overlap)
+    """
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        sync_dentist_bookings(instance)
+    elif action == "post_clear":
+        # user has been removed from all visits, so their bookings can go as well
+        instance.dentist_bookings.all().delete()
+    else:
+        for visit in Visit.objects.filter(pk__in=pk_set).select_related("visit_status"):
+            sync_dentist_bookings(visit)
@@ -0,0 +1,131 @@
+import pytest
+from datetime import datetime, timedelta
+from django.core.exceptions import ValidationError
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from dentman.man.tests.utils import book_visit
+from dentman.ops.forms import VisitAdminForm
+from dentman.ops.models import DentistBooking, VisitStatus
+
+User = get_user_model()
+
+START = timezone.make_aware(datetime(2030, 1, 7, 10, 0))
+
+
+@pytest.fixture
+def dentist(db):
+    return User.objects.create_user(username='dentist', first_name='Anna', last_name='Smile', password='test123',
+                                     is_dentist=True)
+
+
+@pytest.fixture
+def visit(dentist):
+    return book_visit(dentist, START, START + timedelta(hours=1))
+
+
+@pytest.mark.django_db
+def test_booking_created_for_visit_dentists(visit, dentist):
+    """Test that adding dentist to visit creates booking with visit's time"""
+    booking = DentistBooking.objects.get(visit=visit)
+    assert booking.dentist == dentist
+    assert booking.scheduled_from == visit.scheduled_from
+    assert booking.scheduled_to == visit.scheduled_to
+
+
+@pytest.mark.django_db
+def test_overlapping_visit_is_rejected(visit, dentist):
+    """Test that second overlapping visit of the same dentist raises ValidationError listing the clashing visit"""
+    with pytest.raises(ValidationError) as excinfo, transaction.atomic():
+        book_visit(dentist, START + timedelta(minutes=30), START + timedelta(minutes=90))
+
+    message = excinfo.value.message_dict["dentists"][0]
+    assert "Anna Smile" in message
+    assert str(visit.eid) in message
+    assert DentistBooking.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_adjacent_visits_are_allowed(visit, dentist):
+    """Test that visit starting exactly when previous one ends is allowed"""
+    book_visit(dentist, START + timedelta(hours=1), START + timedelta(hours=2))
+    assert DentistBooking.objects.filter(dentist=dentist).count() == 2
+
+
+@pytest.mark.django_db
+def test_resigned_visit_does_not_block(visit, dentist):
+    """Test that resigned visit frees dentist's time"""
+    visit.visit_status = VisitStatus.objects.create(name="Resigned", is_resigned_by_patient=True)
+    visit.save()
+
+    assert not DentistBooking.objects.filter(visit=visit).exists()
+    book_visit(dentist, START, START + timedelta(hours=1))
+
+
+@pytest.mark.django_db
+def test_moving_visit_into_other_one_is_rejected(visit, dentist):
+    """Test that changing scheduled time so visits overlap is rejected as well"""
+    later = book_visit(dentist, START + timedelta(hours=2), START + timedelta(hours=3))
+    later.scheduled_from = START + timedelta(minutes=30)
+    with pytest.raises(ValidationError):
+        later.save()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_rejected_move_leaves_visit_and_bookings_unchanged(dentist):
+    """Test that visit moved onto other one isn't saved in autocommit mode and its booking still matches it"""
+    book_visit(dentist, START, START + timedelta(hours=1))
+    later = book_visit(dentist, START + timedelta(hours=1), START + timedelta(hours=2))
+
+    later.scheduled_from = START + timedelta(minutes=30)
+    with pytest.raises(ValidationError):
+        later.save()
+
+    later.refresh_from_db()
+    assert later.scheduled_from == START + timedelta(hours=1)
+    booking = DentistBooking.objects.get(visit=later)
+    assert (booking.scheduled_from, booking.scheduled_to) == (later.scheduled_from, later.scheduled_to)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_rejected_dentist_is_not_added(dentist):
+    """Test that dentist added to overlapping visit in autocommit mode is neither added nor booked"""
+    book_visit(dentist, START, START + timedelta(hours=1))
+    other_dentist = User.objects.create_user(username='other', password='test123', is_dentist=True)
+    other = book_visit(other_dentist, START + timedelta(minutes=30), START + timedelta(minutes=90))
+
+    with pytest.raises(ValidationError):
+        other.dentists.add(dentist)
+
+    assert list(other.dentists.all()) == [other_dentist]
+    assert list(DentistBooking.objects.filter(visit=other).values_list("dentist", flat=True)) == [other_dentist.pk]
+
+
+@pytest.mark.django_db
+def test_removing_dentist_removes_booking(visit, dentist):
+    """Test that bookings follow visit's dentists"""
+    visit.dentists.remove(dentist)
+    assert not DentistBooking.objects.exists()
+
+    visit.dentists.add(dentist)
+    dentist.dentists.clear()
+    assert not DentistBooking.objects.exists()
+
+
+@pytest.mark.django_db
+def test_admin_form_reports_conflict(visit, dentist):
+    """Test that visit form shows clashing visits instead of failing while saving"""
+    form = VisitAdminForm(data={
+        'patient': visit.patient.pk,
+        'service': visit.service.pk,
+        'dentists': [dentist.pk],
+        'scheduled_from': START + timedelta(minutes=15),
+        'scheduled_to': START + timedelta(minutes=45),
+        'visit_status': visit.visit_status.pk,
+        'price': '100.00',
+        'final_price': '100.00',
+    })
+
+    assert not form.is_valid()
+    assert str(visit.eid) in form.errors['dentists'][0]
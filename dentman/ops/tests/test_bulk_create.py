@@ -0,0 +1,79 @@
+import pytest
+
+from dentman.bulk import validated_bulk_create
+from dentman.ops.models import Category, Service, Discount
+
+
+@pytest.fixture
+def category(db):
+    category = Category.objects.create(name="General")
+    Service.objects.create(name="Checkup", category=category)
+    return category
+
+
+@pytest.mark.django_db
+def test_valid_rows_are_created_and_invalid_ones_reported(category):
+    """Test that only valid services are inserted and errors are reported by position in input"""
+    services = [
+        Service(name="Filling", category=category),
+        Service(name="Checkup", category=category), # already in database
+        Service(name="Filling", category=category), # duplicate in batch
+        Service(name="", category=category),
+        Service(name="Scaling", category_id=category.pk + 100),
+        Service(name="Whitening"),
+        Service(name="Bonding", category=category),
+    ]
+
+    result = validated_bulk_create(Service, services)
+
+    assert result.created == 2
+    assert set(Service.objects.values_list("name", flat=True)) == {"Checkup", "Filling", "Bonding"}
+    assert list(result.errors) == [1, 2, 3, 4, 5]
+    assert result.errors[1] == {"name": ["Service with this Service name already exists."]}
+    assert result.errors[2] == {"name": ["Service with this Service name already exists."]}
+    assert "name" in result.errors[3]
+    assert "category" in result.errors[4]
+    assert result.errors[5] == {"category": ["This field cannot be blank."]}
+
+
+@pytest.mark.django_db
+def test_queries_do_not_depend_on_number_of_rows(category, django_assert_max_num_queries):
+    """Test that batch is validated with one query per foreign key and unique field"""
+    services = (Service(name=f"Service {i}", category=category) for i in range(500))
+    with django_assert_max_num_queries(8):
+        result = validated_bulk_create(Service, services, batch_size=500)
+    assert result.created == 500 and not result.errors
+
+
+@pytest.mark.django_db
+def test_batches_and_computed_fields(db):
+    """Test that rows are inserted in batches and fields computed in save() are set"""
+    batches = []
+    discounts = [Discount(name=f"Discount {i}", percent=10, discount_type="promo_code", promotion_code=f" code{i} ")
+                 for i in range(5)]
+
+    result = validated_bulk_create(Discount, discounts, batch_size=2,
+                                   on_batch=lambda created, errors: batches.append(len(created)))
+
+    assert result.created == 5
+    assert batches == [2, 2, 1]
+    discount = Discount.objects.get(name="Discount 3")
+    assert discount.normalized_promotion_code == "CODE3"
+    assert discount.is_currently_valid
+
+
+@pytest.mark.django_db
+def test_promotion_codes_are_unique_after_normalization(db, django_assert_max_num_queries):
+    """Test that normalized promotion codes are checked for the whole batch, also against each other, not per row"""
+    Discount.objects.create(name="Existing", discount_type="promo_code", promotion_code="CODE0")
+    discounts = [Discount(name=f"Discount {i}", discount_type="promo_code", promotion_code=f" code{i % 3} ")
+                 for i in range(30)]
+
+    with django_assert_max_num_queries(5):
+        result = validated_bulk_create(Discount, discounts)
+
+    assert result.created == 2
+    assert set(Discount.objects.values_list("normalized_promotion_code", flat=True)) == {"CODE0", "CODE1", "CODE2"}
+    assert len(result.errors) == 28
+    assert result.errors[0] == {"promotion_code": ["Other discount already has this promotion code"]}
+    assert result.errors[4] == {"promotion_code": ["Other discount already has this promotion code"]}
@@ -0,0 +1,88 @@
+import pytest
+from datetime import datetime, timedelta
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from dentman.man.tests.utils import book_visit
+from dentman.ops.models import Visit, Discount
+
+User = get_user_model()
+
+START = timezone.make_aware(datetime(2030, 1, 7, 10, 0))
+
+
+@pytest.fixture
+def visits(db):
+    """Fixture to create two visits of the same dentist"""
+    dentist = User.objects.create_user(username='dentist', password='test123', is_dentist=True)
+    return [book_visit(dentist, START + timedelta(hours=i), START + timedelta(hours=i, minutes=30)) for i in range(2)]
+
+
+@pytest.fixture
+def discounts(db):
+    """Fixture to create not limited discount and discount which can be used twice"""
+    return (
+        Discount.objects.create(name="Ten", percent=10, discount_type="other"),
+        Discount.objects.create(name="Twice", percent=20, discount_type="other", is_limited=True, limit_value=2),
+    )
+
+
+def counters():
+    return dict(Discount.objects.values_list("name", "used_counter"))
+
+
+@pytest.mark.django_db
+def test_add_remove_and_clear_update_counters(visits, discounts):
+    """Test that adding, removing and clearing discounts of visit updates counters and final price"""
+    visit = visits[0]
+    visit.discounts.add(*discounts)
+    assert counters() == {"Ten": 1, "Twice": 1}
+    assert Visit.objects.get(pk=visit.pk).final_price == Decimal("72.00")
+
+    visit.discounts.remove(discounts[0])
+    assert counters() == {"Ten": 0, "Twice": 1}
+    assert Visit.objects.get(pk=visit.pk).final_price == Decimal("80.00")
+
+    visit.discounts.clear()
+    assert counters() == {"Ten": 0, "Twice": 0}
+    assert Visit.objects.get(pk=visit.pk).final_price == Decimal("100.00")
+
+
+@pytest.mark.django_db
+def test_one_update_per_action(visits, discounts, django_assert_num_queries):
+    """Test that counters of all added discounts are updated with single query"""
+    # existing rows, insert, counters update, discounts for final price, final price update
+    with django_assert_num_queries(5) as context:
+        visits[0].discounts.add(*discounts)
+    updates = [query["sql"] for query in context.captured_queries if 'UPDATE "ops_discount"' in query["sql"]]
+    assert len(updates) == 1
+
+
+@pytest.mark.django_db
+def test_reverse_side_updates_counters(visits, discounts):
+    """Test that adding visits to discount and clearing them counts every visit"""
+    discounts[0].discounts.add(*visits)
+    assert counters()["Ten"] == 2
+    assert set(Visit.objects.values_list("final_price", flat=True)) == {Decimal("90.00")}
+
+    discounts[0].discounts.clear()
+    assert counters()["Ten"] == 0
+    assert set(Visit.objects.values_list("final_price", flat=True)) == {Decimal("100.00")}
+
+
+@pytest.mark.django_db
+def test_limit_is_not_exceeded(visits, discounts):
+    """Test that limited discount can't be used more times than its limit and the change is rolled back"""
+    limited = discounts[1]
+    limited.discounts.add(*visits)
+    third = book_visit(User.objects.get(username='dentist'), START + timedelta(hours=5), START + timedelta(hours=6))
+
+    with pytest.raises(ValidationError) as excinfo, transaction.atomic():
+        third.discounts.add(*discounts)
+
+    assert "Twice" in excinfo.value.message_dict["discounts"][0]
+    assert counters() == {"Ten": 0, "Twice": 2}
+    assert not third.discounts.exists()
@@ -0,0 +1,99 @@
+import pytest
+from datetime import date, timedelta
+from django.core.management import call_command
+
+from dentman.ops.models import Discount, DiscountValidityRun
+from dentman.ops import validity
+from dentman.ops.validity import acquire_scheduler_lock, refresh_discounts_validity
+
+TODAY = date.today()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("is_active", [True, False])
+@pytest.mark.parametrize("valid_since, valid_to", [
+    (None, None),
+    (TODAY + timedelta(days=1), None),
+    (None, TODAY - timedelta(days=1)),
+    (TODAY + timedelta(days=1), TODAY - timedelta(days=1)),
+])
+@pytest.mark.parametrize("is_limited, limit_value, used_counter", [
+    (False, 1, 5),
+    (True, 5, 5),
+    (True, None, 0),
+    (True, 5, 1),
+])
+def test_refresh_matches_save(is_active, valid_since, valid_to, is_limited, limit_value, used_counter):
+    """Test that set-based refresh computes the same flag and summary as saving discount"""
+    discount = Discount.objects.create(name="Discount", discount_type="other", is_active=is_active,
+                                       valid_since=valid_since, valid_to=valid_to, is_limited=is_limited,
+                                       limit_value=limit_value, used_counter=used_counter)
+    expected = (discount.is_currently_valid, discount.why_invalid_summary)
+    Discount.objects.update(is_currently_valid=not discount.is_currently_valid, why_invalid_summary="")
+
+    Discount.objects.refresh_validity(TODAY)
+
+    discount.refresh_from_db()
+    assert (discount.is_currently_valid, discount.why_invalid_summary) == expected
+
+
+@pytest.mark.django_db
+def test_refresh_records_flips():
+    """Test that run records how many discounts changed their state"""
+    expired = Discount.objects.create(name="Expired", discount_type="other", valid_to=TODAY + timedelta(days=1))
+    Discount.objects.create(name="Valid", discount_type="other")
+    Discount.objects.filter(pk=expired.pk).update(valid_to=TODAY - timedelta(days=1))
+
+    run = refresh_discounts_validity()
+    assert (run.became_valid, run.became_invalid) == (0, 1)
+    assert Discount.objects.get(pk=expired.pk).why_invalid_summary == Discount.EXPIRED_REASON
+
+    run = refresh_discounts_validity()
+    assert (run.became_valid, run.became_invalid) == (0, 0)
+    assert DiscountValidityRun.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_refresh_is_constant_number_of_queries(django_assert_num_queries):
+    """Test that refreshing doesn't depend on number of discounts"""
+    for i in range(5):
+        Discount.objects.create(name=f"Discount {i}", discount_type="other")
+    # savepoint, three updates, run insert, release
+    with django_assert_num_queries(6):
+        refresh_discounts_validity()
+
+
+@pytest.mark.django_db
+def test_refresh_command(capsys):
+    """Test management command refreshing validity"""
+    Discount.objects.create(name="Valid", discount_type="other")
+    Discount.objects.update(is_currently_valid=False)
+
+    call_command("refresh_discounts_validity")
+    assert "1 discounts became valid" in capsys.readouterr().out
+    assert Discount.objects.get().is_currently_valid
+
+
+def test_scheduler_is_started_only_when_configured(settings, monkeypatch):
+    """Test that entry points' scheduler is started only with refresh interval set"""
+    started = []
+    monkeypatch.setattr(validity, "start_validity_scheduler", started.append)
+
+    settings.DISCOUNT_VALIDITY_REFRESH_INTERVAL = None
+    validity.start_configured_validity_scheduler()
+    settings.DISCOUNT_VALIDITY_REFRESH_INTERVAL = 300
+    validity.start_configured_validity_scheduler()
+    assert started == [300]
+
+
+def test_only_one_worker_holds_scheduler_lock(tmp_path):
+    """Test that lock of scheduler is held by one worker at a time and released when it exits"""
+    path = str(tmp_path / "scheduler.lock")
+    first = acquire_scheduler_lock(path)
+    assert first is not None
+    assert acquire_scheduler_lock(path) is None
+
+    first.close()
+    second = acquire_scheduler_lock(path)
+    assert second is not None
+    second.close()
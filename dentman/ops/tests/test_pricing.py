@@ -0,0 +1,84 @@
+import pytest
+from datetime import datetime, timedelta
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.utils import timezone
+
+from dentman.man.tests.utils import book_visit
+from dentman.ops.models import Visit, Discount, apply_discounts
+from dentman.ops.pricing import reprice_visits
+
+User = get_user_model()
+
+START = timezone.make_aware(datetime(2030, 1, 7, 10, 0))
+
+
+@pytest.fixture
+def visits(db):
+    """Fixture to create three visits with discounts whose final prices are then broken by bulk update"""
+    dentist = User.objects.create_user(username='dentist', password='test123', is_dentist=True)
+    ten = Discount.objects.create(name="Ten", percent=10, discount_type="other")
+    fifteen = Discount.objects.create(name="Fifteen", percent=15, discount_type="other")
+
+    visits = [book_visit(dentist, START + timedelta(hours=i), START + timedelta(hours=i, minutes=30)) for i in range(3)]
+    visits[0].discounts.add(ten)
+    visits[1].discounts.add(ten, fifteen)
+    Visit.objects.update(final_price=Decimal("1.00"))
+    return visits
+
+
+def test_apply_discounts_rounds_up_after_every_discount():
+    """Test that price is rounded up to hundredths after every discount"""
+    assert apply_discounts(Decimal("99.99"), []) == Decimal("99.99")
+    assert apply_discounts(Decimal("99.99"), [10]) == Decimal("90.00")
+    assert apply_discounts(Decimal("99.99"), [10, 15]) == Decimal("76.50")
+
+
+@pytest.mark.django_db
+def test_reprice_matches_calculate_final_price(visits):
+    """Test that bulk re-pricing gives the same final price as calculating it for a single visit"""
+    result = reprice_visits(chunk_size=2)
+
+    assert result.processed == 3
+    assert result.changed == 3
+    assert result.changes == [] # changes are listed only by dry run
+    for visit in Visit.objects.all():
+        expected = visit.final_price
+        visit.calculate_final_price()
+        assert visit.final_price == expected
+
+
+@pytest.mark.django_db
+def test_dry_run_does_not_write(visits):
+    """Test that dry run reports differences without changing visits"""
+    result = reprice_visits(dry_run=True)
+
+    assert [(change.old_price, change.new_price) for change in result.changes] == [
+        (Decimal("1.00"), Decimal("90.00")), (Decimal("1.00"), Decimal("76.50")), (Decimal("1.00"), Decimal("100.00"))
+    ]
+    assert set(Visit.objects.values_list("final_price", flat=True)) == {Decimal("1.00")}
+
+
+@pytest.mark.django_db
+def test_queries_are_constant_per_chunk(visits, django_assert_num_queries):
+    """Test that every chunk costs visits query, discounts prefetch and one bulk update"""
+    # 3 chunks x (select, prefetch, savepoint, update, release) + final empty select
+    with django_assert_num_queries(16):
+        reprice_visits(chunk_size=1)
+
+
+@pytest.mark.django_db
+def test_reprice_command(visits, capsys):
+    """Test management command printing progress and differences"""
+    call_command("reprice_visits", "--dry-run")
+    output = capsys.readouterr().out
+    assert "Processed 3/3 visits" in output
+    assert f"{visits[1].eid}: 1.00 -> 76.50" in output
+    assert "would be changed" in output
+
+    call_command("reprice_visits")
+    output = capsys.readouterr().out
+    assert f"{visits[1].eid}" not in output
+    assert "Final price of 3 of 3 visits changed" in output
+    assert Visit.objects.get(pk=visits[1].pk).final_price == Decimal("76.50")
@@ -0,0 +1,81 @@
+import pytest
+from datetime import date, timedelta
+from django.core.exceptions import ValidationError
+from django.urls import reverse
+
+from dentman.ops.models import Discount
+from dentman.ops.promo_codes import TTLCache, get_discount_by_promo_code, promo_code_cache
+
+
+@pytest.fixture
+def promo_discount(db):
+    promo_code_cache.clear()
+    return Discount.objects.create(name="Spring", percent=15, discount_type="promo_code", promotion_code=" Spring25 ")
+
+
+def test_ttl_cache_evicts_least_recently_used_and_expired(monkeypatch):
+    """Test that cache keeps at most `maxsize` entries and forgets entries after TTL"""
+    now = [100.0]
+    monkeypatch.setattr("dentman.ops.promo_codes.time.monotonic", lambda: now[0])
+    cache = TTLCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+
+    now[0] += 10
+    assert cache.get("a") is None
+
+
+@pytest.mark.django_db
+def test_code_is_normalized(promo_discount):
+    """Test that code is stored stripped and in upper case for lookups"""
+    assert promo_discount.promotion_code == "Spring25"
+    assert promo_discount.normalized_promotion_code == "SPRING25"
+
+
+@pytest.mark.django_db
+def test_normalized_codes_are_unique(promo_discount):
+    """Test that codes differing only in case can't be used by two discounts"""
+    with pytest.raises(ValidationError) as excinfo:
+        Discount.objects.create(name="Other", discount_type="promo_code", promotion_code="spring25")
+    assert "promotion_code" in excinfo.value.message_dict
+
+
+@pytest.mark.django_db
+def test_lookup_is_cached(promo_discount, django_assert_num_queries):
+    """Test that typed code is resolved case-insensitively and repeated lookups don't hit database"""
+    with django_assert_num_queries(1):
+        assert get_discount_by_promo_code("spring25 ") == promo_discount
+        assert get_discount_by_promo_code("SPRING25") == promo_discount
+    with django_assert_num_queries(1):
+        assert get_discount_by_promo_code("unknown") is None
+        assert get_discount_by_promo_code("unknown") is None
+
+
+@pytest.mark.django_db(transaction=True)
+def test_cache_is_invalidated_after_save(promo_discount):
+    """Test that saving discount clears cached lookups"""
+    assert get_discount_by_promo_code("spring25") == promo_discount
+    promo_discount.is_active = False
+    promo_discount.save()
+    assert get_discount_by_promo_code("spring25") is None
+
+
+@pytest.mark.django_db
+def test_lookup_ignores_stale_validity_flag(promo_discount):
+    """Test that expired discount isn't returned even before its flag is refreshed"""
+    Discount.objects.update(valid_to=date.today() - timedelta(days=1))
+    assert get_discount_by_promo_code("spring25") is None
+
+
+@pytest.mark.django_db
+def test_promo_code_endpoint(promo_discount, admin_client):
+    """Test JSON endpoint checking promotion codes"""
+    response = admin_client.get(reverse("check_promo_code", args=["spring25"]))
+    assert response.status_code == 200
+    assert response.json() == {"id": promo_discount.pk, "name": "Spring", "percent": 15, "promotion_code": "SPRING25"}
+
+    response = admin_client.get(reverse("check_promo_code", args=["nope"]))
+    assert response.status_code == 404
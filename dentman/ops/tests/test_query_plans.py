@@ -0,0 +1,62 @@
+import pytest
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.utils import timezone
+
+from dentman.man.tests.utils import assert_index_used
+from dentman.ops.models import Visit, Discount
+
+User = get_user_model()
+
+
+@pytest.mark.django_db
+def test_agenda_query_uses_scheduled_from_index():
+    """Test that agenda of visits in time range uses index on `scheduled_from`"""
+    now = timezone.now()
+    assert_index_used(Visit.objects.filter(scheduled_from__range=(now, now + timedelta(days=1))), "ops_visit_sched_from_idx")
+
+
+@pytest.mark.django_db
+def test_patient_visits_query_uses_composite_index():
+    """Test that patient's visits ordered by time use (patient, scheduled_from) index"""
+    patient = User.objects.create_user(username="patient", password="test123")
+    queryset = Visit.objects.filter(patient=patient, scheduled_from__gte=timezone.now()).order_by("scheduled_from")
+    assert_index_used(queryset, "ops_visit_patient_sched_idx")
+
+
+@pytest.mark.django_db
+def test_visit_status_query_uses_composite_index():
+    """Test that visits filtered by status and time use (visit_status, scheduled_from) index"""
+    queryset = Visit.objects.filter(visit_status_id=1, scheduled_from__gte=timezone.now())
+    assert_index_used(queryset, "ops_visit_status_sched_idx")
+
+
+def unique_index_name(model, field_name: str) -> str:
+    """Name of index created for unique field (SQLite's autoindex or index of PostgreSQL's unique constraint)"""
+    table, column = model._meta.db_table, model._meta.get_field(field_name).column
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute("SELECT name FROM pragma_index_list(%s) WHERE \"unique\" AND origin = 'u'", [table])
+            for name, in cursor.fetchall():
+                cursor.execute("SELECT name FROM pragma_index_info(%s)", [name])
+                if [column for column, in cursor.fetchall()] == [column]:
+                    return name
+        else:
+            for name, info in connection.introspection.get_constraints(cursor, table).items():
+                if info["unique"] and not info["primary_key"] and info["columns"] == [column]:
+                    return name
+    raise AssertionError(f"No unique index of {table}.{column}")
+
+
+@pytest.mark.django_db
+def test_visit_eid_lookup_uses_unique_index():
+    """Test that lookup by `eid` uses unique index"""
+    index_name = unique_index_name(Visit, "eid")
+    assert_index_used(Visit.objects.filter(eid="0b7a3a52-5b4f-4a5e-9a8e-8d6f0c7f3b11"), index_name)
+
+
+@pytest.mark.django_db
+def test_promotion_code_lookup_uses_index():
+    """Test that lookup by promotion code uses index"""
+    assert_index_used(Discount.objects.filter(normalized_promotion_code="SAVE5"), "ops_discount_norm_promo_idx")
@@ -0,0 +1,7 @@
+from django.urls import path
+
+from dentman.ops import views
+
+urlpatterns = [
+    path('promo-codes/<str:code>/', views.check_promo_code, name='check_promo_code'),
+]
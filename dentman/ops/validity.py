@@ -0,0 +1,90 @@
+"""
+Periodic refresh of discounts' validity.
+
+`Discount.is_currently_valid` is computed in `Discount.save`, so discounts whose dates have passed (or which reached
+their limit by usage counting) keep the old flag until somebody saves them. `refresh_discounts_validity` recomputes the
+flag for all discounts with a few UPDATE statements and records the run in `DiscountValidityRun`. It's run by
+`refresh_discounts_validity` management command (e.g. from cron) or by in-process scheduler started by ASGI/WSGI entry
+points (not by management commands) when `settings.DISCOUNT_VALIDITY_REFRESH_INTERVAL` is set. Every worker of the
+server starts its scheduler, but only the one holding lock file (`SCHEDULER_LOCK_PATH`) refreshes; others take the lock
+over when that worker exits.
+"""
+import fcntl
+import logging
+import os
+import tempfile
+import threading
+from typing import IO
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from dentman.ops.models import Discount, DiscountValidityRun
+from dentman.ops.promo_codes import promo_code_cache
+
+logger = logging.getLogger(__name__)
+
+_scheduler = None
+
+SCHEDULER_LOCK_PATH = os.path.join(tempfile.gettempdir(), "dentman-discounts-validity.lock")
+
+
+def refresh_discounts_validity() -> DiscountValidityRun:
+    """Function to recompute validity of all discounts and to record how many of them flipped state"""
+    started_at = timezone.now()
+    with transaction.atomic():
+        became_valid, became_invalid = Discount.objects.refresh_validity()
+        run = DiscountValidityRun.objects.create(
+            started_at=started_at, finished_at=timezone.now(), became_valid=became_valid, became_invalid=became_invalid
+        )
+    if became_valid or became_invalid:
+        promo_code_cache.clear()
+    return run
+
+
+def acquire_scheduler_lock(path: str = SCHEDULER_LOCK_PATH) -> IO | None:
+    """Lock file held by the process whose scheduler refreshes validity (None if other process holds it)"""
+    lock = open(path, "a")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock.close()
+        return None
+    return lock
+
+
+def _run_periodically(interval: float, stopped: threading.Event) -> None:
+    lock = None
+    while not stopped.wait(interval):
+        lock = lock or acquire_scheduler_lock()
+        if lock is None:
+            continue # other worker refreshes validity
+        try:
+            run = refresh_discounts_validity()
+            logger.info(str(run))
+        except Exception:
+            logger.exception("Refreshing discounts' validity has failed")
+        finally:
+            close_old_connections()
+
+
+def start_validity_scheduler(interval: float) -> threading.Event:
+    """
+    Start daemon thread refreshing discounts' validity every `interval` seconds (only once per process). Returns event
+    which stops the thread when set.
+    """
+    global _scheduler
+    if _scheduler is None:
+        stopped = threading.Event()
+        thread = threading.Thread(target=_run_periodically, args=(interval, stopped), name="discounts-validity",
+                                  daemon=True)
+        thread.start()
+        _scheduler = stopped
+    return _scheduler
+
+
+def start_configured_validity_scheduler() -> None:
+    """Start scheduler if `settings.DISCOUNT_VALIDITY_REFRESH_INTERVAL` is set (called only by ASGI/WSGI entry points)"""
+    if settings.DISCOUNT_VALIDITY_REFRESH_INTERVAL:
+        start_validity_scheduler(settings.DISCOUNT_VALIDITY_REFRESH_INTERVAL)
@@ -1,3 +1,21 @@
-from django.shortcuts import render
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
 
-# Create your views here.
+from dentman.ops.promo_codes import get_discount_by_promo_code
+
+
+@require_GET
+def check_promo_code(request, code: str) -> JsonResponse:
+    """
+    Function to check typed promotion code. Returns discount's data if code belongs to currently valid discount and 404
+    otherwise. Due to login_required middleware only logged-in users can check codes.
+    """
+    discount = get_discount_by_promo_code(code)
+    if discount is None:
+        return JsonResponse({"error": "Promotion code is invalid"}, status=404)
+    return JsonResponse({
+        "id": discount.pk,
+        "name": discount.name,
+        "percent": discount.percent,
+        "promotion_code": discount.normalized_promotion_code,
+    })
@@ -0,0 +1,29 @@
+"""
+Normalization of phone numbers typed in any format, used to compute `User.phone_digits` and to identify callers (see
+`dentman.app.phones`). The module doesn't import models, so models can use it without circular imports.
+"""
+import re
+
+from django.conf import settings
+
+
+def normalize_phone_number(number: str | None) -> str | None:
+    """
+    Function to normalize phone number typed in any format to E.164 digits (country code and subscriber number without
+    '+'), e.g. "+48 600-100-200", "0048600100200" and "600 100 200" give "48600100200" (with default country code 48).
+    Numbers without '+' or '00' prefix of at most 10 digits (after trunk prefix '0') are national ones and get
+    `settings.PHONE_DEFAULT_COUNTRY_CODE`. Returns None for number without digits or too long for E.164.
+    """
+    number = (number or "").strip()
+    digits = re.sub(r"\D", "", number)
+    if number.startswith("+"):
+        pass
+    elif digits.startswith("00"):
+        digits = digits[2:]
+    else:
+        digits = digits.removeprefix("0")
+        if digits and len(digits) <= 10:
+            digits = settings.PHONE_DEFAULT_COUNTRY_CODE + digits
+    if not digits or len(digits) > 15:
+        return None
+    return digits
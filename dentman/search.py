@@ -0,0 +1,220 @@
+"""
+Search of people (users and records pointing to them, e.g. workers or bonuses) in admins.
+
+Searching with `search_fields` means `icontains` over every searched column (also of joined tables), which can't use any
+index - on large base of patients every search is a sequential scan. Instead, every user keeps `User.search_document`:
+username, names, e-mail and phone number in lower case without diacritics (see `build_search_document`),
+computed on save like other computed fields, so it's also set by bulk creation. The document is indexed depending on
+database:
+1) PostgreSQL - GIN index of `to_tsvector('simple', ...)` (words' prefixes, e.g. "ann" finds "Anna") and GIN trigram
+index of pg_trgm (any fragment, e.g. part of phone number or e-mail); user matches if every searched word is a prefix
+of a word of the document or is contained in it. Results are ranked by `ts_rank` and `word_similarity`.
+2) SQLite - FTS5 table `app_user_search` with external content kept in sync by triggers; every searched word has to be
+a prefix of a word of the document. Results are ranked by bm25.
+3) other databases - every word is looked up with `LIKE` in the document (no index, but one column instead of many).
+
+Indexes are created by migration and - because SQLite drops triggers when table is rebuilt by later migrations - are
+installed again (if they are missing) after every `migrate` (see `install_search_index`).
+
+`PeopleSearchMixin` plugs the search into admins: searched fields of users (also through relations, e.g.
+`worker__user__first_name`) are replaced with search in documents, other searched fields are searched as usual. Like
+in `ModelAdmin` every word of searched text has to be found in any of searched fields or in the users' document.
+"""
+import re
+import unicodedata
+from functools import cached_property
+
+from django.contrib.admin.utils import get_fields_from_path, lookup_spawns_duplicates
+from django.contrib.admin.views.main import ORDER_VAR
+from django.db import connection as default_connection
+from django.db.models import BooleanField, F, FloatField, Func, Model, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce, Greatest
+from django.utils.text import smart_split, unescape_string_literal
+
+# fields of user which are put into search document (searching them in admins is done with the document)
+SEARCH_DOCUMENT_FIELDS = ("username", "first_name", "last_name", "email", "phone_number")
+
+SQLITE_INDEX = "app_user_search"
+POSTGRESQL_STATEMENTS = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS app_user_search_trgm_idx ON app_user USING gin (search_document gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS app_user_search_fts_idx ON app_user USING gin (to_tsvector('simple', search_document))",
+]
+SQLITE_STATEMENTS = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_INDEX} USING fts5(
+        search_document, content='app_user', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SQLITE_INDEX}_insert AFTER INSERT ON app_user BEGIN
+        INSERT INTO {SQLITE_INDEX}(rowid, search_document) VALUES (new.id, new.search_document);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SQLITE_INDEX}_delete AFTER DELETE ON app_user BEGIN
+        INSERT INTO {SQLITE_INDEX}({SQLITE_INDEX}, rowid, search_document)
+        VALUES ('delete', old.id, old.search_document);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SQLITE_INDEX}_update AFTER UPDATE OF search_document ON app_user BEGIN
+        INSERT INTO {SQLITE_INDEX}({SQLITE_INDEX}, rowid, search_document)
+        VALUES ('delete', old.id, old.search_document);
+        INSERT INTO {SQLITE_INDEX}(rowid, search_document) VALUES (new.id, new.search_document);
+    END""",
+]
+SQLITE_TRIGGERS = {f"{SQLITE_INDEX}_insert", f"{SQLITE_INDEX}_delete", f"{SQLITE_INDEX}_update"}
+
+
+def normalize_search_text(text: str | None) -> str:
+    """Function to bring text to the form it's searched in: lower case without diacritics ("Żak" -> "zak")"""
+    text = (text or "").lower().replace("ł", "l")
+    return "".join(char for char in unicodedata.normalize("NFKD", text) if not unicodedata.combining(char))
+
+
+def build_search_document(user: Model) -> str:
+    """
+    Function to build text by which user is found: user's `SEARCH_DOCUMENT_FIELDS` and phone number's digits (national
+    and normalized ones), so number is found whatever separators are typed
+    """
+    values = [getattr(user, field_name) for field_name in SEARCH_DOCUMENT_FIELDS]
+    values += [re.sub(r"\D", "", user.phone_number or ""), user.phone_digits]
+    return " ".join(normalize_search_text(value) for value in values if value)
+
+
+def install_search_index(connection) -> None:
+    """
+    Function to create indexes of search documents for the database of connection (if they don't exist). SQLite's
+    index is rebuilt from documents when any of its triggers was missing, as changes could have been missed meanwhile.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            for statement in POSTGRESQL_STATEMENTS:
+                cursor.execute(statement)
+        elif connection.vendor == "sqlite":
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'app_user'")
+            if SQLITE_TRIGGERS <= {name for name, in cursor.fetchall()}:
+                return
+            for statement in SQLITE_STATEMENTS:
+                cursor.execute(statement)
+            cursor.execute(f"INSERT INTO {SQLITE_INDEX}({SQLITE_INDEX}) VALUES ('rebuild')")
+
+
+def uninstall_search_index(connection) -> None:
+    """Function to drop indexes of search documents"""
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("DROP INDEX IF EXISTS app_user_search_trgm_idx")
+            cursor.execute("DROP INDEX IF EXISTS app_user_search_fts_idx")
+        elif connection.vendor == "sqlite":
+            for trigger in sorted(SQLITE_TRIGGERS):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+            cursor.execute(f"DROP TABLE IF EXISTS {SQLITE_INDEX}")
+
+
+class _TsVector(Func):
+    template = "to_tsvector('simple', %(expressions)s)"
+
+
+class _TsQuery(Func):
+    template = "to_tsquery('simple', %(expressions)s)"
+
+
+class _TsMatch(Func):
+    template = "(%(expressions)s)"
+    arg_joiner = " @@ "
+    output_field = BooleanField()
+
+
+class _SQLiteRank(Func):
+    """Rank (negated bm25, the higher the better) of user in SQLite's index for query, NULL if user doesn't match"""
+    template = f"(SELECT -rank FROM {SQLITE_INDEX} WHERE {SQLITE_INDEX} MATCH %%s AND rowid = %(expressions)s)"
+    output_field = FloatField()
+
+    def __init__(self, user_id, query: str):
+        super().__init__(user_id)
+        self.query = query
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sql, params = super().as_sql(compiler, connection, **extra_context)
+        return sql, (self.query, *params)
+
+
+def search_words(term: str) -> list[str]:
+    """Words of searched text in the form they are kept in documents"""
+    return re.findall(r"\w+", normalize_search_text(term))
+
+
+def people_search(term: str, path: str = "", connection=default_connection) -> tuple[Q, Func] | None:
+    """
+    Function to build condition and rank of search of users reachable from model by `path` (e.g. "worker__user" for
+    bonuses, "" for users themselves). Returns None if term has no words.
+    """
+    words = search_words(term)
+    if not words:
+        return None
+    prefix = f"{path}__" if path else ""
+    document = F(f"{prefix}search_document")
+
+    if connection.vendor == "postgresql":
+        query = Value(" & ".join(f"{word}:*" for word in words))
+        contained = Q(*(Q(**{f"{prefix}search_document__contains": word}) for word in words))
+        condition = Q(_TsMatch(_TsVector(document), _TsQuery(query))) | contained
+        rank = (Func(_TsVector(document), _TsQuery(query), function="ts_rank", output_field=FloatField())
+                + Func(Value(" ".join(words)), document, function="word_similarity", output_field=FloatField()))
+    elif connection.vendor == "sqlite":
+        query = " ".join(f'"{word}"*' for word in words)
+        matching = RawSQL(f"SELECT rowid FROM {SQLITE_INDEX} WHERE {SQLITE_INDEX} MATCH %s", (query, ))
+        condition = Q(**{f"{path or 'pk'}__in": matching})
+        rank = _SQLiteRank(F(path or "pk"), query)
+    else:
+        condition = Q(*(Q(**{f"{prefix}search_document__contains": word}) for word in words))
+        rank = Value(0.0)
+    return condition, rank
+
+
+class PeopleSearchMixin:
+    """
+    ModelAdmin's mixin replacing search in users' fields (`SEARCH_DOCUMENT_FIELDS`) of `search_fields` - of the model
+    itself if it's user or through relations, e.g. `worker__user__last_name` - with indexed search in users' documents.
+    Results are ordered by rank, unless other order is chosen in changelist.
+    """
+
+    @cached_property
+    def people_search_paths(self) -> tuple[list[str], list[str]]:
+        """Paths from model to users whose fields are searched and the remaining searched fields"""
+        from dentman.app.models import User
+
+        paths, other_fields = [], []
+        for search_field in self.search_fields:
+            *path, field_name = search_field.split("__")
+            path = "__".join(path)
+            target = get_fields_from_path(self.model, path)[-1].related_model if path else self.model
+            if field_name in SEARCH_DOCUMENT_FIELDS and target is User:
+                if path not in paths:
+                    paths.append(path)
+            else:
+                other_fields.append(search_field)
+        return paths, other_fields
+
+    def get_search_results(self, request, queryset, search_term):
+        paths, other_fields = self.people_search_paths
+        searches = [search for path in paths if (search := people_search(search_term, path)) is not None]
+        if not searches:
+            return super().get_search_results(request, queryset, search_term)
+
+        lookups = {"^": "istartswith", "=": "iexact", "@": "search"}
+        orm_lookups = [f"{field[1:]}__{lookups[field[0]]}" if field[0] in lookups else f"{field}__icontains"
+                       for field in other_fields]
+        condition = Q()
+        for bit in smart_split(search_term):
+            # like in ModelAdmin every word has to match any searched field, users' documents are one more alternative
+            if bit.startswith(('"', "'")) and bit[0] == bit[-1]:
+                bit = unescape_string_literal(bit)
+            bit_condition = Q.create([(lookup, bit) for lookup in orm_lookups], connector=Q.OR)
+            for path in paths:
+                if (search := people_search(bit, path)) is not None:
+                    bit_condition |= search[0]
+            condition &= bit_condition
+        may_have_duplicates = any(lookup_spawns_duplicates(self.opts, field) for field in other_fields)
+
+        ranks = [Coalesce(rank, 0.0) for _, rank in searches]
+        queryset = queryset.filter(condition).annotate(search_rank=ranks[0] if len(ranks) == 1 else Greatest(*ranks))
+        if ORDER_VAR not in request.GET: # order chosen in changelist is already set by changelist
+            queryset = queryset.order_by("-search_rank", "-pk")
+        return queryset, may_have_duplicates
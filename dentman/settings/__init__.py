@@ -155,6 +155,26 @@ MEDIA_ROOT = ROOT_DIR / 'pub/m/'
 
 STORAGE_URL = '/storage/'
 STORAGE_ROOT = ROOT_DIR / 'storage/'
+# How views send files from storage after checking permissions: 'django' streams them from Python (development),
+# 'nginx' returns only `X-Accel-Redirect` header and nginx sends the file from internal location (mapped to
+# STORAGE_ROOT) set in `FILE_DELIVERY_INTERNAL_URL`
+FILE_DELIVERY_BACKEND = env("FILE_DELIVERY_BACKEND", default="") or "django"
+FILE_DELIVERY_INTERNAL_URL = '/protected-storage/'
+# files streamed by Django under ASGI are read by chunks of this size in a pool of this many threads
+FILE_STREAM_CHUNK_SIZE = 64 * 1024
+FILE_STREAM_THREADS = 4
+# store attachments' files by hash of their content, so the same file attached many times is kept once
+CONTENT_ADDRESSED_ATTACHMENTS = env.bool("CONTENT_ADDRESSED_ATTACHMENTS", default=False)
+# sizes (in pixels, of longer side) and formats of images' variants which can be requested with `?size=...&format=...`
+IMAGE_VARIANT_SIZES = (64, 128, 400, 800)
+IMAGE_VARIANT_FORMATS = ("jpeg", "webp", "png")
+# uploaded images (profile photos, posts' main photos) are downscaled to fit this size (in pixels, of longer side),
+# stripped of metadata and encoded to this format ('webp', 'avif', 'jpeg', 'png' or None to keep their own format)
+IMAGE_UPLOAD_MAX_SIZE = 2048
+IMAGE_UPLOAD_FORMAT = "webp"
+IMAGE_UPLOAD_QUALITY = 82
+# how long (in seconds) signed links to contract scans generated in admin are valid
+CONTRACT_URL_MAX_AGE = 300
 
 
 # Default primary key field type
@@ -183,6 +203,23 @@ LOGGING = {
     },
 }
 
+# Scheduling
+# how many days ahead (including today) workers' daily availability is materialized
+AVAILABILITY_HORIZON_DAYS = 90
+# how often (in seconds) discounts' validity is refreshed by scheduler running inside the serving process (started by
+# ASGI/WSGI entry points, not by management commands; of many workers only one refreshes at a time); None disables it
+# (then run `refresh_discounts_validity` command periodically instead)
+DISCOUNT_VALIDITY_REFRESH_INTERVAL = env.int("DISCOUNT_VALIDITY_REFRESH_INTERVAL", default=None)
+
+# Discounts
+# how many promotion codes are cached in every process and for how long (in seconds)
+PROMO_CODE_CACHE_SIZE = 256
+PROMO_CODE_CACHE_TTL = 60
+
+# Patients
+# country code (without '+') of phone numbers typed without it, used to normalize them for lookup by phone
+PHONE_DEFAULT_COUNTRY_CODE = "48"
+
 LOGIN_URL = '/admin/login/'
 LOGOUT_URL = '/admin/logout/'
 
@@ -4,7 +4,11 @@ from . import (
     INSTALLED_APPS, LANGUAGE_CODE, LOGGING, MEDIA_ROOT, MEDIA_URL,
     MIDDLEWARE, ROOT_DIR, ROOT_URLCONF, SECRET_KEY, SECURE_PROXY_SSL_HEADER,
     STATIC_ROOT, STATIC_URL, STORAGE_ROOT, STORAGE_URL, TEMPLATES, TIME_ZONE, USE_I18N, USE_TZ, WSGI_APPLICATION,
-    STATICFILES_DIRS, LOGIN_URL, LOGOUT_URL
+    STATICFILES_DIRS, LOGIN_URL, LOGOUT_URL, AVAILABILITY_HORIZON_DAYS,
+    DISCOUNT_VALIDITY_REFRESH_INTERVAL, PROMO_CODE_CACHE_SIZE, PROMO_CODE_CACHE_TTL, FILE_DELIVERY_BACKEND,
+    FILE_DELIVERY_INTERNAL_URL, CONTENT_ADDRESSED_ATTACHMENTS, IMAGE_VARIANT_SIZES, IMAGE_VARIANT_FORMATS,
+    CONTRACT_URL_MAX_AGE, FILE_STREAM_CHUNK_SIZE, FILE_STREAM_THREADS,
+    IMAGE_UPLOAD_MAX_SIZE, IMAGE_UPLOAD_FORMAT, IMAGE_UPLOAD_QUALITY, PHONE_DEFAULT_COUNTRY_CODE
 )
 
 DEBUG = True
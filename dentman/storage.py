@@ -1,5 +1,11 @@
+import hashlib
+import os
+import tempfile
+
 from django.core.files.storage import FileSystemStorage
 from django.conf import settings
+from django.db import transaction
+from django.db.models import F
 from django.utils.deconstruct import deconstructible
 
 
@@ -12,4 +18,76 @@ class CustomFileSystemStorage(FileSystemStorage):
             'location': location, # setting custom location
             'base_url': base_url, # setting base_url for files stored there
         })
-        super(CustomFileSystemStorage, self).__init__(**kwargs)
\ No newline at end of file
+        super(CustomFileSystemStorage, self).__init__(**kwargs)
+
+@deconstructible
+class ContentAddressedStorage(CustomFileSystemStorage):
+    """
+    Storage keeping every distinct content only once. While saving, the file is streamed into a temporary file and
+    hashed with SHA-256; it's stored under `blobs/<2 chars>/<2 chars>/<hash><extension>` and the same content uploaded
+    again only increases the number of references kept in `StoredBlob` model. Deleting decreases that number and the
+    file is removed (after commit) when the last reference goes.
+
+    Files which don't have `StoredBlob` row (saved before this storage has been used) are deleted as usual.
+    """
+    blobs_dir = "blobs"
+    temp_dir = ".tmp"
+
+    def blob_name(self, digest: str, name: str) -> str:
+        """Name of blob with the given SHA-256 hash; extension of original name is kept for validators and mimetypes"""
+        extension = os.path.splitext(name)[1].lower()
+        return f"{self.blobs_dir}/{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+
+    def get_available_name(self, name, max_length=None):
+        # names are derived from content, so existing files are never overwritten with anything else
+        return name
+
+    def _save(self, name, content):
+        from dentman.app.models import StoredBlob
+
+        temp_dir = os.path.join(self.location, self.temp_dir)
+        os.makedirs(temp_dir, exist_ok=True)
+
+        digest, size = hashlib.sha256(), 0
+        fd, temp_path = tempfile.mkstemp(dir=temp_dir)
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+                    size += len(chunk)
+
+            name = self.blob_name(digest.hexdigest(), name)
+            with transaction.atomic():
+                blob, _ = StoredBlob.objects.select_for_update().get_or_create(
+                    name=name, defaults={"digest": digest.hexdigest(), "size": size}
+                )
+                full_path = self.path(name)
+                if not os.path.exists(full_path):
+                    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                    os.replace(temp_path, full_path)
+                    if self.file_permissions_mode is not None:
+                        os.chmod(full_path, self.file_permissions_mode)
+                StoredBlob.objects.filter(pk=blob.pk).update(references=F("references") + 1)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return name
+
+    def delete(self, name):
+        from dentman.app.models import StoredBlob
+
+        if not name:
+            raise ValueError("The name must be given to delete().")
+        with transaction.atomic():
+            if StoredBlob.objects.filter(name=name, references__gt=1).update(references=F("references") - 1):
+                return
+            StoredBlob.objects.filter(name=name).delete()
+            transaction.on_commit(lambda: self._delete_unreferenced(name))
+
+    def _delete_unreferenced(self, name):
+        from dentman.app.models import StoredBlob
+
+        # the same content could have been uploaded again before commit
+        if not StoredBlob.objects.filter(name=name).exists():
+            super().delete(name)
@@ -0,0 +1,155 @@
+"""
+Garbage collection of files in storage which aren't referenced by any model.
+
+Files get stuck in `temp` directories when saving fails between upload and relocation, and can leak when deleting
+misses them. Storage directories of file fields are walked with `os.scandir` (only directories waiting to be scanned are
+kept in memory) and found files are checked against the database in batches - one `IN` query per file field using the
+storage - so memory use doesn't depend on the number of files or rows. Files modified within the grace period are never
+touched, so uploads in progress are safe. Directories can be scanned by many threads.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import timedelta
+from itertools import batched
+from typing import Callable, Iterable, Iterator
+
+from django.apps import apps
+from django.db import connections
+from django.utils import timezone
+
+from dentman.images import VARIANTS_DIR
+
+# file fields whose files are kept in storage; each one is checked when scanning its storage's directory
+FILE_FIELDS = [
+    ("app.Attachment", "file"),
+    ("app.User", "profile_photo"),
+    ("man.Employment", "contract_scan"),
+    ("ops.Post", "main_photo"),
+]
+
+
+@dataclass
+class StorageRoot:
+    """Directory of storage with file fields which keep names relative to it"""
+    location: str
+    fields: list = field(default_factory=list)
+
+    def name(self, path: str) -> str:
+        return os.path.relpath(path, self.location).replace(os.sep, "/")
+
+
+@dataclass
+class GarbageReport:
+    """Summary of garbage collection"""
+    orphans: int = 0
+    size: int = 0
+    deleted: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, size: int, deleted: bool) -> None:
+        with self._lock:
+            self.orphans += 1
+            self.size += size
+            self.deleted += deleted
+
+
+def storage_roots() -> list[StorageRoot]:
+    """Directories of storages used by `FILE_FIELDS` (fields sharing storage's location share the root)"""
+    roots = {}
+    for label, field_name in FILE_FIELDS:
+        model = apps.get_model(label)
+        location = os.path.abspath(model._meta.get_field(field_name).storage.location)
+        roots.setdefault(location, StorageRoot(location)).fields.append((model, field_name))
+    return list(roots.values())
+
+
+def iter_old_files(directory: str, skip_dirs: set[str], older_than: float, recursive: bool = True) -> Iterator[str]:
+    """Paths of files under `directory` modified before `older_than` timestamp (directories in `skip_dirs` are skipped)"""
+    stack = [directory]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive and entry.path not in skip_dirs:
+                        stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False) and entry.stat(follow_symlinks=False).st_mtime < older_than:
+                    yield entry.path
+
+
+def _is_live_variant(path: str) -> bool:
+    # image variants (`<dir>/.variants/<filename>.<size>.<format>`) are kept as long as the original exists
+    directory, filename = os.path.split(path)
+    if os.path.basename(directory) != VARIANTS_DIR:
+        return False
+    return os.path.exists(os.path.join(os.path.dirname(directory), filename.rsplit(".", 2)[0]))
+
+
+def find_orphans(root: StorageRoot, paths: Iterable[str], batch_size: int = 1000) -> Iterator[str]:
+    """Paths of files from `paths` which aren't referenced by any field using the root's storage"""
+    for batch in batched(paths, batch_size):
+        names = {root.name(path): path for path in batch}
+        referenced = set()
+        for model, field_name in root.fields:
+            referenced.update(
+                model._default_manager.filter(**{f"{field_name}__in": names.keys()}).values_list(field_name, flat=True)
+            )
+        for name, path in names.items():
+            if name not in referenced and not _is_live_variant(path):
+                yield path
+
+
+def collect_garbage(delete: bool = False, grace: timedelta = timedelta(hours=24), batch_size: int = 1000,
+                    workers: int = 1, on_orphan: Callable[[str, int], None] | None = None) -> GarbageReport:
+    """
+    Function to find (and with `delete` remove) files in storages which aren't referenced by any file field and are
+    older than `grace`. With more `workers` top-level directories of storages are scanned in parallel threads.
+    `on_orphan` is called with path and size of every orphan.
+    """
+    roots = storage_roots()
+    locations = {root.location for root in roots}
+    older_than = (timezone.now() - grace).timestamp()
+    report = GarbageReport()
+
+    def scan(root: StorageRoot, directory: str, recursive: bool = True) -> None:
+        try:
+            paths = iter_old_files(directory, locations, older_than, recursive)
+            for path in find_orphans(root, paths, batch_size):
+                try:
+                    size = os.path.getsize(path)
+                    if delete:
+                        os.remove(path)
+                except FileNotFoundError:
+                    continue
+                report.add(size, delete)
+                if on_orphan is not None:
+                    on_orphan(path, size)
+        finally:
+            if threading.current_thread() is not threading.main_thread():
+                connections.close_all()
+
+    if workers <= 1:
+        for root in roots:
+            scan(root, root.location)
+        return report
+
+    # every top-level directory is a separate task; files lying directly in root are one more task
+    tasks = []
+    for root in roots:
+        if not os.path.isdir(root.location):
+            continue
+        tasks.append((root, root.location, False))
+        with os.scandir(root.location) as entries:
+            tasks.extend(
+                (root, entry.path, True) for entry in entries
+                if entry.is_dir(follow_symlinks=False) and entry.path not in locations
+            )
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for future in [executor.submit(scan, *task) for task in tasks]:
+            future.result()
+    return report
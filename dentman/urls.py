@@ -6,6 +6,7 @@ from . import views
 urlpatterns = [
     path('app/', include('dentman.app.urls')),
     path('man/', include('dentman.man.urls')),
+    path('ops/', include('dentman.ops.urls')),
     path('admin/', admin.site.urls),
     path('storage/<path:file_path>', views.get_file, name="get_file"),
 ]
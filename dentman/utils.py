@@ -1,9 +1,22 @@
 import re
 import os
+import errno
+import shutil
 
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
 from django.db.models.fields.files import FieldFile
-from django.http.response import HttpResponseBase, FileResponse, HttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpRequest
+from django.http.response import HttpResponseBase, HttpResponse
+from django.db import transaction
 from django.db.models import Model
+from django.utils._os import safe_join
+
+from dentman.files import file_response, run_in_reader_pool
+from dentman.images import get_image_variant, delete_image_variants, normalize_image
+
 
 def get_upload_path(instance: Model, filename: str, with_class_name: bool=False) -> str:
     """
@@ -37,27 +50,126 @@ def get_upload_path_with_class(instance: Model, filename: str) -> str:
     return get_upload_path(instance, filename, with_class_name=True)
 
 
+def relocate_file(instance: Model, field_name: str, new_name: str) -> None:
+    """
+    Function to move file of instance's file field (e.g. from temporary directory after the first save) to `new_name`.
+
+    Moving is deferred until the transaction is committed, so a rolled back save doesn't move anything. On local
+    filesystem the file is renamed with `os.replace` (or copied by chunks and removed if source and destination are on
+    different filesystems); other storages copy it through storage API. New name is written with queryset `update()`,
+    so the model isn't saved (and validated) again.
+    """
+    field_file = getattr(instance, field_name)
+    old_name = field_file.name
+    if not old_name or old_name == new_name:
+        return
+
+    def move():
+        storage = field_file.storage
+        if field_file.name != old_name or not storage.exists(old_name):
+            return # already moved (instance was saved more times in the transaction)
+        try:
+            old_path = storage.path(old_name)
+        except NotImplementedError:
+            with storage.open(old_name) as file:
+                final_name = storage.save(new_name, file)
+            storage.delete(old_name)
+        else:
+            final_name = storage.get_available_name(new_name)
+            new_path = storage.path(final_name)
+            os.makedirs(os.path.dirname(new_path), exist_ok=True)
+            try:
+                os.replace(old_path, new_path)
+            except OSError as error:
+                if error.errno != errno.EXDEV:
+                    raise
+                with open(old_path, "rb") as source, open(new_path, "wb") as destination:
+                    shutil.copyfileobj(source, destination, length=1024 * 1024)
+                os.remove(old_path)
+
+        type(instance)._default_manager.filter(pk=instance.pk).update(**{field_name: final_name})
+        field_file.name = final_name
+        if hasattr(instance, "mark_unchanged"): # new name is already in database (see `DirtyFieldsMixin`)
+            instance.mark_unchanged(field_name)
+
+    transaction.on_commit(move)
+
+
 def delete_old_file(old_file: FieldFile) -> None:
     """
     Function to delete old file from storage.
     As argument gets file from FileField or image from ImageField
 
-    If this file exists then we get storage in which is this file and delete it
+    File is deleted by its storage, so storages sharing files (e.g. `ContentAddressedStorage`) can keep it if it's
+    still used somewhere else. Cached resized variants of deleted image are deleted as well
     """
-    if old_file.name != "":
+    if old_file.name:
         storage = old_file.storage
-        file_path = str(storage.base_location) + f"/{old_file.name}"
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        storage.delete(old_file.name)
+        # cached image variants are kept next to original, so they are removed once the original is gone
+        try:
+            if not storage.exists(old_file.name):
+                delete_image_variants(storage.path(old_file.name))
+        except NotImplementedError:
+            pass # storage without local files (no variants)
 
 
-def return_file_in_response(storage_root: str, file_path: str) -> HttpResponseBase:
+def normalize_uploaded_image(instance: Model, field_name: str) -> None:
+    """
+    Function to replace newly uploaded (not yet stored) image of instance's image field with its normalized version
+    (see `dentman.images.normalize_image`), so only the downscaled file without metadata is written to storage. Files
+    which aren't images are left untouched.
+    """
+    field_file = getattr(instance, field_name)
+    if not field_file or field_file._committed:
+        return
+    field_file.file.seek(0)
+    result = normalize_image(field_file.file, settings.IMAGE_UPLOAD_MAX_SIZE, settings.IMAGE_UPLOAD_FORMAT,
+                             settings.IMAGE_UPLOAD_QUALITY)
+    field_file.file.seek(0)
+    if result is None:
+        return
+    content, extension = result
+    name = os.path.splitext(os.path.basename(field_file.name))[0] + extension
+    setattr(instance, field_name, ContentFile(content, name=name))
+
+
+def return_file_in_response(request: HttpRequest, storage_root: str, file_path: str,
+                            asynchronous: bool = False) -> HttpResponseBase:
     """
     Function to only return in response file from storage
 
-    All authentication to show or not file is should be done before executing this function in view's code
+    All authentication to show or not file is should be done before executing this function in view's code. Paths
+    leading outside of `storage_root` are treated as not existing files. Images can be requested resized with `size`
+    (and optional `format`) query parameters (see `dentman.images`). Response supports conditional and range
+    requests (see `dentman.files`). How file is sent depends on `settings.FILE_DELIVERY_BACKEND`: with 'nginx' only
+    `X-Accel-Redirect` header is returned and nginx sends the file, so application's worker isn't busy for the whole
+    download; otherwise file is streamed by Django (with async iterator if `asynchronous` is set)
+    """
+    try:
+        file_full_path = safe_join(storage_root, file_path)
+    except SuspiciousFileOperation:
+        return HttpResponse(status=404)
+    if not os.path.isfile(file_full_path):
+        return HttpResponse(status=404)
+
+    # resized variant of image, e.g. `?size=64&format=webp`
+    if "size" in request.GET:
+        try:
+            size = int(request.GET["size"])
+        except ValueError:
+            return HttpResponse(status=404)
+        file_full_path = get_image_variant(file_full_path, size, request.GET.get("format", "jpeg"))
+        if file_full_path is None:
+            return HttpResponse(status=404)
+    return file_response(request, file_full_path, asynchronous)
+
+
+async def areturn_file_in_response(request: HttpRequest, storage_root: str, file_path: str) -> HttpResponseBase:
+    """
+    Async version of `return_file_in_response` for async views. Checking the file (and resizing images) runs in the
+    reader pool of `dentman.files`; under ASGI the content is then streamed from the event loop by chunks read in the
+    same pool, so downloads don't occupy threads. Under WSGI (runserver, tests) regular iterator is returned.
     """
-    file_full_path = os.path.join(storage_root, file_path)
-    if os.path.exists(file_full_path):
-        return FileResponse(open(file_full_path, 'rb'))
-    return HttpResponse(status=404)
\ No newline at end of file
+    return await run_in_reader_pool(return_file_in_response, request, storage_root, file_path,
+                                    asynchronous=isinstance(request, ASGIRequest))
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dentman.settings.dev')
 
 application = get_wsgi_application()
+
+# scheduler runs only in serving processes, not in management commands (imported after apps are loaded)
+from dentman.ops.validity import start_configured_validity_scheduler
+
+start_configured_validity_scheduler()